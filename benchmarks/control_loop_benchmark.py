@@ -0,0 +1,77 @@
+#!/usr/bin/python3
+## @package control_loop_benchmark
+#  @brief Compares the timing of the control cycle of RobotPlatform.step when each step ends with a fixed sleep of one
+#  period, as it previously did, against scheduling the steps with a ControlLoop. Each step runs the exported actor,
+#  writes the servo commands to a regular file in place of /dev/servoblaster and reads a virtual MPU6050 through the
+#  Kalman filter, plus a random amount of simulated extra work, so no hardware is needed.
+#  Run from the repository root: python -m benchmarks.control_loop_benchmark
+
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+import torch
+from include.agentArchitecture import ActorCritic, export_actor, policy_action
+from include.control_loop import ControlLoop
+from include.filters import BatchKalman
+from include.i2c_handler import MPU6050
+from include.servo_daemon_interface import ServoBlasterWriter, servo_configure
+from include.device_backend import VirtualMPU6050Bus
+from utests.virtual_envs import VirtualEnv
+
+## cycle_starts
+#  Runs step for the given number of cycles, ending each with wait, and returns the start time of every cycle.
+def cycle_starts(step, wait, steps):
+    starts = np.empty(steps)
+    for idx in range(steps):
+        starts[idx] = time.perf_counter()
+        step()
+        wait()
+    return starts
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--control-freq', type=float, default=100)
+    parser.add_argument('--servos', type=int, default=12)
+    parser.add_argument('--steps', type=int, default=500)
+    parser.add_argument('--extra-work', type=float, default=2.0, help="Mean of the exponentially distributed extra "
+                                                                      "work per step in milliseconds")
+    parser.add_argument('--spin-time', type=float, default=0.0, help="Spin time of the ControlLoop in milliseconds")
+    args = parser.parse_args()
+    torch.set_num_threads(1)
+    period = 1.0 / args.control_freq
+
+    policy = export_actor(ActorCritic(VirtualEnv(obs_dim=3 * args.servos, act_dim=args.servos)))
+    mpu = MPU6050(bus=VirtualMPU6050Bus())
+    kalman = BatchKalman(2)
+    for pin in range(args.servos):
+        servo_configure(pin, 550, 3000, -90, 90)
+
+    with tempfile.TemporaryDirectory() as directory:
+        writer = ServoBlasterWriter(os.path.join(directory, "servoblaster"))
+        state = np.zeros(3 * args.servos)
+
+        def step():
+            action = policy_action(policy, state)
+            for pin, angle in enumerate(action):
+                writer.set_angle(pin, float(angle))
+            writer.flush()
+            values = mpu.read_sensors()
+            kalman.getAngle(values[:2], values[3:5], period)
+            time.sleep(np.random.exponential(args.extra_work / 1000))
+
+        loop = ControlLoop(args.control_freq, spin_time=args.spin_time / 1000)
+        fixed = cycle_starts(step, lambda: time.sleep(period), args.steps)
+        loop.start()
+        scheduled = cycle_starts(step, loop.wait, args.steps)
+        writer.close()
+
+    print("{:>12} {:>10} {:>16} {:>16} {:>9}".format("loop", "rate (Hz)", "|dT-T| p50 (ms)", "|dT-T| p99 (ms)",
+                                                     "overruns"))
+    for name, starts, overruns in (("fixed sleep", fixed, "-"), ("ControlLoop", scheduled, loop.overruns)):
+        intervals = np.diff(starts)
+        error = np.abs(intervals - period) * 1000
+        print("{:>12} {:>10.1f} {:>16.3f} {:>16.3f} {:>9}".format(
+            name, 1 / intervals.mean(), np.median(error), np.percentile(error, 99), overruns))
+    loop.report()
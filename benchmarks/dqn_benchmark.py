@@ -0,0 +1,56 @@
+#!/usr/bin/python3
+## @package dqn_benchmark
+#  @brief Measures the number of Double DQN temporal difference updates per second on the cpu for
+#  different thread counts and batch sizes, using the same network and replay memory as the DQNAgent.
+#  Run from the repository root: python -m benchmarks.dqn_benchmark
+
+import argparse
+import time
+import numpy as np
+import torch
+import torch.optim as optim
+from include.agentArchitecture import DQN, cal_TD_Loss
+from utests.virtual_envs import VirtualEnv
+
+## fill_memory
+#  Fills the replay memory of the model with random transitions.
+def fill_memory(model, env, size):
+    for _ in range(size):
+        state = np.random.randn(*env.observation_space.shape)
+        next_state = np.random.randn(*env.observation_space.shape)
+        model.experience.append(state, np.random.randint(model.num_actions), np.random.rand(), False, next_state)
+
+## updates_per_second
+#  Returns the number of cal_TD_Loss calls per second over the given duration.
+def updates_per_second(model, target_model, optimizer, batch_size, duration):
+    for _ in range(10):
+        cal_TD_Loss(batch_size, model, target_model, optimizer, 0.99, model.experience)
+    updates = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        cal_TD_Loss(batch_size, model, target_model, optimizer, 0.99, model.experience)
+        updates += 1
+    return updates / (time.perf_counter() - start)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, torch.get_num_threads()])
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[32, 256])
+    parser.add_argument('--obs-dim', type=int, default=8)
+    parser.add_argument('--act-dim', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=2.0)
+    parser.add_argument('--prioritized', action='store_true')
+    args = parser.parse_args()
+
+    env = VirtualEnv(obs_dim=args.obs_dim, act_dim=args.act_dim)
+    model = DQN(env, prioritized=args.prioritized)
+    target_model = DQN(env)
+    optimizer = optim.Adam(model.parameters(), lr=1e-3)
+    fill_memory(model, env, model.experience.memory_size)
+
+    print("{:>8} {:>8} {:>14}".format("threads", "batch", "updates/s"))
+    for num_threads in sorted(set(args.threads)):
+        torch.set_num_threads(num_threads)
+        for batch_size in args.batch_sizes:
+            rate = updates_per_second(model, target_model, optimizer, batch_size, args.duration)
+            print("{:>8} {:>8} {:>14.0f}".format(num_threads, batch_size, rate))
@@ -0,0 +1,56 @@
+#!/usr/bin/python3
+## @package gae_benchmark
+#  @brief Compares the list based Generalized Advantage Estimation previously used by the PPO Agent
+#  against compute_gae_batch on [num_steps, num_envs] tensors.
+#  Run from the repository root: python -m benchmarks.gae_benchmark
+
+import argparse
+import time
+import torch
+from include.agentArchitecture import compute_gae_batch
+
+## compute_gae_list
+#  Reference implementation looping over per-step lists and inserting at the front of the returns.
+def compute_gae_list(next_value, rewards, masks, values, gamma=0.99, tau=0.95):
+    values = values + [next_value]
+    gae = 0
+    returns = []
+    for step in reversed(range(len(rewards))):
+        delta = rewards[step] + gamma * values[step + 1] * masks[step] - values[step]
+        gae = delta + gamma * tau * masks[step] * gae
+        returns.insert(0, gae + values[step])
+    return returns
+
+## time_call
+#  Returns the best time in milliseconds of the given function over the repeats.
+def time_call(function, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num-steps', type=int, nargs='+', default=[128, 2048])
+    parser.add_argument('--num-envs', type=int, nargs='+', default=[16, 256])
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    print("{:>6} {:>6} {:>12} {:>12} {:>8}".format("steps", "envs", "list (ms)", "batch (ms)", "speedup"))
+    for num_steps in args.num_steps:
+        for num_envs in args.num_envs:
+            rewards = torch.randn(num_steps, num_envs, 1)
+            masks = (torch.rand(num_steps, num_envs, 1) > 0.01).float()
+            values = torch.randn(num_steps, num_envs, 1)
+            next_value = torch.randn(num_envs, 1)
+            out = torch.empty_like(rewards)
+            list_args = (next_value, list(rewards), list(masks), list(values))
+
+            expected = torch.stack(compute_gae_list(*list_args))
+            torch.testing.assert_close(compute_gae_batch(next_value, rewards, masks, values), expected)
+            list_time = time_call(lambda: compute_gae_list(*list_args), args.repeats)
+            batch_time = time_call(lambda: compute_gae_batch(next_value, rewards, masks, values, out=out), args.repeats)
+            print("{:>6} {:>6} {:>12.2f} {:>12.2f} {:>7.1f}x".format(
+                num_steps, num_envs, list_time, batch_time, list_time / batch_time))
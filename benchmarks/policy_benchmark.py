@@ -0,0 +1,55 @@
+#!/usr/bin/python3
+## @package policy_benchmark
+#  @brief Compares the per-step inference latency on the cpu of the ActorCritic path used by test_env (critic, actor
+#  and a sample from the Normal distribution) against the frozen TorchScript actor built by export_actor.
+#  Run from the repository root: python -m benchmarks.policy_benchmark
+
+import argparse
+import time
+import numpy as np
+import torch
+from include.agentArchitecture import ActorCritic, export_actor, policy_action
+from utests.virtual_envs import VirtualEnv
+
+## actor_critic_action
+#  The per-step path of Agent.test_env without an exported policy.
+def actor_critic_action(model, state):
+    state = torch.FloatTensor(state).unsqueeze(0)
+    dist, _ = model(state)
+    return dist.sample().cpu().numpy()[0]
+
+## step_latencies
+#  Returns the latency of every call in microseconds, after a warm up.
+def step_latencies(function, states):
+    for state in states[:100]:
+        function(state)
+    latencies = np.empty(len(states))
+    for idx, state in enumerate(states):
+        start = time.perf_counter()
+        function(state)
+        latencies[idx] = time.perf_counter() - start
+    return latencies * 1e6
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--obs-dims', type=int, nargs='+', default=[3, 111])
+    parser.add_argument('--act-dims', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--steps', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=1)
+    args = parser.parse_args()
+    torch.set_num_threads(args.threads)
+
+    print("{:>5} {:>5} {:>14} {:>10} {:>10} {:>8}".format("obs", "act", "path", "p50 (us)", "p99 (us)", "speedup"))
+    for obs_dim, act_dim in zip(args.obs_dims, args.act_dims):
+        model = ActorCritic(VirtualEnv(obs_dim=obs_dim, act_dim=act_dim))
+        policy = export_actor(model)
+        states = np.random.randn(args.steps, obs_dim)
+        np.testing.assert_allclose(policy_action(policy, states[0]),
+                                   model.actor(torch.FloatTensor(states[:1]))[0].detach().numpy(), rtol=1e-5, atol=1e-6)
+
+        baseline = step_latencies(lambda state: actor_critic_action(model, state), states)
+        exported = step_latencies(lambda state: policy_action(policy, state), states)
+        for name, latencies in (("actor-critic", baseline), ("scripted actor", exported)):
+            print("{:>5} {:>5} {:>14} {:>10.1f} {:>10.1f} {:>7.1f}x".format(
+                obs_dim, act_dim, name, np.median(latencies), np.percentile(latencies, 99),
+                np.median(baseline) / np.median(latencies)))
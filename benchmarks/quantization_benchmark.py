@@ -0,0 +1,66 @@
+#!/usr/bin/python3
+## @package quantization_benchmark
+#  @brief Compares the float and int8 actors exported by export_actor on the cpu: size of the saved module, per-step
+#  latency and the action error against the float ActorCritic on recorded states.
+#  States can be recorded with Agent.test_env(env, record=states) and saved with np.save; without --states, states
+#  following the ProofOfConceptModel trajectory of run_simulation.py are generated (normally distributed states for
+#  other observation sizes).
+#  Run from the repository root: python -m benchmarks.quantization_benchmark
+
+import argparse
+import os
+import tempfile
+import numpy as np
+import torch
+from include.agentArchitecture import ActorCritic, export_actor, load_actor, policy_action, policy_error
+from utests.virtual_envs import VirtualEnv
+from benchmarks.policy_benchmark import step_latencies
+
+## trajectory_states
+#  ProofOfConceptModel-like observations [leg angle, next target angle, angular velocity] along the training trajectory.
+def trajectory_states(num_states, dt=0.05):
+    front = np.linspace(0.056, -0.84, 200)
+    targets = np.resize(np.concatenate([front, front[::-1]]), num_states + 1)
+    angles = targets[:-1] + np.random.normal(0, 0.05, num_states)
+    return np.stack([angles, targets[1:], np.gradient(angles) / dt], axis=1)
+
+## load_model
+#  Builds an ActorCritic with the sizes of the saved weights and loads them.
+def load_model(weights):
+    state_dict = torch.load(weights, map_location="cpu")
+    obs_dim = state_dict["actor.0.weight"].shape[1]
+    act_dim = state_dict["log_std"].shape[1]
+    model = ActorCritic(VirtualEnv(obs_dim=obs_dim, act_dim=act_dim))
+    model.load_state_dict(state_dict)
+    return model
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--weights', default=os.path.join("modelWeights", "proof_of_concept_PPO_weights.pt"))
+    parser.add_argument('--states', default=None, help="Recorded states saved with np.save")
+    parser.add_argument('--steps', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=1)
+    args = parser.parse_args()
+    torch.set_num_threads(args.threads)
+
+    model = load_model(args.weights)
+    obs_dim = model.actor[0].in_features
+    if args.states:
+        states, source = np.load(args.states), args.states
+    elif obs_dim == 3:
+        states, source = trajectory_states(args.steps), "the ProofOfConceptModel trajectory"
+    else:
+        states, source = np.random.randn(args.steps, obs_dim), "a normal distribution"
+    print("{} states from {}".format(len(states), source))
+
+    print("{:>6} {:>10} {:>10} {:>10} {:>11} {:>11}".format("actor", "size (KB)", "p50 (us)", "p99 (us)", "max error", "mean error"))
+    with tempfile.TemporaryDirectory() as directory:
+        for name, quantize in (("float", False), ("int8", True)):
+            file_path = os.path.join(directory, name + ".pt")
+            export_actor(model, file_path, quantize)
+            policy = load_actor(file_path)
+            latencies = step_latencies(lambda state: policy_action(policy, state), states)
+            max_error, mean_error = policy_error(model, policy, states)
+            print("{:>6} {:>10.1f} {:>10.1f} {:>10.1f} {:>11.5f} {:>11.5f}".format(
+                name, os.path.getsize(file_path) / 1024, np.median(latencies), np.percentile(latencies, 99),
+                max_error, mean_error))
@@ -0,0 +1,61 @@
+#!/usr/bin/python3
+## @package replay_benchmark
+#  @brief Measures the sampling and priority update throughput of the SumTree behind the
+#  PrioritizedReplayMemory at full capacity, next to uniform index sampling for reference, and of the
+#  PrioritizedReplayMemory itself: sample_prioritized, which also gathers the transitions into tensors,
+#  against the uniform sample_tensors, and update_priorities.
+#  Run from the repository root: python -m benchmarks.replay_benchmark
+
+import argparse
+import time
+import numpy as np
+import torch
+from include.agentArchitecture import PrioritizedReplayMemory, SumTree
+
+## time_batches
+#  Returns the number of batches per second the given function processes.
+def time_batches(function, num_batches):
+    start = time.perf_counter()
+    for _ in range(num_batches):
+        function()
+    return num_batches / (time.perf_counter() - start)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--capacity', type=int, default=1000000)
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--batches', type=int, default=2000)
+    parser.add_argument('--obs-dim', type=int, default=8)
+    args = parser.parse_args()
+
+    tree = SumTree(args.capacity)
+    tree.update(np.arange(args.capacity), np.random.rand(args.capacity))
+    batch_size = args.batch_size
+
+    def sample():
+        segment = tree.total() / batch_size
+        return tree.find((np.arange(batch_size) + np.random.rand(batch_size)) * segment)
+
+    def update():
+        tree.update(np.random.randint(0, args.capacity, batch_size), np.random.rand(batch_size))
+
+    memory = PrioritizedReplayMemory(args.capacity)
+    transitions = np.random.randn(args.capacity, args.obs_dim)
+    memory.append_batch(transitions, np.random.randint(0, 7, args.capacity), np.random.rand(args.capacity),
+                        np.random.rand(args.capacity) < 0.01, transitions)
+    memory.update_priorities(np.arange(args.capacity), np.random.rand(args.capacity))
+    device = torch.device("cpu")
+
+    def update_priorities():
+        memory.update_priorities(np.random.randint(0, args.capacity, batch_size), np.random.rand(batch_size))
+
+    results = (("uniform sample", time_batches(lambda: np.random.randint(0, args.capacity, batch_size), args.batches)),
+               ("sum-tree sample", time_batches(sample, args.batches)),
+               ("sum-tree update", time_batches(update, args.batches)),
+               ("sample_tensors", time_batches(lambda: memory.sample_tensors(batch_size, device), args.batches)),
+               ("sample_prioritized", time_batches(lambda: memory.sample_prioritized(batch_size, device), args.batches)),
+               ("update_priorities", time_batches(update_priorities, args.batches)))
+    print("capacity {} batch size {}".format(args.capacity, batch_size))
+    print("{:<22} {:>12} {:>16}".format("operation", "batches/s", "transitions/s"))
+    for name, rate in results:
+        print("{:<22} {:>12.0f} {:>16.0f}".format(name, rate, rate * batch_size))
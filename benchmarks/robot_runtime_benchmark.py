@@ -0,0 +1,79 @@
+#!/usr/bin/python3
+## @package robot_runtime_benchmark
+#  @brief Compares the control loop timing of a VirtualEnv stepped at a fixed rate when the exported actor runs in the
+#  hardware loop process, as RobotPlatform.runPolicy does, against running it in the policy process of a RobotRuntime.
+#  A background thread of the hardware loop process holds the GIL for a given time every few milliseconds, standing in
+#  for sensor polling and logging work contending with inference.
+#  Run from the repository root: python -m benchmarks.robot_runtime_benchmark
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+import torch
+from include.agentArchitecture import ActorCritic, export_actor, load_actor, policy_action
+from include.control_loop import ControlLoop
+from include.robot_runtime import RobotRuntime
+from utests.virtual_envs import VirtualEnv
+
+## LoopEnv
+#  VirtualEnv ending every step at the deadline of a ControlLoop, like RobotPlatform.step.
+class LoopEnv(VirtualEnv):
+    def __init__(self, control_freq, **kwargs):
+        super(LoopEnv, self).__init__(**kwargs)
+        self.control_loop = ControlLoop(control_freq)
+
+    def step(self, action):
+        result = super(LoopEnv, self).step(action)
+        self.control_loop.wait()
+        return result
+
+    def reset(self):
+        self.control_loop.start()
+        return super(LoopEnv, self).reset()
+
+## hold_gil
+#  Runs pure Python work for hold seconds every interval seconds until stop is set.
+def hold_gil(hold, interval, stop):
+    while not stop.is_set():
+        end = time.perf_counter() + hold
+        while time.perf_counter() < end:
+            pass
+        time.sleep(interval)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--control-freq', type=float, default=100)
+    parser.add_argument('--obs-dim', type=int, default=111)
+    parser.add_argument('--act-dim', type=int, default=8)
+    parser.add_argument('--steps', type=int, default=500)
+    parser.add_argument('--gil-hold', type=float, default=2.0, help="Time the background thread holds the GIL in ms")
+    parser.add_argument('--gil-interval', type=float, default=5.0, help="Time between GIL holds in ms")
+    args = parser.parse_args()
+    torch.set_num_threads(1)
+
+    env = LoopEnv(args.control_freq, obs_dim=args.obs_dim, act_dim=args.act_dim, episode_length=args.steps)
+    stop = threading.Event()
+    threading.Thread(target=hold_gil, args=(args.gil_hold / 1000, args.gil_interval / 1000, stop), daemon=True).start()
+    with tempfile.TemporaryDirectory() as directory:
+        policy_file = os.path.join(directory, "actor.pt")
+        export_actor(ActorCritic(env), policy_file)
+
+        policy = load_actor(policy_file)
+        state, done = env.reset(), False
+        while not done:
+            state, _, done, _ = env.step(policy_action(policy, state))
+        in_process = env.control_loop.stats()
+
+        runtime = RobotRuntime(env, policy_file, args.obs_dim, args.act_dim, num_threads=1)
+        runtime.run()
+        runtime.close()
+        separate = env.control_loop.stats()
+    stop.set()
+
+    print("{:>16} {:>10} {:>16} {:>16} {:>9}".format("policy", "rate (Hz)", "jitter p99 (ms)", "jitter max (ms)",
+                                                     "overruns"))
+    for name, stats in (("in process", in_process), ("policy process", separate)):
+        print("{:>16} {:>10.1f} {:>16.3f} {:>16.3f} {:>9}".format(
+            name, stats['rate (Hz)'], stats['jitter p99 (ms)'], stats['jitter max (ms)'], stats['overruns']))
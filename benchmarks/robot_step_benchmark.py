@@ -0,0 +1,37 @@
+#!/usr/bin/python3
+## @package robot_step_benchmark
+#  @brief Measures RobotPlatform.step end to end on the SimulatedBackend: the time each step spends acting and sensing
+#  before waiting for its deadline, for several I2C transaction latencies, with the MPU6050 read in the step and read
+#  by the sensor poller thread. The servoblaster writes take the given latency as well.
+#  Run from the repository root: python -m benchmarks.robot_step_benchmark
+
+import argparse
+import numpy as np
+from include.device_backend import SimulatedBackend
+from include.robot_platform import RobotPlatform
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--control-freq', type=float, default=100)
+    parser.add_argument('--sensor-freq', type=float, default=200)
+    parser.add_argument('--i2c-latencies', type=float, nargs='+', default=[0.0, 0.1, 0.5],
+                        help="Latency of an I2C transaction in milliseconds")
+    parser.add_argument('--servo-latency', type=float, default=0.05, help="Latency of a servoblaster write in ms")
+    parser.add_argument('--steps', type=int, default=300)
+    args = parser.parse_args()
+    trajectory = np.sin(np.linspace(0, 2 * np.pi, args.steps + 1)) * 0.3
+
+    print("{:>12} {:>14} {:>13} {:>13} {:>9}".format("i2c (ms)", "sensing", "work p50 (ms)", "work p99 (ms)",
+                                                     "overruns"))
+    for i2c_latency in args.i2c_latencies:
+        for name, sensor_freq in (("in step", None), ("poller", args.sensor_freq)):
+            backend = SimulatedBackend(servo_latency=args.servo_latency / 1000, i2c_latency=i2c_latency / 1000)
+            env = RobotPlatform([12], trajectory, control_freq=args.control_freq, sensor_freq=sensor_freq,
+                                backend=backend)
+            state, done = env.reset(), False
+            while not done:
+                state, _, done, _ = env.step(np.array([np.sin(state[1])]))
+            env.close()
+            stats = env.control_loop.stats()
+            print("{:>12.2f} {:>14} {:>13.3f} {:>13.3f} {:>9}".format(
+                i2c_latency, name, stats['work p50 (ms)'], stats['work p99 (ms)'], stats['overruns']))
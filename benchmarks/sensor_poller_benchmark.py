@@ -0,0 +1,53 @@
+#!/usr/bin/python3
+## @package sensor_poller_benchmark
+#  @brief Compares the time the control step spends sensing the platform when it reads the MPU6050 and updates the
+#  Kalman filter itself, as RobotPlatform.step previously did, against taking the latest reading of a SensorPoller.
+#  The sensor is a virtual MPU6050 with a simulated bus latency per read, so no hardware is needed.
+#  Run from the repository root: python -m benchmarks.sensor_poller_benchmark
+
+import argparse
+import time
+import numpy as np
+from include.control_loop import ControlLoop
+from include.filters import BatchKalman
+from include.i2c_handler import MPU6050
+from include.sensor_poller import SensorPoller
+from include.device_backend import VirtualMPU6050Bus
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--control-freq', type=float, default=100)
+    parser.add_argument('--sensor-freq', type=float, default=200)
+    parser.add_argument('--bus-latency', type=float, default=0.5, help="Latency of a sensor read in milliseconds")
+    parser.add_argument('--steps', type=int, default=300)
+    args = parser.parse_args()
+
+    bus = VirtualMPU6050Bus()
+    bus.set_sensors([0, 0, 16384, 0, 131, -131, 0])
+    mpu = MPU6050(bus=bus)
+    kalman = BatchKalman(2)
+
+    def kf_update():
+        time.sleep(args.bus_latency / 1000)
+        values = mpu.read_sensors()
+        return kalman.getAngle(values[:2], values[3:5], 1.0 / args.sensor_freq)
+
+    poller = SensorPoller(kf_update, args.sensor_freq)
+    paths = (("synchronous", kf_update), ("sensor poller", lambda: poller.latest().value))
+    print("{:>14} {:>10} {:>10} {:>15}".format("path", "p50 (us)", "p99 (us)", "age p50 (ms)"))
+    for name, sense in paths:
+        if name == "sensor poller":
+            poller.start()
+            poller.wait_ready()
+        loop = ControlLoop(args.control_freq)
+        latencies, ages = np.empty(args.steps), np.empty(args.steps)
+        for idx in range(args.steps):
+            start = time.perf_counter()
+            sense()
+            latencies[idx] = time.perf_counter() - start
+            reading = poller.slot.read()
+            ages[idx] = start - reading.timestamp if reading is not None else 0.0
+            loop.wait()
+        print("{:>14} {:>10.1f} {:>10.1f} {:>15.3f}".format(
+            name, np.median(latencies) * 1e6, np.percentile(latencies, 99) * 1e6, np.median(ages) * 1000))
+    poller.stop()
@@ -0,0 +1,74 @@
+#!/usr/bin/python3
+## @package servo_benchmark
+#  @brief Compares the time spent sending the servo commands of one control step through a shell per command, as
+#  servo_set_angle previously did, against one buffered write of a ServoBlasterWriter. The commands are written to a
+#  regular file or FIFO instead of /dev/servoblaster so no hardware is needed.
+#  Run from the repository root: python -m benchmarks.servo_benchmark
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+import numpy as np
+from include.servo_daemon_interface import ServoBlasterWriter, servo_configure, servo_map, servo_maxAngle, \
+    servo_maxPulse, servo_minAngle, servo_minPulse
+
+## shell_set_angle
+#  The previous implementation of servo_set_angle, writing to device_path.
+def shell_set_angle(servoPin, servoAngle, device_path):
+    pwm_sig = servo_map(servoAngle, servo_minAngle[servoPin], servo_maxAngle[servoPin], servo_minPulse[servoPin], servo_maxPulse[servoPin])
+    os.system("echo " + "P1-" + str(servoPin) + "=" + str(pwm_sig) + " > " + device_path)
+
+## step_times
+#  Returns the time in milliseconds of every control step setting the angle of all the servos.
+def step_times(step, num_servos, steps):
+    times = np.empty(steps)
+    for idx in range(steps):
+        angles = np.random.uniform(-15, 30, num_servos)
+        start = time.perf_counter()
+        step(angles)
+        times[idx] = time.perf_counter() - start
+    return times * 1000
+
+## drain
+#  Reads a FIFO until its writers close it, standing in for the servoblaster daemon.
+def drain(device_path):
+    with open(device_path, "rb") as device:
+        while device.read(4096):
+            pass
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--servos', type=int, nargs='+', default=[1, 4, 12])
+    parser.add_argument('--steps', type=int, default=100)
+    parser.add_argument('--fifo', action='store_true', help="Write to a FIFO drained by a reader thread")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        device_path = os.path.join(directory, "servoblaster")
+        if args.fifo:
+            os.mkfifo(device_path)
+            reader = threading.Thread(target=drain, args=(device_path,), daemon=True)
+            reader.start()
+        writer = ServoBlasterWriter(device_path)
+        print("{:>7} {:>16} {:>10} {:>10} {:>8}".format("servos", "path", "p50 (ms)", "p99 (ms)", "speedup"))
+        for num_servos in args.servos:
+            for pin in range(num_servos):
+                servo_configure(pin, 550, 3000, -90, 90)
+
+            def shell_step(angles):
+                for pin, angle in enumerate(angles):
+                    shell_set_angle(pin, angle, device_path)
+
+            def writer_step(angles):
+                for pin, angle in enumerate(angles):
+                    writer.set_angle(pin, angle)
+                writer.flush()
+
+            baseline = step_times(shell_step, num_servos, args.steps)
+            buffered = step_times(writer_step, num_servos, args.steps)
+            for name, times in (("shell per servo", baseline), ("buffered writer", buffered)):
+                print("{:>7} {:>16} {:>10.3f} {:>10.3f} {:>7.0f}x".format(
+                    num_servos, name, np.median(times), np.percentile(times, 99), np.median(baseline) / np.median(times)))
+        writer.close()
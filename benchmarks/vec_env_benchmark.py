@@ -0,0 +1,45 @@
+#!/usr/bin/python3
+## @package vec_env_benchmark
+#  @brief Compares the step throughput of the pipe based SubprocVecEnv against ShmemVecEnv.
+#  The environments are VirtualEnvs with the observation sizes of ProofOfConceptModel (3) and
+#  LowCostPlatform (8) so the measurement is dominated by the transport between processes.
+#  Use --envs-per-worker to host several environments in each subprocess.
+#  Run from the repository root: python -m benchmarks.vec_env_benchmark
+
+import argparse
+import time
+import numpy as np
+from common.multiprocessing_env import SubprocVecEnv, ShmemVecEnv
+from utests.virtual_envs import make_virtual_env
+
+## time_steps
+#  Returns the number of environment steps per second for the given vectorised env.
+def time_steps(envs, num_steps, act_dim):
+    actions = np.zeros((envs.num_envs, act_dim))
+    envs.reset()
+    for _ in range(10):
+        envs.step(actions)
+    start = time.perf_counter()
+    for _ in range(num_steps):
+        envs.step(actions)
+    return num_steps * envs.num_envs / (time.perf_counter() - start)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num-envs', type=int, nargs='+', default=[4, 16, 64])
+    parser.add_argument('--obs-dims', type=int, nargs='+', default=[3, 8])
+    parser.add_argument('--steps', type=int, default=500)
+    parser.add_argument('--envs-per-worker', type=int, default=1)
+    args = parser.parse_args()
+
+    print("{:>6} {:>8} {:>16} {:>16} {:>8}".format("obs", "envs", "Subproc (st/s)", "Shmem (st/s)", "speedup"))
+    for obs_dim in args.obs_dims:
+        for num_envs in args.num_envs:
+            env_fns = [make_virtual_env(obs_dim=obs_dim, env_id=i) for i in range(num_envs)]
+            results = []
+            for vec_env_class in (SubprocVecEnv, ShmemVecEnv):
+                envs = vec_env_class(env_fns, envs_per_worker=args.envs_per_worker)
+                results.append(time_steps(envs, args.steps, 1))
+                envs.close()
+            print("{:>6} {:>8} {:>16.0f} {:>16.0f} {:>7.2f}x".format(
+                obs_dim, num_envs, results[0], results[1], results[1] / results[0]))
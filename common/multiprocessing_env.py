@@ -2,30 +2,94 @@
 #  Please refer to the following link for the original code:
 #  https://github.com/openai/baselines/tree/master/baselines/common/vec_env
 
+import time
 import numpy as np
-from multiprocessing import Process, Pipe
+import multiprocessing
+from multiprocessing import resource_tracker
+from multiprocessing.connection import wait
+from multiprocessing.shared_memory import SharedMemory
 
+## step_env
+#  Steps a single environment hosted by a worker, resetting it when the episode is done.
+#  An unstable simulation producing non-finite observations is also restarted and reported
+#  as done, with 'unstable' set in its info, instead of propagating NaNs to the agent.
+def step_env(env, action):
+    ob, reward, done, info = env.step(action)
+    if not np.all(np.isfinite(ob)):
+        reward, done, info = 0.0, True, dict(info, unstable=True)
+    if done:
+        ob = env.reset()
+    return ob, reward, done, info
+
+## worker
+#  Hosts a batch of environments created from env_fn_wrapper (a CloudpickleWrapper around a
+#  list of thunks) and steps them in a loop, returning one stacked array per worker.
 def worker(remote, parent_remote, env_fn_wrapper):
     parent_remote.close()
-    env = env_fn_wrapper.x()
+    envs = [env_fn() for env_fn in env_fn_wrapper.x]
+    while True:
+        cmd, data = remote.recv()
+        if cmd == 'step':
+            obs, rews, dones, infos = zip(*[step_env(env, action) for env, action in zip(envs, data)])
+            remote.send((np.stack(obs), np.stack(rews), np.stack(dones), infos))
+        elif cmd == 'reset':
+            remote.send(np.stack([env.reset() for env in envs]))
+        elif cmd == 'reset_task':
+            remote.send(np.stack([env.reset_task() for env in envs]))
+        elif cmd == 'close':
+            remote.close()
+            break
+        elif cmd == 'get_spaces':
+            remote.send((envs[0].observation_space, envs[0].action_space))
+        else:
+            raise NotImplementedError
+
+## attach_shmem
+#  Maps an existing shared memory block created by ShmemVecEnv into a NumPy array.
+#  The workers share the resource tracker of the parent, which unlinks the block on close.
+def attach_shmem(name, shape, dtype):
+    shm = SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+## shmem_worker
+#  Worker used by ShmemVecEnv. Behaves like worker until the parent sends the 'attach'
+#  command, after which the observations, rewards and dones of its batch of environments
+#  are written in place into its rows of the shared buffers and only the info dicts
+#  (or None) are sent back through the pipe.
+def shmem_worker(remote, parent_remote, env_fn_wrapper):
+    parent_remote.close()
+    envs = [env_fn() for env_fn in env_fn_wrapper.x]
+    shmems = []
+    rows = slice(0, len(envs))
+    keep_infos = False
     while True:
         cmd, data = remote.recv()
         if cmd == 'step':
-            ob, reward, done, info = env.step(data)
-            if done:
-                ob = env.reset()
-            remote.send((ob, reward, done, info))
+            infos = []
+            for i, (env, action) in enumerate(zip(envs, data)):
+                ob, reward, done, info = step_env(env, action)
+                buf_obs[rows.start + i] = ob
+                buf_rews[rows.start + i] = reward
+                buf_dones[rows.start + i] = done
+                infos.append(info)
+            remote.send(infos if keep_infos else None)
         elif cmd == 'reset':
-            ob = env.reset()
-            remote.send(ob)
+            buf_obs[rows] = [env.reset() for env in envs]
+            remote.send(None)
         elif cmd == 'reset_task':
-            ob = env.reset_task()
-            remote.send(ob)
+            buf_obs[rows] = [env.reset_task() for env in envs]
+            remote.send(None)
+        elif cmd == 'attach':
+            specs, rows, keep_infos = data
+            shmems, bufs = zip(*[attach_shmem(*spec) for spec in specs])
+            buf_obs, buf_rews, buf_dones = bufs
+            remote.send(None)
         elif cmd == 'close':
+            # The mappings in shmems are released when the process exits.
             remote.close()
             break
         elif cmd == 'get_spaces':
-            remote.send((env.observation_space, env.action_space))
+            remote.send((envs[0].observation_space, envs[0].action_space))
         else:
             raise NotImplementedError
 
@@ -70,6 +134,28 @@ class VecEnv(object):
         """
         pass
 
+    def step_async_envs(self, env_ids, actions):
+        """
+        Tell a subset of the environments to start taking a
+        step, actions[i] being the action for env_ids[i].
+        Call step_wait_ready() to collect the results as
+        they become available. You should not call this for
+        environments whose previous step is still pending.
+        """
+        raise NotImplementedError
+
+    def step_wait_ready(self, min_ready=1, timeout=None):
+        """
+        Wait until at least min_ready of the pending
+        environments have finished their step, or until the
+        timeout (in seconds) expires, without waiting for the
+        remaining ones.
+        Returns (env_ids, obs, rews, dones, infos) for the
+        environments which are ready, in the format of
+        step_wait() and with env_ids giving their indices.
+        """
+        raise NotImplementedError
+
     def close(self):
         """
         Clean up the environments' resources.
@@ -96,59 +182,302 @@ class CloudpickleWrapper(object):
 
         
 class SubprocVecEnv(VecEnv):
-    def __init__(self, env_fns, spaces=None):
+    _worker = staticmethod(worker)
+
+    def __init__(self, env_fns, spaces=None, envs_per_worker=1, worker_timeout=None, start_method=None):
         """
         envs: list of gym environments to run in subprocesses
+        envs_per_worker: number of environments hosted and stepped in series by each
+                         subprocess, the last worker hosts the remainder
+        worker_timeout: seconds to wait for a worker to answer before it is considered
+                        hung and restarted, None waits until the worker dies
+        start_method: multiprocessing start method of the workers, None uses the platform
+                      default. 'fork' shares data loaded in the parent copy-on-write
         """
+        self.context = multiprocessing.get_context(start_method)
         self.waiting = False
         self.closed = False
+        self.pending = set()
         nenvs = len(env_fns)
         self.nenvs = nenvs
-        self.remotes, self.work_remotes = zip(*[Pipe() for _ in range(nenvs)])
-        self.ps = [Process(target=worker, args=(work_remote, remote, CloudpickleWrapper(env_fn)))
-            for (work_remote, remote, env_fn) in zip(self.work_remotes, self.remotes, env_fns)]
-        for p in self.ps:
-            p.daemon = True # if the main process crashes, we should not cause things to hang
-            p.start()
-        for remote in self.work_remotes:
-            remote.close()
+        self.envs_per_worker = envs_per_worker
+        self.worker_timeout = worker_timeout
+        self.poll_interval = 0.1
+        self.env_fns = [env_fns[i:i + envs_per_worker] for i in range(0, nenvs, envs_per_worker)]
+        self.slices = [slice(i, i + len(fns)) for i, fns in zip(range(0, nenvs, envs_per_worker), self.env_fns)]
+        self.nworkers = len(self.env_fns)
+        self.env_workers = np.repeat(np.arange(self.nworkers), [len(fns) for fns in self.env_fns])
+        self.restarts = [0] * self.nworkers
+        self.sent_at = [0.0] * self.nworkers
+        self.remotes = [None] * self.nworkers
+        self.ps = [None] * self.nworkers
+        for idx in range(self.nworkers):
+            self._start_worker(idx)
 
         self.remotes[0].send(('get_spaces', None))
         observation_space, action_space = self.remotes[0].recv()
         VecEnv.__init__(self, len(env_fns), observation_space, action_space)
 
+    ## start_worker
+    #  Starts the subprocess hosting the environments of worker idx. The thunks are kept in
+    #  self.env_fns so a crashed worker can be started again from the same CloudpickleWrapper.
+    def _start_worker(self, idx):
+        remote, work_remote = self.context.Pipe()
+        p = self.context.Process(target=self._worker, args=(work_remote, remote, CloudpickleWrapper(self.env_fns[idx])))
+        p.daemon = True # if the main process crashes, we should not cause things to hang
+        p.start()
+        work_remote.close()
+        self.remotes[idx] = remote
+        self.ps[idx] = p
+
+    ## send
+    #  Sends a command to worker idx. A worker which has died is detected by the next _recv.
+    def _send(self, idx, cmd, data=None):
+        self.sent_at[idx] = time.monotonic()
+        try:
+            self.remotes[idx].send((cmd, data))
+        except (BrokenPipeError, EOFError, OSError):
+            pass
+
+    ## worker_failed
+    #  Returns True if worker idx has died or has exceeded worker_timeout since the last command.
+    def _worker_failed(self, idx):
+        if not self.ps[idx].is_alive():
+            return True
+        return self.worker_timeout is not None and time.monotonic() - self.sent_at[idx] > self.worker_timeout
+
+    ## recv
+    #  Waits for the answer of worker idx while checking that the worker is still healthy.
+    #  The pipe cannot be relied on to report a dead worker, as the other workers hold copies
+    #  of its end of the pipe. Returns (True, data) on success and (False, None) on failure.
+    def _recv(self, idx):
+        remote = self.remotes[idx]
+        try:
+            while not remote.poll(self.poll_interval):
+                if self._worker_failed(idx):
+                    return False, None
+            return True, remote.recv()
+        except (EOFError, OSError):
+            return False, None
+
+    ## restart_worker
+    #  Replaces worker idx by a new subprocess built from the stored thunks and resets its
+    #  environments. The restarted environments are reported as done with zero reward and
+    #  'worker_restarted' set in their info so training can carry on.
+    def _restart_worker(self, idx):
+        p = self.ps[idx]
+        if p.is_alive():
+            p.terminate()
+        p.join(1.0)
+        self.remotes[idx].close()
+        self.restarts[idx] += 1
+        print("Restarting worker {} (restart {})\r".format(idx, self.restarts[idx]))
+        self._start_worker(idx)
+        self._send(idx, 'reset')
+        success, obs = self._recv(idx)
+        if not success:
+            raise RuntimeError("Worker {} failed to restart".format(idx))
+        nenvs = self.slices[idx].stop - self.slices[idx].start
+        infos = tuple({'worker_restarted': True} for _ in range(nenvs))
+        return obs, np.zeros(nenvs), np.ones(nenvs, dtype=np.bool_), infos
+
+    @property
+    def total_restarts(self):
+        return sum(self.restarts)
+
     def step_async(self, actions):
-        for remote, action in zip(self.remotes, actions):
-            remote.send(('step', action))
+        for idx, rows in enumerate(self.slices):
+            self._send(idx, 'step', actions[rows])
+        self.pending = set(range(self.nworkers))
         self.waiting = True
 
     def step_wait(self):
-        results = [remote.recv() for remote in self.remotes]
+        results = [self._recv_step(idx) for idx in range(self.nworkers)]
+        self.pending.clear()
         self.waiting = False
         obs, rews, dones, infos = zip(*results)
-        return np.stack(obs), np.stack(rews), np.stack(dones), infos
+        return np.concatenate(obs), np.concatenate(rews), np.concatenate(dones), sum(infos, ())
+
+    ## step_async_envs
+    #  Sends the step command to the workers hosting env_ids. As a worker steps all of its
+    #  environments together, env_ids must contain every environment of the workers involved.
+    def step_async_envs(self, env_ids, actions):
+        env_actions = dict(zip(np.asarray(env_ids).tolist(), actions))
+        workers = np.unique(self.env_workers[list(env_actions)]).tolist()
+        for idx in workers:
+            if idx in self.pending:
+                raise RuntimeError("A step is already pending for worker {}".format(idx))
+            if any(env_id not in env_actions for env_id in range(self.slices[idx].start, self.slices[idx].stop)):
+                raise ValueError("env_ids must contain every environment of worker {}".format(idx))
+        for idx in workers:
+            rows = self.slices[idx]
+            self._send(idx, 'step', np.stack([env_actions[env_id] for env_id in range(rows.start, rows.stop)]))
+            self.pending.add(idx)
+        self.waiting = True
+
+    ## step_wait_ready
+    #  Collects the results of the workers which have finished stepping, using
+    #  multiprocessing.connection.wait so stragglers do not stall the caller. Workers which
+    #  have failed count as ready and are restarted by _recv_step.
+    def step_wait_ready(self, min_ready=1, timeout=None):
+        ready = []
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.pending and np.isin(self.env_workers, ready).sum() < min_ready:
+            remotes = {self.remotes[idx]: idx for idx in self.pending}
+            wait_time = self.poll_interval if deadline is None else min(self.poll_interval, max(deadline - time.monotonic(), 0))
+            ready_workers = [remotes[remote] for remote in wait(list(remotes), wait_time)]
+            ready_workers += [idx for idx in self.pending if idx not in ready_workers and self._worker_failed(idx)]
+            for idx in ready_workers:
+                ready.append(idx)
+                self.pending.discard(idx)
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+        self.waiting = bool(self.pending)
+        env_ids = np.flatnonzero(np.isin(self.env_workers, ready))
+        if not ready:
+            return env_ids, None, None, None, ()
+        obs, rews, dones, infos = zip(*[self._recv_step(idx) for idx in sorted(ready)])
+        return env_ids, np.concatenate(obs), np.concatenate(rews), np.concatenate(dones), sum(infos, ())
+
+    ## recv_step
+    #  Receives the result of the last step command sent to worker idx, restarting the worker
+    #  if it has failed.
+    def _recv_step(self, idx):
+        success, result = self._recv(idx)
+        return result if success else self._restart_worker(idx)
+
+    ## recv_reset
+    #  Receives the observations of the last reset command sent to worker idx, restarting the
+    #  worker if it has failed.
+    def _recv_reset(self, idx):
+        success, obs = self._recv(idx)
+        return obs if success else self._restart_worker(idx)[0]
 
     def reset(self):
-        for remote in self.remotes:
-            remote.send(('reset', None))
-        return np.stack([remote.recv() for remote in self.remotes])
+        for idx in range(self.nworkers):
+            self._send(idx, 'reset')
+        return np.concatenate([self._recv_reset(idx) for idx in range(self.nworkers)])
 
     def reset_task(self):
-        for remote in self.remotes:
-            remote.send(('reset_task', None))
-        return np.stack([remote.recv() for remote in self.remotes])
+        for idx in range(self.nworkers):
+            self._send(idx, 'reset_task')
+        return np.concatenate([self._recv_reset(idx) for idx in range(self.nworkers)])
 
     def close(self):
         if self.closed:
             return
         if self.waiting:
-            for remote in self.remotes:            
-                remote.recv()
-        for remote in self.remotes:
-            remote.send(('close', None))
+            for idx in self.pending:
+                self._recv(idx)
+        for idx in range(self.nworkers):
+            self._send(idx, 'close')
         for p in self.ps:
-            p.join()
-            self.closed = True
+            p.join(1.0)
+            if p.is_alive():
+                p.terminate()
+        self.closed = True
             
     def __len__(self):
-        return self.nenvs
\ No newline at end of file
+        return self.nenvs
+
+## ShmemVecEnv
+#  SubprocVecEnv variant which transports observations, rewards and dones through
+#  preallocated multiprocessing.shared_memory buffers instead of pickling them through the
+#  pipes. Each worker writes into the rows of its environments and the parent only exchanges a small
+#  signal per step, so step_wait returns the shared buffers without copying or stacking.
+#  @note The arrays returned by step() and reset() are views of the shared buffers and are
+#  overwritten by the next call. Copy them if they must outlive the next step.
+class ShmemVecEnv(SubprocVecEnv):
+    _worker = staticmethod(shmem_worker)
+
+    ## Constructor
+    #  @param env_fns List of thunks creating the environments to run in subprocesses.
+    #  @param keep_infos Send the info dicts back from the workers. Disabled by default as the
+    #  info dicts are the only values which still have to be pickled.
+    def __init__(self, env_fns, spaces=None, envs_per_worker=1, worker_timeout=None, start_method=None, keep_infos=False):
+        # Start the tracker before forking so the workers share it instead of starting their
+        # own, which would unlink the buffers as soon as a worker exits.
+        resource_tracker.ensure_running()
+        self.specs = None
+        self.keep_infos = keep_infos
+        SubprocVecEnv.__init__(self, env_fns, spaces, envs_per_worker, worker_timeout, start_method)
+        obs_shape = (self.nenvs,) + tuple(self.observation_space.shape)
+        obs_dtype = np.dtype(self.observation_space.dtype)
+        self.shmems = []
+        self.buf_obs = self._allocate(obs_shape, obs_dtype)
+        self.buf_rews = self._allocate((self.nenvs,), np.float64)
+        self.buf_dones = self._allocate((self.nenvs,), np.bool_)
+        self.specs = [(shm.name, buf.shape, buf.dtype) for shm, buf in
+                      zip(self.shmems, (self.buf_obs, self.buf_rews, self.buf_dones))]
+        for remote, rows in zip(self.remotes, self.slices):
+            remote.send(('attach', (self.specs, rows, keep_infos)))
+        for remote in self.remotes:
+            remote.recv()
+
+    ## start_worker
+    #  Restarted workers are attached to the shared buffers before they are used. The handshake
+    #  is awaited like any other answer, so a worker dying or exceeding worker_timeout while it
+    #  builds its environments or attaches the buffers raises instead of hanging the parent.
+    def _start_worker(self, idx):
+        SubprocVecEnv._start_worker(self, idx)
+        if self.specs is not None:
+            self._send(idx, 'attach', (self.specs, self.slices[idx], self.keep_infos))
+            success, _ = self._recv(idx)
+            if not success:
+                raise RuntimeError("Worker {} failed to attach the shared memory".format(idx))
+
+    ## allocate
+    #  Creates a shared memory block large enough for an array of the given shape and dtype.
+    def _allocate(self, shape, dtype):
+        dtype = np.dtype(dtype)
+        shm = SharedMemory(create=True, size=max(int(np.prod(shape)) * dtype.itemsize, 1))
+        self.shmems.append(shm)
+        return np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+    def step_wait(self):
+        infos = [self._recv_step(idx)[3] for idx in range(self.nworkers)]
+        self.pending.clear()
+        self.waiting = False
+        return self.buf_obs, self.buf_rews, self.buf_dones, sum(infos, ())
+
+    ## recv_step
+    #  Waits for the signal of worker idx and returns views of its rows in the shared buffers.
+    #  step_wait_ready concatenates these views, so the partial results it returns are copies.
+    def _recv_step(self, idx):
+        success, infos = self._recv(idx)
+        rows = self.slices[idx]
+        if not success:
+            _, self.buf_rews[rows], self.buf_dones[rows], infos = self._restart_worker(idx)
+        elif not self.keep_infos:
+            infos = ({},) * (rows.stop - rows.start)
+        return self.buf_obs[rows], self.buf_rews[rows], self.buf_dones[rows], tuple(infos)
+
+    ## recv_reset
+    #  The observations are written into the shared buffers, including by restarted workers.
+    def _recv_reset(self, idx):
+        success, _ = self._recv(idx)
+        if not success:
+            self._restart_worker(idx)
+        return self.buf_obs[self.slices[idx]]
+
+    def reset(self):
+        SubprocVecEnv.reset(self)
+        return self.buf_obs
+
+    def reset_task(self):
+        SubprocVecEnv.reset_task(self)
+        return self.buf_obs
+
+    def close(self):
+        if self.closed:
+            return
+        SubprocVecEnv.close(self)
+        # Drop the array views before releasing the blocks they point into. Views still held
+        # by the caller keep the mapping alive until they are garbage collected.
+        del self.buf_obs, self.buf_rews, self.buf_dones
+        for shm in self.shmems:
+            try:
+                shm.close()
+            except BufferError:
+                pass
+            shm.unlink()
@@ -9,6 +9,7 @@ import os
 import json
 import torch
 import matplotlib.pyplot as plt
+from include.agentArchitecture import policy_action
 
 ## Debugger
 #  If the test rewards need to be plot out, the debugger can be called in the Agent class for visualization. 
@@ -48,6 +49,8 @@ class Agent:
     def __init__(self):
         self.device = self._testCUDAAvailable()
         self.debugger = Debugger()
+        # Exported actor-only module, used by test_env instead of the model once loaded
+        self.policy = None
 
         # Common Training Parameters
         self.frame_idx = 0
@@ -84,20 +87,39 @@ class Agent:
                 set arguement 'use_cuda' to false.")
             exit(0)
 
+    ## configureCPUThreads
+    #  Limits the number of intra-op threads PyTorch uses when the agent trains on the cpu. The default of one
+    #  thread per core oversubscribes the small MLPs used here; a few threads keep the per-batch overhead low.
+    #  The setting is left untouched when training on a CUDA device.
+    #  @param num_threads Number of threads to use. Defaults to min(4, number of cores).
+    def _configureCPUThreads(self, num_threads=None):
+        if self.device.type != "cpu":
+            return
+        if not num_threads:
+            num_threads = min(4, os.cpu_count() or 1)
+        torch.set_num_threads(num_threads)
+        print("Training on cpu with {} threads\r".format(num_threads))
+
     ## test_env
     #  Method for Testing the model against the single instance of the environment. This will allow the model to be verified
     #  if trained properly. User can validate the performance of the model by calling this function and pass the environment
-    #  and model through it.
-    def test_env(self, env, vis=False, plot=False):
+    #  and model through it. When an exported policy is loaded, its deterministic mean action is used instead.
+    #  @param record Optional list the observed states are appended to, e.g. to check an exported policy offline
+    def test_env(self, env, vis=False, plot=False, record=None):
         state = env.reset()
         done = False
         total_reward = 0
         time_step = 0
         while not done:
             if vis: env.render()
-            state = torch.FloatTensor(state).unsqueeze(0).to(self.device)
-            dist, _ = self.model(state)
-            next_state, reward, done, info = env.step(dist.sample().cpu().numpy()[0])
+            if record is not None: record.append(state)
+            if self.policy is not None:
+                action = policy_action(self.policy, state)
+            else:
+                state = torch.FloatTensor(state).unsqueeze(0).to(self.device)
+                dist, _ = self.model(state)
+                action = dist.sample().cpu().numpy()[0]
+            next_state, reward, done, info = env.step(action)
             state = next_state
             if plot:
                 self.debugger.plotValues(time_step, [info['Model Leg Pos (radians)'], info['Target Leg Pos (radians)']])
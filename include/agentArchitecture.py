@@ -3,6 +3,7 @@
 #  This package contains all agent architectures for testing the platform. They are architectures which meet the performance baselines. 
 #  More details.
 
+import copy
 import math
 import random
 
@@ -11,25 +12,77 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 from torch.distributions import Normal
-from collections import deque
 
 ## Replay Memory
 #  @brief: Stores the Tuples Agent observes from the environment
+#  The transitions are kept in a preallocated ring buffer. Each row of a single float32 array holds one
+#  transition laid out as [state, action, reward, done, next_state], and the typed columns are views of
+#  that array. Appending is O(1) and sampling gathers the selected rows with one vectorised index, so
+#  sample_tensors returns a batch on the training device with a single host-to-device copy. The storage
+#  is allocated on the first append, once the sizes of the states and actions are known.
 #  @author: Joon You Tan
 #  @date: 8-May-2020
 class ReplayMemory(object):
     ## Constructor 
-    #  @param memory_size Arguement to create a double-ended queue of that size.
+    #  @param memory_size Maximum number of transitions stored, the oldest ones are overwritten first.
     def __init__(self, memory_size):
         self.memory_size = memory_size
-        self.replay_memory = deque(maxlen=memory_size)
+        self.storage = None
+        self.position = 0
+        self.size = 0
+
+    ## allocate
+    #  Creates the ring buffer and the column views for states and actions shaped like the given ones.
+    def _allocate(self, state, action):
+        self.state_shape = np.shape(state)
+        self.action_shape = np.shape(action)
+        self.action_dtype = np.int64 if np.issubdtype(np.asarray(action).dtype, np.integer) else np.float32
+        state_size = int(np.prod(self.state_shape))
+        action_size = int(np.prod(self.action_shape))
+        self.sizes = [state_size, action_size, 1, 1, state_size]
+        self.storage = np.zeros((self.memory_size, sum(self.sizes)), dtype=np.float32)
+        self.states, self.actions, self.rewards, self.dones, self.next_states = np.split(self.storage, np.cumsum(self.sizes)[:-1], axis=1)
   
+    ## sample_indices
+    #  Returns batch_size random indices of stored transitions, drawn with replacement.
+    def sample_indices(self, batch_size=32):
+        return np.random.randint(0, self.size, batch_size)
+
     ## sample_batch
-    #  Extracts out batch_size number of random tuples from the queue. batch_size is default to be 32.
+    #  Extracts out batch_size number of random transitions from the memory. batch_size is default to be 32.
+    #  Returns NumPy arrays of states, actions, rewards, dones and next states.
     #  @param batch_size Number of samples to extract from the queue for processing
     def sample_batch(self, batch_size=32):
-        state, action, reward, done, next_state = zip(*random.sample(self.replay_memory, batch_size))
-        return state, action, reward, done, next_state
+        return self._split_batch(self.storage[self.sample_indices(batch_size)])
+
+    ## sample_tensors
+    #  Returns batch_size random transitions as tensors on the given device. The rows are gathered on the
+    #  host and transferred in one copy, then split into views. Integer actions are returned as a LongTensor.
+    #  @param batch_size Number of samples to extract from the memory
+    #  @param device Device the tensors are returned on
+    #  @param indices Optional indices of the transitions to return instead of random ones
+    def sample_tensors(self, batch_size=32, device=torch.device("cpu"), indices=None):
+        if indices is None:
+            indices = self.sample_indices(batch_size)
+        batch = torch.from_numpy(self.storage[indices]).to(device)
+        states, actions, rewards, dones, next_states = self._split_batch(batch)
+        if self.action_dtype == np.int64:
+            actions = actions.long()
+        return states, actions, rewards, dones, next_states
+
+    ## split_batch
+    #  Splits gathered rows back into states, actions, rewards, dones and next states shaped as appended.
+    def _split_batch(self, batch):
+        if isinstance(batch, np.ndarray):
+            states, actions, rewards, dones, next_states = np.split(batch, np.cumsum(self.sizes)[:-1], axis=1)
+        else:
+            states, actions, rewards, dones, next_states = batch.split(self.sizes, 1)
+        batch_size = len(batch)
+        return (states.reshape((batch_size,) + self.state_shape),
+                actions.reshape((batch_size,) + self.action_shape),
+                rewards.reshape(batch_size),
+                dones.reshape(batch_size),
+                next_states.reshape((batch_size,) + self.state_shape))
     
     ## append
     #  @param state Current environment state observed by the agent
@@ -38,10 +91,142 @@ class ReplayMemory(object):
     #  @param done Indicator if the current episode is complete
     #  @param next_state Expected state which agent will be observing next
     def append(self, state, action, reward, done, next_state):
-        self.replay_memory.append((state, action, reward, done, next_state))
+        if self.storage is None:
+            self._allocate(state, action)
+        self.states[self.position] = np.ravel(state)
+        self.actions[self.position] = np.ravel(action)
+        self.rewards[self.position] = reward
+        self.dones[self.position] = done
+        self.next_states[self.position] = np.ravel(next_state)
+        self.position = (self.position + 1) % self.memory_size
+        self.size = min(self.size + 1, self.memory_size)
+
+    ## append_batch
+    #  Stores one transition per environment of a vectorised environment with a single scatter into the ring buffer.
+    #  @param states Batch of states, one per environment
+    #  @param actions Batch of actions taken in those states
+    #  @param rewards Batch of rewards
+    #  @param dones Batch of episode completion indicators
+    #  @param next_states Batch of states observed after the actions
+    def append_batch(self, states, actions, rewards, dones, next_states):
+        batch_size = len(states)
+        if self.storage is None:
+            self._allocate(states[0], actions[0])
+        rows = np.concatenate((np.reshape(states, (batch_size, -1)),
+                               np.reshape(actions, (batch_size, -1)),
+                               np.reshape(rewards, (batch_size, 1)),
+                               np.reshape(dones, (batch_size, 1)),
+                               np.reshape(next_states, (batch_size, -1))), axis=1)
+        self.storage[self._next_indices(batch_size)] = rows
+        self.position = (self.position + batch_size) % self.memory_size
+        self.size = min(self.size + batch_size, self.memory_size)
+
+    ## next_indices
+    #  Indices of the slots the next batch_size appended transitions are written to.
+    def _next_indices(self, batch_size):
+        return (self.position + np.arange(batch_size)) % self.memory_size
         
     def __len__(self):
-        return len(self.replay_memory)
+        return self.size
+
+## Sum Tree
+#  @brief Array based binary tree where every node holds the sum of the priorities of its children
+#  The root is stored at index 1 and the leaves, one per replay memory slot, at [capacity, 2 * capacity).
+#  Updating and sampling a batch of indices are both O(log n) and vectorised over the batch.
+class SumTree(object):
+    ## Constructor
+    #  @param capacity Number of leaves, rounded up to the next power of two.
+    def __init__(self, capacity):
+        self.capacity = 1 << max(int(capacity) - 1, 0).bit_length()
+        self.tree = np.zeros(2 * self.capacity)
+
+    ## total
+    #  Returns the sum of all priorities.
+    def total(self):
+        return self.tree[1]
+
+    ## priorities
+    #  Returns the priorities stored at the given leaf indices.
+    def priorities(self, indices):
+        return self.tree[np.asarray(indices) + self.capacity]
+
+    ## update
+    #  Sets the priorities of the given leaves and recomputes the sums on their paths to the root.
+    def update(self, indices, priorities):
+        nodes = np.atleast_1d(np.asarray(indices) + self.capacity)
+        self.tree[nodes] = priorities
+        # All leaves sit at the same depth, so every pass updates one level. Duplicated parents are
+        # assigned the same sum and need no deduplication.
+        nodes = nodes // 2
+        while nodes[0] >= 1:
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+            nodes = nodes // 2
+
+    ## find
+    #  Returns, for each value in [0, total), the leaf whose cumulative priority range contains it.
+    def find(self, values):
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        while nodes[0] < self.capacity:
+            left = 2 * nodes
+            go_right = values > self.tree[left]
+            values -= np.where(go_right, self.tree[left], 0)
+            nodes = left + go_right
+        return nodes - self.capacity
+
+## Prioritized Replay Memory
+#  @brief Replay memory sampling transitions in proportion to their last TD error
+#  Transitions are drawn with probability p_i^alpha / sum(p^alpha) through a SumTree, and the bias this
+#  introduces is corrected with the importance-sampling weights (N * P(i))^-beta normalised by their
+#  maximum. New transitions receive the highest priority seen so far so they are replayed at least once.
+class PrioritizedReplayMemory(ReplayMemory):
+    ## Constructor
+    #  @param memory_size Maximum number of transitions stored.
+    #  @param alpha How strongly the TD errors shape the sampling distribution, 0 being uniform.
+    #  @param beta Initial importance-sampling exponent, annealed towards 1 by beta_increment per batch.
+    #  @param epsilon Added to the TD errors so no transition has a zero probability of being sampled.
+    def __init__(self, memory_size, alpha=0.6, beta=0.4, beta_increment=1e-4, epsilon=1e-5):
+        ReplayMemory.__init__(self, memory_size)
+        self.tree = SumTree(memory_size)
+        self.alpha = alpha
+        self.beta = beta
+        self.beta_increment = beta_increment
+        self.epsilon = epsilon
+        self.max_priority = 1.0
+
+    def append(self, state, action, reward, done, next_state):
+        self.tree.update([self.position], self.max_priority ** self.alpha)
+        ReplayMemory.append(self, state, action, reward, done, next_state)
+
+    def append_batch(self, states, actions, rewards, dones, next_states):
+        self.tree.update(self._next_indices(len(states)), self.max_priority ** self.alpha)
+        ReplayMemory.append_batch(self, states, actions, rewards, dones, next_states)
+
+    ## sample_indices
+    #  Draws one index from each of batch_size equal segments of the total priority.
+    def sample_indices(self, batch_size=32):
+        segment = self.tree.total() / batch_size
+        values = (np.arange(batch_size) + np.random.rand(batch_size)) * segment
+        return np.minimum(self.tree.find(values), self.size - 1)
+
+    ## sample_prioritized
+    #  Returns the sampled transitions as tensors on the given device, together with their indices and
+    #  importance-sampling weights. Pass the indices to update_priorities once the TD errors are known.
+    def sample_prioritized(self, batch_size=32, device=torch.device("cpu")):
+        indices = self.sample_indices(batch_size)
+        probabilities = self.tree.priorities(indices) / self.tree.total()
+        weights = (self.size * probabilities) ** -self.beta
+        weights = torch.from_numpy((weights / weights.max()).astype(np.float32)).to(device)
+        self.beta = min(1.0, self.beta + self.beta_increment)
+        return self.sample_tensors(batch_size, device, indices), indices, weights
+
+    ## update_priorities
+    #  @param indices Indices returned by sample_prioritized
+    #  @param td_errors Absolute TD errors of the sampled transitions
+    def update_priorities(self, indices, td_errors):
+        priorities = np.abs(td_errors) + self.epsilon
+        self.max_priority = max(self.max_priority, priorities.max())
+        self.tree.update(indices, priorities ** self.alpha)
 
 ## DQN
 #  A Linear Model with the Deep Q-Network (DQN) architecture.
@@ -55,9 +240,10 @@ class ReplayMemory(object):
 class DQN(nn.Module):
     ## Super Constructor
     #  @param: env The environment in which the agent will be interacting with (must be gym compatible)
-    def __init__(self, env, memory_size=5000):
+    #  @param: prioritized Replay the transitions with a PrioritizedReplayMemory instead of uniformly
+    def __init__(self, env, memory_size=5000, prioritized=False):
         super(DQN, self).__init__()
-        self.experience = ReplayMemory(memory_size)
+        self.experience = PrioritizedReplayMemory(memory_size) if prioritized else ReplayMemory(memory_size)
         self.input_dim = env.observation_space.shape
         # Create three separate values for the thing to choose.
         self.num_actions = 7*env.action_space.shape[0]
@@ -96,38 +282,98 @@ class DQN(nn.Module):
             action = random.randrange(self.num_actions)
         return action
 
+    ## get_actions
+    #  Epsilon greedy actions for a batch of states, one per environment, evaluated in a single forward pass.
+    #  Every environment (and every branch of a BranchingDQN) draws its own exploration mask.
+    #  @param: states Batch of states observed by the environments
+    #  @param: time_step index of time with respect to the agent itself
+    #  @return NumPy array of action indices
+    def get_actions(self, states, time_step):
+        epsilon = self.epsilon_greed_strat(time_step)
+        actions = self.get_qvals(states).argmax(-1).cpu().numpy()
+        explore = np.random.rand(*actions.shape) < epsilon
+        actions[explore] = np.random.randint(self.num_actions, size=np.count_nonzero(explore))
+        return actions
+
     def evaluate(self, state):
         qval = self.get_qvals(state)
-        return qval.max(1)[1].detach()
+        return qval.max(1)[1].item()
 
+    ## get_qvals
+    #  Q-values of a single state or of a batch of states, on whichever device the model lives on.
     def get_qvals(self, state):
-        # Pass the state image into our network:
         with torch.no_grad():
-            state_t = torch.cuda.FloatTensor(np.float32(state)).unsqueeze(0)
+            device = next(self.parameters()).device
+            state_t = torch.as_tensor(np.float32(state), device=device)
+            if state_t.dim() == len(self.input_dim):
+                state_t = state_t.unsqueeze(0)
             return self.forward(state_t)
 
+## BranchingDQN
+#  Deep Q-Network with one Q-value head per actuator sharing the DQN trunk, so the output layer grows linearly with
+#  the number of servos instead of the 7^n joint actions. Every branch picks its own bin with an argmax.
+#  @note Layer 1: Linear, (in_channels = environment = 128) -> ReLU
+#  @note Layer 2: Linear, (in_channels = 128, out_channels = 128)
+#  @note Layer 3: Linear, (in_channels = 128, out_channels = number of actuators * num_bins), evaluated as one head of
+#  num_bins outputs per actuator.
+#  @note forward returns Q-values of shape [batch, actuators, num_bins] and the actions are arrays of bin indices,
+#  one per actuator. num_actions is the number of bins of each branch.
+class BranchingDQN(DQN):
+    ## Constructor
+    #  @param: env The environment in which the agent will be interacting with (must be gym compatible)
+    #  @param: num_bins Number of discrete values each actuator can take
+    def __init__(self, env, memory_size=5000, prioritized=False, num_bins=7):
+        DQN.__init__(self, env, memory_size, prioritized)
+        self.num_branches = env.action_space.shape[0]
+        self.num_actions = num_bins
+        # All heads are evaluated by a single matrix multiplication
+        self.layers[-1] = nn.Linear(128, self.num_branches * num_bins)
+
+    def forward(self, x):
+        return self.layers(x).view(-1, self.num_branches, self.num_actions)
+
+    def get_action(self, state, epsilon):
+        return self.get_actions(np.expand_dims(state, 0), epsilon)[0]
+
+    def evaluate(self, state):
+        return self.get_qvals(state).argmax(-1)[0].cpu().numpy()
+
 ## cal_TD_loss
 #  @brief: Calculate the Temporal Difference Loss of the model.
 #  @author: Joon You Tan
 #  @date: 8-May-2020
+#  When experience is a PrioritizedReplayMemory, the squared TD errors are weighted by the importance-sampling
+#  weights and the priorities of the sampled transitions are updated with their new TD errors.
+#  For a BranchingDQN the loss is averaged over the branches and the priority is the mean TD error of the branches.
 def cal_TD_Loss(batch_size, model, target_model, optimizer, discount_factor, experience):
-    states, actions, rewards, dones, next_states = experience.sample_batch(batch_size)
-    states = torch.cuda.FloatTensor(np.float32(states))
-    next_states = torch.cuda.FloatTensor(np.float32(next_states))
-    rewards_t = torch.cuda.FloatTensor(rewards)
-    actions_t = torch.cuda.LongTensor(actions)
-    done_t = torch.cuda.FloatTensor(dones)
+    device = next(model.parameters()).device
+    if isinstance(experience, PrioritizedReplayMemory):
+        batch, indices, weights = experience.sample_prioritized(batch_size, device)
+    else:
+        batch, weights = experience.sample_tensors(batch_size, device), None
+    states, actions, rewards_t, done_t, next_states = batch
+    # Q-values are handled as [batch, branches, actions]; the flat DQN is a single branch
+    actions_t = actions.long().view(batch_size, -1, 1)
 
-    qvals = model(states)
-    qvals = qvals.gather(1, actions_t.unsqueeze(1)).squeeze(1)
+    # One online forward over [states; next_states] instead of two; the target network needs no graph
+    online_qvals = model(torch.cat((states, next_states)))
+    online_qvals = online_qvals.view(2*batch_size, -1, online_qvals.shape[-1])
+    qvals, next_qvals = online_qvals[:batch_size], online_qvals[batch_size:]
+    qvals = qvals.gather(2, actions_t).squeeze(2)
 
-    next_qvals = model(next_states)
-    next_qval_state = target_model(next_states)
-    next_qval = next_qval_state.gather(1, torch.max(next_qvals, 1)[1].unsqueeze(1)).squeeze(1)
+    with torch.no_grad():
+        next_qval_state = target_model(next_states).view_as(next_qvals)
+        next_qval = next_qval_state.gather(2, next_qvals.argmax(2, keepdim=True)).squeeze(2)
 
-    expected_qvals = rewards_t + discount_factor*next_qval*(1-done_t)
+    # Every branch is given its own TD target from the shared reward
+    expected_qvals = rewards_t.unsqueeze(1) + discount_factor*next_qval*(1-done_t.unsqueeze(1))
     
-    loss = F.mse_loss(qvals, expected_qvals.detach().cuda())
+    if weights is None:
+        loss = F.mse_loss(qvals, expected_qvals)
+    else:
+        td_errors = expected_qvals - qvals
+        loss = (weights.unsqueeze(1) * td_errors.pow(2)).mean()
+        experience.update_priorities(indices, td_errors.detach().abs().mean(1).cpu().numpy())
 
     optimizer.zero_grad()
     loss.backward()
@@ -135,6 +381,17 @@ def cal_TD_Loss(batch_size, model, target_model, optimizer, discount_factor, exp
 
     return loss
 
+## soft_update
+#  @brief Polyak averaging of the target network towards the online network, done in place.
+#  target = (1 - tau) * target + tau * source, which replaces copying the whole state_dict every update_freq frames.
+#  @param target_model Network whose parameters are updated
+#  @param model Network the parameters are taken from
+#  @param tau Interpolation coefficient in (0, 1]; 1 copies the parameters
+def soft_update(target_model, model, tau):
+    with torch.no_grad():
+        for target_param, param in zip(target_model.parameters(), model.parameters()):
+            target_param.lerp_(param, tau)
+
 ##  init_weights
 #   Instantiates the weights of the model on a normal distribution range
 def init_weights(m):
@@ -142,17 +399,145 @@ def init_weights(m):
         nn.init.normal_(m.weight, mean=0., std=0.1)
         nn.init.constant_(m.bias, 0.1)
 
+## Rollout Buffer
+#  @brief Preallocated storage for the rollouts collected by the PPO Agent
+#  The tensors are allocated once with the shape [num_steps, num_envs, ...] on the training device and
+#  written in place every step, which avoids allocating new tensors per step and concatenating them at
+#  the end of each rollout. flatten() returns [num_steps * num_envs, ...] views for ActorCritic.ppo_update.
+class RolloutBuffer(object):
+    ## Constructor
+    #  @param num_steps Number of steps collected per rollout
+    #  @param num_envs Number of environments stepped in parallel
+    #  @param obs_shape Shape of the observations of a single environment
+    #  @param action_shape Shape of the actions of a single environment
+    #  @param device Device the rollout tensors are stored on
+    def __init__(self, num_steps, num_envs, obs_shape, action_shape, device):
+        self.num_steps = num_steps
+        self.num_envs = num_envs
+        self.device = device
+        self.states = torch.zeros((num_steps, num_envs) + tuple(obs_shape), device=device)
+        self.actions = torch.zeros((num_steps, num_envs) + tuple(action_shape), device=device)
+        self.log_probs = torch.zeros((num_steps, num_envs) + tuple(action_shape), device=device)
+        self.values = torch.zeros(num_steps, num_envs, 1, device=device)
+        self.rewards = torch.zeros(num_steps, num_envs, 1, device=device)
+        self.masks = torch.zeros(num_steps, num_envs, 1, device=device)
+        self.returns = torch.zeros(num_steps, num_envs, 1, device=device)
+        self.step = 0
+
+    ## insert_state
+    #  Copies the observations of the current step into the buffer and returns them as a tensor on the
+    #  training device, ready to be passed to the model.
+    #  @param state Array of observations returned by the vectorised environment
+    def insert_state(self, state):
+        self.states[self.step].copy_(torch.as_tensor(np.asarray(state)))
+        return self.states[self.step]
+
+    ## insert
+    #  Stores the outcome of the current step and advances to the next one.
+    #  @param action Actions sampled by the agent
+    #  @param log_prob Log probabilities of the sampled actions
+    #  @param value Values estimated by the critic
+    #  @param reward Array of rewards returned by the vectorised environment
+    #  @param done Array of "episode done" booleans returned by the vectorised environment
+    def insert(self, action, log_prob, value, reward, done):
+        self.actions[self.step].copy_(action)
+        self.log_probs[self.step].copy_(log_prob)
+        self.values[self.step].copy_(value)
+        self.rewards[self.step].copy_(torch.as_tensor(np.asarray(reward)).unsqueeze(1))
+        self.masks[self.step].copy_(torch.as_tensor(1 - np.asarray(done, dtype=np.float32)).unsqueeze(1))
+        self.step = (self.step + 1) % self.num_steps
+
+    ## compute_returns
+    #  Fills the returns of the rollout using the Generalized Advantage Estimation.
+    #  @param next_value Values estimated by the critic for the observations following the rollout
+    def compute_returns(self, next_value, gamma=0.99, tau=0.95):
+        compute_gae_batch(next_value, self.rewards, self.masks, self.values, gamma, tau, out=self.returns)
+
+    ## flatten
+    #  Returns views of states, actions, log_probs, returns and advantages over all steps and environments.
+    def flatten(self):
+        batch_size = self.num_steps * self.num_envs
+        states = self.states.view(batch_size, *self.states.shape[2:])
+        actions = self.actions.view(batch_size, *self.actions.shape[2:])
+        log_probs = self.log_probs.view(batch_size, *self.log_probs.shape[2:])
+        returns = self.returns.view(batch_size, 1)
+        advantages = returns - self.values.view(batch_size, 1)
+        return states, actions, log_probs, returns, advantages
+
+## compute_gae_batch
+#  Returns the Generalized Advantage Estimation returns for a whole rollout in a single backward scan.
+#  The temporal differences of every step are computed at once and the scan only performs one fused
+#  multiply-add per step over all environments, writing the returns in place.
+#  @param next_value Values estimated for the observations following the rollout, shape [num_envs, ...]
+#  @param rewards Tensor or NumPy array of rewards, shape [num_steps, num_envs, ...]
+#  @param masks Tensor or NumPy array of (1 - done) masks, shape [num_steps, num_envs, ...]
+#  @param values Tensor or NumPy array of the estimated values, shape [num_steps, num_envs, ...]
+#  @param out Optional preallocated tensor or array for the returns, with the shape of rewards
+def compute_gae_batch(next_value, rewards, masks, values, gamma=0.99, tau=0.95, out=None):
+    if torch.is_tensor(rewards):
+        next_values = torch.cat([values[1:], next_value.unsqueeze(0)])
+        returns = torch.empty_like(rewards) if out is None else out
+    else:
+        next_values = np.concatenate([values[1:], np.expand_dims(next_value, 0)])
+        # Integer rewards and values still give floating returns
+        returns = np.empty(rewards.shape, dtype=np.result_type(rewards, values, np.float32)) if out is None else out
+    deltas = rewards + gamma * next_values * masks - values
+    discounts = gamma * tau * masks
+    returns[-1] = deltas[-1]
+    # Views of every step are created up front, indexing inside the scan costs more than the arithmetic.
+    # Rows of [T] inputs are viewed as arrays of one element, so the NumPy steps can be written in place.
+    if returns.ndim == 1:
+        deltas, discounts, steps = deltas[:, None], discounts[:, None], returns[:, None]
+    else:
+        steps = returns
+    deltas, discounts, steps = list(deltas), list(discounts), list(steps)
+    if torch.is_tensor(returns):
+        for step in reversed(range(len(steps) - 1)):
+            torch.addcmul(deltas[step], discounts[step], steps[step + 1], out=steps[step])
+    else:
+        for step in reversed(range(len(steps) - 1)):
+            np.multiply(discounts[step], steps[step + 1], out=steps[step])
+            steps[step] += deltas[step]
+    returns += values
+    return returns
+
 ## compute_gae
 #  Returns the Generalized Advantage Estimation based on the PPO algorithm
+#  @note Compatibility wrapper around compute_gae_batch for per-step lists of rewards, masks and values.
 def compute_gae(next_value, rewards, masks, values, gamma=0.99, tau=0.95):
-    values = values + [next_value]
-    gae = 0
-    returns = []
-    for step in reversed(range(len(rewards))):
-        delta = rewards[step] + gamma * values[step + 1] * masks[step] - values[step]
-        gae = delta + gamma * tau * masks[step] * gae
-        returns.insert(0, gae + values[step])
-    return returns
+    stack = torch.stack if torch.is_tensor(rewards[0]) else np.stack
+    returns = compute_gae_batch(next_value, stack(rewards), stack(masks), stack(values), gamma, tau)
+    return list(returns)
+
+## Minibatch Sampler
+#  @brief Epoch-wise shuffled minibatches for the PPO update
+#  The rollout tensors are packed once into a single [batch_size, features] tensor. Every epoch draws one
+#  permutation and shuffles the packed tensor with a single gather, after which the minibatches are
+#  contiguous slices split back into views of the original tensors. Each epoch therefore visits every
+#  sample exactly once, apart from the final partial minibatch when drop_last is set.
+class MinibatchSampler(object):
+    ## Constructor
+    #  @param mini_batch_size Number of samples per minibatch
+    #  @param tensors Rollout tensors sharing the same first dimension
+    #  @param drop_last Skip the final minibatch when it is smaller than mini_batch_size
+    def __init__(self, mini_batch_size, *tensors, drop_last=False):
+        self.mini_batch_size = mini_batch_size
+        self.drop_last = drop_last
+        self.batch_size = tensors[0].size(0)
+        self.shapes = [tensor.shape[1:] for tensor in tensors]
+        self.packed = torch.cat([tensor.reshape(self.batch_size, -1) for tensor in tensors], 1)
+        self.sizes = [int(np.prod(shape)) for shape in self.shapes]
+
+    def __len__(self):
+        if self.drop_last:
+            return self.batch_size // self.mini_batch_size
+        return (self.batch_size + self.mini_batch_size - 1) // self.mini_batch_size
+
+    def __iter__(self):
+        shuffled = self.packed[torch.randperm(self.batch_size, device=self.packed.device)]
+        for idx in range(len(self)):
+            minibatch = shuffled[idx * self.mini_batch_size:(idx + 1) * self.mini_batch_size]
+            yield tuple(column.reshape((-1,) + tuple(shape)) for column, shape in zip(minibatch.split(self.sizes, 1), self.shapes))
 
 ## Actor Crtiic
 #  A Linear Model with the Actor-Crtitc (A2C) architecture.
@@ -196,15 +581,15 @@ class ActorCritic(nn.Module):
     def getOptimizer(self, optimizer):
         self.optimizer = optimizer
 
-    def ppo_iter(self, mini_batch_size, states, actions, log_probs, returns, advantage):
-        batch_size = states.size(0)
-        for _ in range(batch_size // mini_batch_size):
-            rand_ids = np.random.randint(0, batch_size, mini_batch_size)
-            yield states[rand_ids, :], actions[rand_ids, :], log_probs[rand_ids, :], returns[rand_ids, :], advantage[rand_ids, :]
+    ## ppo_iter
+    #  Yields one epoch of shuffled minibatches, see MinibatchSampler.
+    def ppo_iter(self, mini_batch_size, states, actions, log_probs, returns, advantage, drop_last=False):
+        return iter(MinibatchSampler(mini_batch_size, states, actions, log_probs, returns, advantage, drop_last=drop_last))
 
-    def ppo_update(self, ppo_epochs, mini_batch_size, states, actions, log_probs, returns, advantages, clip_param=0.4):
+    def ppo_update(self, ppo_epochs, mini_batch_size, states, actions, log_probs, returns, advantages, clip_param=0.4, drop_last=False):
+        sampler = MinibatchSampler(mini_batch_size, states, actions, log_probs, returns, advantages, drop_last=drop_last)
         for _ in range(ppo_epochs):
-            for state, action, old_log_probs, return_, advantage in self.ppo_iter(mini_batch_size, states, actions, log_probs, returns, advantages):
+            for state, action, old_log_probs, return_, advantage in sampler:
                 dist, value = self.forward(state)
                 entropy = dist.entropy().mean()
                 new_log_probs = dist.log_prob(action)
@@ -221,4 +606,45 @@ class ActorCritic(nn.Module):
                 self.optimizer.zero_grad()
                 loss.backward()
                 self.optimizer.step()
-            
\ No newline at end of file
+            
+
+## export_actor
+#  @brief Builds the module used for inference on the robot: the actor network of an ActorCritic alone, scripted with
+#  TorchScript and frozen on the cpu. The critic and the Normal distribution are dropped and the module returns the
+#  deterministic mean action, so it can be loaded with load_actor without the class definitions.
+#  With quantize, the Linear layers are dynamically quantized to int8 weights before scripting and their inputs are
+#  quantized on the fly, which shrinks the module about four times. The input layer stays in float: it is tiny and
+#  quantizing raw observations of mixed scales (angles and velocities) with one scale dominates the action error.
+#  @param model Trained ActorCritic, left untouched
+#  @param file_path Optional path the scripted module is saved to
+#  @param quantize Quantize the hidden and output Linear layers of the actor to int8
+def export_actor(model, file_path=None, quantize=False):
+    actor = copy.deepcopy(model.actor).cpu().eval()
+    if quantize:
+        linear_layers = [name for name, module in actor.named_modules() if isinstance(module, nn.Linear)]
+        actor = torch.ao.quantization.quantize_dynamic(actor, set(linear_layers[1:]), dtype=torch.qint8)
+    policy = torch.jit.freeze(torch.jit.script(actor))
+    if file_path is not None:
+        torch.jit.save(policy, file_path)
+    return policy
+
+## load_actor
+#  Loads a module saved by export_actor.
+def load_actor(file_path, device=torch.device("cpu")):
+    return torch.jit.load(file_path, map_location=device).eval()
+
+## policy_action
+#  Returns the mean action of an exported actor for a single state as a NumPy array.
+def policy_action(policy, state):
+    with torch.inference_mode():
+        return policy(torch.as_tensor(np.float32(state)).unsqueeze(0))[0].numpy()
+
+## policy_error
+#  Accuracy check of an exported policy: returns the maximum and mean absolute difference between its actions and the
+#  mean actions of the reference ActorCritic on the given states, e.g. states recorded with Agent.test_env.
+def policy_error(model, policy, states):
+    with torch.inference_mode():
+        states_t = torch.as_tensor(np.float32(states))
+        reference = model.actor(states_t.to(next(model.parameters()).device)).cpu()
+        error = (policy(states_t) - reference).abs()
+    return error.max().item(), error.mean().item()
@@ -9,16 +9,12 @@
 # Packages for processing
 import numpy as np
 import math
-import cv2
-import time
 
-# Packages for kernel operations
-import wiringpi
-from picamera import PiCamera
-from PIL import Image
+# Packages for kernel operations, the hardware packages are imported by the device backend
 from include.servo_daemon_interface import *
-from include.i2c_handler import PCA9685
-from include.filters import Kalman
+from include.i2c_handler import PCA9685, MPU6050
+from include.filters import BatchKalman
+from include.device_backend import HardwareBackend
 
 ## ServoControl
 #  Parent class used to control the servos on the platform. The class is instantiated with
@@ -26,12 +22,17 @@ from include.filters import Kalman
 #  interface will reset the position of the servo back to 0 degrees. Customisations of servo
 #  characteristics can be implemented into the sytem. 
 class ServoControl:
-    def __init__(self, servo_pins_list):
+    def __init__(self, servo_pins_list, writer=None, backend=None):
     ## Constructor
     #  Upon constructing the class, the ServoControl class will set the relevant GPIO pins
     #  for servo control. Then initiate them to the starting position of 0.
+    #  @param writer ServoBlasterWriter the commands are sent with. Defaults to the writer of
+    #  the backend.
+    #  @param backend Device backend, see include/device_backend.py. Defaults to the hardware.
         super(ServoControl, self).__init__()
+        backend = backend if backend is not None else HardwareBackend()
         self._servo_pins = servo_pins_list
+        self.writer = writer if writer is not None else backend.servo_writer()
         self.servo_pos_before = 0
         self.servo_pos_after = 0
         self.servo_pwm_min = 550
@@ -40,7 +41,7 @@ class ServoControl:
         self._init_servos()
         self.dt = 0.01
         self.mujoco_range = [-5, 5]
-        self.pca = PCA9685()
+        self.pca = PCA9685(bus=backend.i2c_bus(0x40))
 
     ## init_servos
     #  Initiates the GPIO pins to the relevant servos used in the platform currently.
@@ -53,7 +54,8 @@ class ServoControl:
     #  Sets the servo position back to the initial state. Defaults to 0 degrees (1500us).   
     def _init_servo_pos(self):
         for i in range(len(self._servo_pins)):
-            servo_set_angle(self._servo_pins[i], self._init_pos_angle)
+            self.writer.set_angle(self._servo_pins[i], self._init_pos_angle)
+        self.writer.flush()
     
     ## convert_to_pwm
     #  Maps the agent's actions to the pwm control signals
@@ -76,11 +78,21 @@ class ServoControl:
         signal = self._convert_to_pwm(control_sig)
         analog = servo_map(signal, 0, 180, self.servo_pwm_min, self.servo_pwm_max)
         #self.pca.servo_set_angle(servo_num, signal)
-        servo_set_angle(self._servo_pins[servo_num], signal)
+        self.writer.set_angle(self._servo_pins[servo_num], signal)
         self.servo_pos_after = signal
            
     def moveMotor(self, servo_num, signal_pwm):
         self._actuate_Motor(servo_num, signal_pwm)
+        self.writer.flush()
+
+    ## moveMotors
+    #  Actuates every servo with one control signal each; the commands of the step are sent
+    #  to the daemon in a single write.
+    #  @param control_sigs Control signals, in the order of the servo pins list
+    def moveMotors(self, control_sigs):
+        for servo_num, control_sig in enumerate(control_sigs):
+            self._actuate_Motor(servo_num, control_sig)
+        self.writer.flush()
     
     ## readSensor
     #  Returns the servo's angle in radians 
@@ -94,7 +106,7 @@ class ServoControl:
 #  walking but due to the lack of resources remains untested on the final control algorithm.
 #  Class has been unit tested on a higher level to function fine. 
 class MPU6050Control:
-    def __init__(self):
+    def __init__(self, bus=None, fifo=False, backend=None):
     ## Constructor
     #  Upon constructing the class, MPU6050Control will source out a MPU6050 in the I2C bus
     #  Should there be an instance where the gyroscope is not found during initialization,
@@ -102,109 +114,41 @@ class MPU6050Control:
     #  relative to the MPU6050. Any other orientation-measuring devices with different
     #  properties or communication channel will have to be implemented separately. Kalman
     #  filters are used in this control class.
+    #  @param bus I2C bus interface of the sensor, see include/i2c_handler.py. Defaults to the
+    #  bus of the backend.
+    #  @param fifo Sample at 1 kHz into the FIFO of the sensor; every update then drains the
+    #  FIFO and uses the mean of the samples received since the previous update.
+    #  @param backend Device backend, see include/device_backend.py. Defaults to the hardware.
         super(MPU6050Control, self).__init__()
-        self.address = 0x68
-        self.channel = 1
-        self.registers = {"PWR_MGMT_1": 0x6B,
-                "SMPLRT_DIV": 0x19,
-                "CONFIG": 0x1A,
-                "GYRO_CONFIG": 0x1B,
-                "INT_ENABLE": 0x38,
-                "ACCEL_XOUT_H": 0x3B,
-                "ACCEL_YOUT_H": 0x3D,
-                "ACCEL_ZOUT_H": 0x3F,
-                "GYRO_XOUT_H": 0x43,
-                "GYRO_YOUT_H": 0x45,
-                "GYRO_ZOUT_H": 0x47
-                  }
-        self.device = self._initConnection()
-        self._initMPU()
+        if bus is None:
+            bus = (backend if backend is not None else HardwareBackend()).i2c_bus(0x68)
+        self.mpu = MPU6050(bus=bus, fifo=fifo)
+        self.samples = np.empty((0, 6))
         self.dt = 0.01 #Threaded at 100ms
-        self.kalman_X = Kalman()
-        self.kalman_Y = Kalman()
+        # Roll (X) and pitch (Y) are filtered together
+        self.kalman = BatchKalman(2)
         self._initPosition()
-        self.kalman_X.setAngle(self.roll)
-        self.kalman_Y.setAngle(self.pitch)
+        self.kalman.setAngle([self.roll, self.pitch])
         self.kalAngleX = 0
         self.kalAngleY = 0
 
-    ## initConnection
-    #  Checks for a return from the MPU6050 in the I2C bus. Should there be no gyroscope
-    #  found, the class will assert an error and exit the program.   
-    def _initConnection(self):
-        try:
-            device = wiringpi.wiringPiI2CSetup(self.address)
-            print("Successfully conneced to MPU6050 Sensor.\n")
-            return device
-        except AttributeError:
-            print("Failed to connect to device. Please check the connection.\n")
-            print("Tip:\t You may need to initialize the I2C bus using raspi-config.\n")
-            exit(0)
-    
-    ## initMPU
-    #  Sends I2C command to configure the MPU6050 accoridng to specifications. Enables
-    #  feedback of the sensor to read gyroscope and accelerometer messages.
-    def _initMPU(self):
-        try:
-            self._writeData16bit("SMPLRT_DIV", 7)
-            self._writeData16bit("PWR_MGMT_1", 1)
-            self._writeData16bit("CONFIG", 0)
-            self._writeData16bit("GYRO_CONFIG", 24)
-            self._writeData16bit("INT_ENABLE", 1)
-        except AttributeError:
-            print("Cannot write to config registers. Exiting...\n")
-            exit(0)
-
     ## initPosition
     #  Gets the current position of the platform during initialization for localization.     
     def _initPosition(self):
-        self._getAccData()
-        self._getGyroData()
+        self._getSensorData()
         self.getPlatformAngle()
-    
-    ## readData8bit 
-    #  Reads the given register name for a 8-bit resolution.
-    #  @param register_name string input of the relevant register to be read.
-    def _readData8bit(self, register_name):
-        high = wiringpi.wiringPiI2CReadReg8(self.device, self.registers[register_name])
-        low = wiringpi.wiringPiI2CReadReg8(self.device, self.registers[register_name]+1)
-        value = ((high << 8) | low) 
-        return value if value > 32786 else value - 65546
 
-    ## readData16bit 
-    #  Reads the given register name for a 16-bit resolution.
-    #  @param register_name string input of the relevant register to be read.   
-    def _readData16bit(self, register_name):
-        high = wiringpi.wiringPiI2CReadReg16(self.device, self.registers[register_name])
-        low = wiringpi.wiringPiI2CReadReg16(self.device, self.registers[register_name]+1)
-        value = ((high << 8) | low) 
-        return value if value > 32786 else value - 65546
-    
-    ## writedData8bit 
-    #  Writes to the given register name of 8-bit resolution.
-    #  @param register_name string input of the relevant register to be written.   
-    def _writeData8bit(self, register_name, data):
-        return wiringpi.wiringPiI2CWriteReg8(self.device, self.registers[register_name], data)
-    
-    ## writedData16bit 
-    #  Writes to the given register name of 16-bit resolution.
-    #  @param register_name string input of the relevant register to be written.  
-    def _writeData16bit(self, register_name, data):
-        return wiringpi.wiringPiI2CWriteReg16(self.device, self.registers[register_name], data)
-    
-    ## getAccData 
-    #  Reads the accelerometer values and returns the messages converted to their raw states.   
-    def _getAccData(self):
-        self.acc_x = self._readData16bit("ACCEL_XOUT_H")/16384
-        self.acc_y = self._readData16bit("ACCEL_YOUT_H")/16384
-        self.acc_z = self._readData16bit("ACCEL_ZOUT_H")/16384
-    
-    ## getGyrocData 
-    #  Reads the gyroscope values and returns the messages converted to their raw states. 
-    def _getGyroData(self):
-        self.gyro_x = self._readData16bit("GYRO_XOUT_H")/131
-        self.gyro_y = self._readData16bit("GYRO_YOUT_H")/131
-        self.gyro_z = self._readData16bit("GYRO_ZOUT_H")/131
+    ## getSensorData
+    #  Reads the accelerometer and gyroscope with a single burst read, or drains the FIFO
+    #  and averages its samples. A burst read is used when the FIFO holds no sample yet.
+    def _getSensorData(self):
+        if self.mpu.fifo:
+            self.samples = self.mpu.read_fifo()
+        if len(self.samples):
+            values = self.samples.mean(axis=0)
+        else:
+            values = self.mpu.read_sensors()
+        self.acc_x, self.acc_y, self.acc_z, self.gyro_x, self.gyro_y, self.gyro_z = values.tolist()
     
     ## kalmanFilter 
     #  Applies the kalman filter to the roll angles observed by the platform.
@@ -212,6 +156,12 @@ class MPU6050Control:
         #filteredData = kf_update(self.roll_list)
         return filteredData
     
+    ## sampleAngles
+    #  Roll and pitch of each FIFO sample, see getPlatformAngle.
+    def _sampleAngles(self, samples):
+        acc_x, acc_y, acc_z = samples[:, 0], samples[:, 1], samples[:, 2]
+        return np.stack([np.arctan2(acc_y, acc_z), np.arctan(-acc_x/np.sqrt(acc_y**2 + acc_z**2))], axis=1)
+
     ## getPlatformAngle 
     #  Converts the accelerometer and gyroscope values to valid radian form.
     def getPlatformAngle(self):
@@ -220,18 +170,19 @@ class MPU6050Control:
     
     ## kf_update
     #  Updates the angles as according to the structure of the Kalman Filter.
+    #  In FIFO mode every sample drained since the previous update is filtered.
     def kf_update(self):
         self._initPosition()
         if((self.pitch < -90 and self.kalAngleY >90) or (self.pitch > 90 and self.kalAngleY < -90)):
-            self.kalman_Y.setAngle(self.pitch)
-            self.kalAngleY   = self.pitch
-            self.gyroYAngle  = self.pitch
+            self.kalman.setAngle(self.pitch, axes=1)
+        gyro_sign = -1 if abs(self.pitch)>90 else 1
+        if len(self.samples):
+            rates = self.samples[:, 3:5] * [gyro_sign, 1]
+            angles = self.kalman.filter_log(self._sampleAngles(self.samples), rates, 1 / self.mpu.sample_rate)[-1]
         else:
-            self.kalAngleY = self.kalman_Y.getAngle(self.pitch,self.gyro_y,self.dt)
-
-        if(abs(self.kalAngleY)>90):
-            self.gyro_x  = -self.gyro_x
-            self.kalAngleX = self.kalman_X.getAngle(self.roll,self.gyro_x,self.dt)
+            angles = self.kalman.getAngle([self.roll, self.pitch], [gyro_sign*self.gyro_x, self.gyro_y], self.dt)
+        self.kalAngleX, self.kalAngleY = angles.tolist()
+        self.gyro_x = gyro_sign*self.gyro_x
 
         self.gyroXAngle = self.gyro_x*self.dt
         self.gyroYAngle = self.gyro_y*self.dt
@@ -243,25 +194,22 @@ class MPU6050Control:
         
         return self.kalAngleX, self.kalAngleY
         
+## PiCameraControl
+#  Captures the RGB frames of the camera of the platform, from the frame source of the device
+#  backend.
 class PiCameraControl:
-    def __init__(self, camera_resolution):
+    def __init__(self, camera_resolution, backend=None):
+    ## Constructor
+    #  @param camera_resolution Height and width of the frames
+    #  @param backend Device backend, see include/device_backend.py. Defaults to the hardware.
         super(PiCameraControl, self).__init__()
-        camera_resolution_h, camera_resolution_w = camera_resolution
-        self.camera = Picamera()
-        self._initCamera()
-        self.image = np.empty(camera_resolution_h, camera_resolution_w)
-        
-    def _initCamera(self):
-        try:
-            self.camera.start_preview()
-            time.sleep(5)
-            self.camera.stop_preview()
-        except AttributeError:
-            print("Could not start the camera, please check the connections. Exiting.\n")
-            print("Tip:\t You may need to initialize the camera using raspi-config.\n")
-            exit(0)
-        finally:
-            self.camera.close()
-    # todo: Verify capture images and feed to network.
+        backend = backend if backend is not None else HardwareBackend()
+        self.camera = backend.camera(camera_resolution)
+        self.image = None
+
+    ## captureImage
+    #  Captures a frame as an array of shape [height, width, 3]. The array is reused by the
+    #  next capture.
     def captureImage(self):
-        return self.camera.capture(self.image, 'rgb')
\ No newline at end of file
+        self.image = self.camera.capture()
+        return self.image
@@ -0,0 +1,103 @@
+## @package control_loop
+#  @brief Fixed rate scheduling of the control cycle of the robot.
+#  A ControlLoop runs the policy, actuation and sensing of each step against absolute deadlines, so the time spent in
+#  the step no longer adds to the period as a fixed sleep at the end of the step does. The lateness of every cycle and
+#  the deadlines missed are recorded to report the timing of the loop.
+
+import time
+from collections import deque
+import numpy as np
+
+## ControlLoop
+#  Deadline scheduler of a control loop at control_freq Hz. Every call to wait ends the current cycle: it sleeps until
+#  the deadline of the cycle, which is always a multiple of the period after start, and starts the next one. A cycle
+#  finishing after its deadline is an overrun; the next cycle then starts at once and the deadlines already missed are
+#  skipped rather than run back to back, so the loop keeps its phase.
+class ControlLoop:
+    def __init__(self, control_freq, spin_time=0.0, history=10000, clock=time.perf_counter, sleep=time.sleep):
+    ## Constructor
+    #  @param control_freq Frequency of the loop in Hz
+    #  @param spin_time Time in seconds before each deadline spent polling the clock instead of sleeping, trading cpu
+    #  time for a smaller wake up latency
+    #  @param history Number of the latest cycles the statistics are computed over
+    #  @param clock, sleep Time source and sleep function, replaceable by simulated ones
+        super(ControlLoop, self).__init__()
+        self.control_freq = control_freq
+        self.period = 1.0 / control_freq
+        self.spin_time = spin_time
+        self.clock = clock
+        self.sleep = sleep
+        self.lateness = deque(maxlen=history)
+        self.work_times = deque(maxlen=history)
+        self.start()
+
+    ## start
+    #  Starts the first cycle now and clears the statistics.
+    def start(self):
+        self.start_time = self.clock()
+        self.cycle_start = self.start_time
+        self.deadline = self.start_time + self.period
+        self.cycles = 0
+        self.overruns = 0
+        self.missed = 0
+        self.lateness.clear()
+        self.work_times.clear()
+
+    ## wait
+    #  Ends the current cycle: waits for its deadline unless it already passed, and starts the next cycle.
+    #  @return Time in seconds the next cycle started after the deadline of the current one
+    def wait(self):
+        now = self.clock()
+        self.work_times.append(now - self.cycle_start)
+        if now > self.deadline:
+            self.overruns += 1
+            missed = int((now - self.deadline) // self.period)
+            self.missed += missed
+            wake = now
+            late = now - self.deadline
+            self.deadline += missed * self.period
+        else:
+            remaining = self.deadline - now - self.spin_time
+            if remaining > 0:
+                self.sleep(remaining)
+            wake = self.clock()
+            while wake < self.deadline:
+                wake = self.clock()
+            late = wake - self.deadline
+        self.lateness.append(late)
+        self.deadline += self.period
+        self.cycle_start = wake
+        self.cycles += 1
+        return late
+
+    ## run
+    #  Runs step once per cycle for the given number of cycles.
+    def run(self, step, steps):
+        for _ in range(steps):
+            step()
+            self.wait()
+
+    ## stats
+    #  Timing of the latest cycles: the work time spent in each cycle, the lateness of the start of the next cycle
+    #  (jitter) in milliseconds, and the overruns and missed deadlines since start.
+    def stats(self):
+        lateness = np.array(self.lateness) * 1000
+        work_times = np.array(self.work_times) * 1000
+        elapsed = self.cycle_start - self.start_time
+        stats = {'cycles': self.cycles,
+                 'overruns': self.overruns,
+                 'missed deadlines': self.missed,
+                 'rate (Hz)': self.cycles / elapsed if elapsed > 0 else 0.0}
+        for percentile in (50, 90, 99):
+            stats['work p{} (ms)'.format(percentile)] = np.percentile(work_times, percentile) if self.cycles else 0.0
+        for percentile in (50, 90, 99):
+            stats['jitter p{} (ms)'.format(percentile)] = np.percentile(lateness, percentile) if self.cycles else 0.0
+        stats['jitter max (ms)'] = lateness.max() if self.cycles else 0.0
+        return stats
+
+    ## report
+    #  Prints the statistics of the loop.
+    def report(self):
+        print("Control loop at {0} Hz:".format(self.control_freq))
+        for name, value in self.stats().items():
+            print("\t{0}: {1:.3f}".format(name, value) if isinstance(value, float) else "\t{0}: {1}".format(name, value))
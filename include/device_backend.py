@@ -0,0 +1,254 @@
+## @package device_backend
+#  @brief Device backends of the robot: the devices RobotPlatform, ServoControl, MPU6050Control and PiCameraControl
+#  talk to are created by a backend. HardwareBackend opens the servoblaster device, the I2C chips through WiringPi
+#  and the Pi camera, importing wiringpi and picamera only when a device is opened. SimulatedBackend creates in-memory
+#  fakes of the same devices at the level of their interfaces (servoblaster commands, I2C registers and camera
+#  frames) with a configurable latency per transaction, so the robot code runs unchanged on any Linux machine.
+
+import time
+import numpy as np
+from include.servo_daemon_interface import ServoBlasterWriter, servo_writer
+
+## VirtualServoBlaster
+#  In-memory servoblaster device: a file-like object parsing the "P1-<pin>=<value>" commands written to it, as the
+#  servoblaster daemon does. Every write takes latency seconds.
+class VirtualServoBlaster:
+    def __init__(self, latency=0.0):
+        super(VirtualServoBlaster, self).__init__()
+        self.latency = latency
+        self.outputs = {}
+        self.writes = 0
+        self.closed = False
+
+    def write(self, commands):
+        if self.latency:
+            time.sleep(self.latency)
+        self.writes += 1
+        for command in commands.splitlines():
+            pin, value = command.split("=")
+            self.outputs[int(pin.split("-")[1])] = float(value)
+        return len(commands)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+## VirtualI2CBus
+#  Fake I2C device implementing the bus interface of include/i2c_handler.py over a 256 byte register file. Block
+#  transfers auto increment the register address like the PCA9685 and MPU6050 do, and every call is recorded as one
+#  transaction of (kind, register, data) taking latency seconds.
+class VirtualI2CBus:
+    def __init__(self, max_block_size=32, latency=0.0):
+        super(VirtualI2CBus, self).__init__()
+        self.max_block_size = max_block_size
+        self.latency = latency
+        self.registers = bytearray(256)
+        self.transactions = []
+
+    def _transaction(self, kind, register, data):
+        if self.latency:
+            time.sleep(self.latency)
+        self.transactions.append((kind, register, data))
+
+    def read_byte(self, register):
+        self._transaction("read", register, 1)
+        return self.registers[register]
+
+    def write_byte(self, register, value):
+        self._transaction("write", register, bytes([value]))
+        self.registers[register] = value
+
+    def read_block(self, register, length):
+        assert length <= self.max_block_size
+        self._transaction("read", register, length)
+        return bytes(self.registers[register:register + length])
+
+    def write_block(self, register, data):
+        data = bytes(data)
+        assert len(data) <= self.max_block_size
+        self._transaction("write", register, data)
+        self.registers[register:register + len(data)] = data
+
+## VirtualPCA9685Bus
+#  VirtualI2CBus emulating the PWM registers of the PCA9685: writes to the ALL_LED registers set every channel.
+class VirtualPCA9685Bus(VirtualI2CBus):
+    ALL_LED = 0xFA
+
+    def write_block(self, register, data):
+        super(VirtualPCA9685Bus, self).write_block(register, data)
+        if register == self.ALL_LED:
+            self.registers[0x06:0x46] = bytes(self.registers[self.ALL_LED:self.ALL_LED + 4]) * 16
+
+    ## off_counts
+    #  The off count of the pulse of every channel.
+    def off_counts(self):
+        return np.frombuffer(bytes(self.registers[0x06:0x46]), dtype="<u2").reshape(16, 2)[:, 1].copy()
+
+## VirtualMPU6050Bus
+#  VirtualI2CBus emulating the data registers and the FIFO of the MPU6050. Samples are given as raw 16 bit counts.
+#  With realtime_fifo, the enabled FIFO fills with the current sensor values at the sample rate set in SMPLRT_DIV as
+#  time passes, keeping its last FIFO_SIZE bytes when it overflows like the chip does.
+class VirtualMPU6050Bus(VirtualI2CBus):
+    FIFO_SIZE = 1024
+
+    def __init__(self, max_block_size=32, latency=0.0, realtime_fifo=False):
+        super(VirtualMPU6050Bus, self).__init__(max_block_size, latency)
+        self.realtime_fifo = realtime_fifo
+        self.fifo = bytearray()
+        self._fifo_time = time.perf_counter()
+
+    ## set_sensors
+    #  Sets the 7 raw values from ACCEL_XOUT_H to GYRO_ZOUT_L (accelerometer, temperature and gyroscope).
+    def set_sensors(self, raw):
+        self.registers[0x3B:0x49] = np.asarray(raw, dtype=">i2").tobytes()
+
+    ## push_fifo
+    #  Appends raw samples of [acc_x, acc_y, acc_z, gyro_x, gyro_y, gyro_z] to the FIFO.
+    def push_fifo(self, raw_samples):
+        self.fifo += np.asarray(raw_samples, dtype=">i2").tobytes()
+
+    ## fillFifo
+    #  Adds the samples taken since the previous fill when the FIFO is enabled.
+    def _fillFifo(self):
+        now = time.perf_counter()
+        if not (self.registers[0x23] and self.registers[0x6A] & 0x40):
+            self._fifo_time = now
+            return
+        sample_rate = 1000.0 / (1 + self.registers[0x19])
+        samples = int((now - self._fifo_time) * sample_rate)
+        if samples:
+            self._fifo_time += samples / sample_rate
+            raw = np.frombuffer(bytes(self.registers[0x3B:0x49]), dtype=">i2")[[0, 1, 2, 4, 5, 6]]
+            self.push_fifo(np.tile(raw, (min(samples, self.FIFO_SIZE // 12 + 1), 1)))
+            del self.fifo[:-self.FIFO_SIZE]
+
+    def write_byte(self, register, value):
+        super(VirtualMPU6050Bus, self).write_byte(register, value)
+        if register == 0x6A and value & 0x04:
+            self.fifo.clear()
+            self._fifo_time = time.perf_counter()
+
+    def read_block(self, register, length):
+        if register == 0x72:
+            if self.realtime_fifo:
+                self._fillFifo()
+            self._transaction("read", register, length)
+            return min(len(self.fifo), self.FIFO_SIZE).to_bytes(2, "big")
+        if register == 0x74:
+            assert length <= self.max_block_size
+            self._transaction("read", register, length)
+            data, self.fifo = bytes(self.fifo[:length]), self.fifo[length:]
+            return data
+        return super(VirtualMPU6050Bus, self).read_block(register, length)
+
+## VirtualCamera
+#  Camera frame source returning synthetic RGB frames of a gradient moving by one level per frame. Every capture takes
+#  latency seconds and fills the same preallocated frame.
+class VirtualCamera:
+    def __init__(self, resolution, latency=0.0):
+        super(VirtualCamera, self).__init__()
+        height, width = resolution
+        self.latency = latency
+        self.frame_idx = 0
+        rows, columns = np.mgrid[0:height, 0:width]
+        self._gradient = np.stack([rows, columns, rows + columns], axis=-1).astype(np.uint8)
+        self.frame = np.empty((height, width, 3), dtype=np.uint8)
+
+    def capture(self):
+        if self.latency:
+            time.sleep(self.latency)
+        np.add(self._gradient, self.frame_idx % 256, out=self.frame, casting="unsafe")
+        self.frame_idx += 1
+        return self.frame
+
+    def close(self):
+        pass
+
+## PiCameraFrameSource
+#  Frame source capturing RGB frames from the Pi camera through its video port into a preallocated array. The camera
+#  fills whole blocks of 32 by 16 pixels, so the array is rounded up and the requested resolution is returned.
+class PiCameraFrameSource:
+    def __init__(self, resolution, warmup=2.0):
+        super(PiCameraFrameSource, self).__init__()
+        height, width = resolution
+        try:
+            from picamera import PiCamera
+            self.camera = PiCamera(resolution=(width, height))
+            time.sleep(warmup)
+        except (AttributeError, ImportError):
+            print("Could not start the camera, please check the connections. Exiting.\n")
+            print("Tip:\t You may need to initialize the camera using raspi-config.\n")
+            exit(0)
+        self._buffer = np.empty(((height + 15) // 16 * 16, (width + 31) // 32 * 32, 3), dtype=np.uint8)
+        self.frame = self._buffer[:height, :width]
+
+    def capture(self):
+        self.camera.capture(self._buffer, 'rgb', use_video_port=True)
+        return self.frame
+
+    def close(self):
+        self.camera.close()
+
+## HardwareBackend
+#  Devices of the Raspberry Pi.
+class HardwareBackend:
+    ## setup
+    #  Initialises WiringPi.
+    def setup(self):
+        import wiringpi
+        wiringpi.wiringPiSetup()
+
+    ## servo_writer
+    #  The ServoBlasterWriter shared on /dev/servoblaster.
+    def servo_writer(self):
+        return servo_writer()
+
+    ## i2c_bus
+    #  Returns None: the drivers of include/i2c_handler.py then open the chip on the address through WiringPi and
+    #  report a missing device themselves.
+    def i2c_bus(self, address):
+        return None
+
+    def camera(self, resolution):
+        return PiCameraFrameSource(resolution)
+
+## SimulatedBackend
+#  In-memory devices: a VirtualServoBlaster, a VirtualPCA9685Bus at 0x40 and a VirtualMPU6050Bus at 0x68, lying level
+#  and still, and VirtualCameras. The buses are created once per address, so the devices of a robot can be inspected
+#  through the backend.
+class SimulatedBackend:
+    def __init__(self, servo_latency=0.0, i2c_latency=0.0, camera_latency=0.0, max_block_size=32):
+    ## Constructor
+    #  @param servo_latency Time in seconds of each write to the servoblaster device
+    #  @param i2c_latency Time in seconds of each I2C transaction
+    #  @param camera_latency Time in seconds of each frame capture
+        super(SimulatedBackend, self).__init__()
+        self.servo_latency = servo_latency
+        self.i2c_latency = i2c_latency
+        self.camera_latency = camera_latency
+        self.max_block_size = max_block_size
+        self.servoblaster = VirtualServoBlaster(servo_latency)
+        self.buses = {}
+
+    def setup(self):
+        pass
+
+    def servo_writer(self):
+        return ServoBlasterWriter(device=self.servoblaster)
+
+    def i2c_bus(self, address):
+        if address not in self.buses:
+            if address == 0x40:
+                self.buses[address] = VirtualPCA9685Bus(self.max_block_size, self.i2c_latency)
+            elif address == 0x68:
+                self.buses[address] = VirtualMPU6050Bus(self.max_block_size, self.i2c_latency, realtime_fifo=True)
+                # 1 g on the Z axis at 16384 counts per g and a temperature of 25 degrees
+                self.buses[address].set_sensors([0, 0, 16384, int((25 - 36.53) * 340), 0, 0, 0])
+            else:
+                self.buses[address] = VirtualI2CBus(self.max_block_size, self.i2c_latency)
+        return self.buses[address]
+
+    def camera(self, resolution):
+        return VirtualCamera(resolution, self.camera_latency)
@@ -0,0 +1,114 @@
+## @package evaluator.py
+#  @brief Evaluates snapshots of a policy in a background process while the agent keeps training
+#  The Evaluator owns a separate process with its own vectorised environment. The agent submits snapshots
+#  of its model weights, the evaluator runs one episode per environment in parallel and reports the episode
+#  rewards back through a queue which the agent polls without blocking.
+#  @date 18-Oct-2026
+
+import copy
+import queue
+import multiprocessing
+import numpy as np
+import torch
+from common.multiprocessing_env import SubprocVecEnv, CloudpickleWrapper
+
+## evaluate_policy
+#  Runs one episode on every environment of envs with the given model and returns the total reward of
+#  each episode. Rewards received after an environment finished its first episode are ignored.
+#  @param model ActorCritic style model returning the action distribution and value of a state
+#  @param envs Vectorised environment the episodes are run on
+#  @param device Device the model is stored on
+def evaluate_policy(model, envs, device=torch.device("cpu")):
+    state = envs.reset()
+    total_rewards = np.zeros(envs.num_envs)
+    finished = np.zeros(envs.num_envs, dtype=bool)
+    with torch.no_grad():
+        while not finished.all():
+            dist, _ = model(torch.FloatTensor(state).to(device))
+            state, reward, done, _ = envs.step(dist.sample().cpu().numpy())
+            total_rewards += np.where(finished, 0, reward)
+            finished |= done
+    return total_rewards
+
+## network_copy
+#  Returns a CPU copy of model without the optimizers attached to it, e.g. by ActorCritic.getOptimizer, as the
+#  evaluation process only needs the network and their state would double the size of the copy sent to it.
+def network_copy(model):
+    memo = {id(value): None for value in vars(model).values() if isinstance(value, torch.optim.Optimizer)}
+    return copy.deepcopy(model, memo).cpu()
+
+## evaluator_worker
+#  Main loop of the evaluation process. Waits for weight snapshots, evaluates them and puts
+#  (frame_idx, episode rewards) on the results queue until it receives None.
+def evaluator_worker(model_wrapper, env_fns_wrapper, snapshots, results, envs_per_worker):
+    torch.set_num_threads(1)
+    model = model_wrapper.x
+    model.eval()
+    envs = SubprocVecEnv(env_fns_wrapper.x, envs_per_worker=envs_per_worker)
+    try:
+        while True:
+            snapshot = snapshots.get()
+            if snapshot is None:
+                break
+            frame_idx, state_dict = snapshot
+            model.load_state_dict(state_dict)
+            results.put((frame_idx, evaluate_policy(model, envs)))
+    finally:
+        envs.close()
+
+## Evaluator
+#  Background evaluator used by the PPO Agent for early stopping without pausing data collection.
+class Evaluator:
+    ## Constructor
+    #  @param model Model to evaluate. A CPU copy of the network is sent to the evaluation process, later snapshots
+    #  only transfer the weights.
+    #  @param env_fns List of thunks creating the evaluation environments, one episode is run on each.
+    #  @param envs_per_worker Number of evaluation environments hosted by each subprocess.
+    #  @param max_pending Number of snapshots which may wait for evaluation before new ones are skipped.
+    def __init__(self, model, env_fns, envs_per_worker=1, max_pending=1):
+        self.max_pending = max_pending
+        self.pending = 0
+        self.snapshots = multiprocessing.Queue()
+        self.results = multiprocessing.Queue()
+        model = network_copy(model)
+        # Not a daemon, as daemonic processes cannot start the workers of the vectorised environment.
+        self.process = multiprocessing.Process(target=evaluator_worker,
+            args=(CloudpickleWrapper(model), CloudpickleWrapper(env_fns), self.snapshots, self.results, envs_per_worker))
+        self.process.start()
+
+    ## submit
+    #  Sends a snapshot of the model weights for evaluation. The snapshot is skipped and False is returned
+    #  when max_pending evaluations are already waiting, so the trainer is never blocked.
+    #  @param frame_idx Frame index the snapshot was taken at, reported back with the results.
+    #  @param model Model whose weights are evaluated.
+    def submit(self, frame_idx, model):
+        if self.pending >= self.max_pending:
+            return False
+        state_dict = {name: tensor.detach().cpu().clone() for name, tensor in model.state_dict().items()}
+        self.snapshots.put((frame_idx, state_dict))
+        self.pending += 1
+        return True
+
+    ## poll
+    #  Returns the (frame_idx, episode rewards) of every evaluation finished since the last call.
+    #  @param block Wait for all pending evaluations to finish before returning.
+    def poll(self, block=False):
+        finished = []
+        while self.pending:
+            try:
+                finished.append(self.results.get(block=block))
+            except queue.Empty:
+                break
+            self.pending -= 1
+        return finished
+
+    ## close
+    #  Stops the evaluation process once the pending evaluations are finished. The process is terminated
+    #  when it does not exit within timeout seconds, e.g. when it hangs in an environment.
+    def close(self, timeout=30):
+        if self.process.is_alive():
+            self.snapshots.put(None)
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout)
@@ -8,35 +8,51 @@ import numpy as np
 import torch
 import torch.optim as optim
 from include.agent import Agent
-from include.agentArchitecture import DQN, ActorCritic, cal_TD_Loss, compute_gae
+from include.agentArchitecture import DQN, BranchingDQN, ActorCritic, RolloutBuffer, cal_TD_Loss, soft_update, export_actor, load_actor, policy_error
+from include.evaluator import Evaluator
 
 ## DQNAgent
 #  @brief Example DQN Agent; inherited properties from the Agent parent class
+#  Experience is collected from env, or from every environment of the vectorised envs when they are given.
 class DQNAgent(Agent):
-    def __init__(self, env, batch_size=32, config_file="include/config.txt"):
+    ## Constructor
+    #  @param prioritized Learn from a PrioritizedReplayMemory instead of sampling the replay memory uniformly
+    #  @param envs Optional vectorised environments (e.g. SubprocVecEnv) stepped together to collect experience
+    def __init__(self, env, batch_size=32, config_file="include/config.txt", prioritized=False, envs=None):
         Agent.__init__(self)
         self.env = env
+        self.envs = envs
         self.config_params = self._getParameters(config_file)
 
         # Init Model Parameters
         self.batch_size = batch_size
-        self.model = DQN(self.env).cuda()
-        self.target_model = DQN(self.env).cuda()
-        self.action_space = [0, 0.3, -0.3, 0.6, -0.6, 0.8, -0.8]
+        self._configureCPUThreads(self.config_params["DDQN"].get("n_t"))
+        self.action_space = np.array([0, 0.3, -0.3, 0.6, -0.6, 0.8, -0.8])
+        # Each servo of a multi-servo platform gets its own head; a single servo keeps the flat DQN so saved weights load
+        if self.env.action_space.shape[0] > 1:
+            self.model = BranchingDQN(self.env, prioritized=prioritized, num_bins=len(self.action_space)).to(self.device)
+            self.target_model = BranchingDQN(self.env, num_bins=len(self.action_space)).to(self.device)
+        else:
+            self.model = DQN(self.env, prioritized=prioritized).to(self.device)
+            self.target_model = DQN(self.env).to(self.device)
         self.discount_factor = self.config_params["DDQN"]["d_f"]
         self.burn_in = self.config_params["DDQN"]["b_i"]
         self.save_freq = self.config_params["DDQN"]["s_f"]
         self.max_episodes = self.config_params["DDQN"]["m_e"]
         self.update_freq = self.config_params["DDQN"]["u_f"]
+        # Optional Polyak coefficient: soft update the target network every frame instead of copying it every u_f frames
+        self.polyak_coeff = self.config_params["DDQN"].get("p_c")
         self.optimizer = optim.Adam(self.model.parameters(), lr=self.config_params["DDQN"]["lr"])
         
     def train(self):
+        if self.envs:
+            return self._trainEnvs()
         state = self.env.reset()
         self.time_step = 0
         while self.training:
+            # The replay memory stores the index of the action, the environment receives its value
             action = self.model.get_action(state, self.frame_idx)
-            action = self.action_space[action]
-            next_state, reward, done, info = self.env.step(action)
+            next_state, reward, done, info = self.env.step(self.action_space[action])
             self.model.experience.append(state, action, reward, done, next_state)
             self.rewards += reward
             state = next_state
@@ -44,29 +60,64 @@ class DQNAgent(Agent):
             # self.time_step += info['Time step']
             # self.debugger.plotValues(self.time_step, [info['Model Leg Pos (radians)'], info['Target Leg Pos (radians)']])
 
-            if(len(self.model.experience) > self.burn_in):
-                self.loss = cal_TD_Loss(self.batch_size, self.model, self.target_model, self.optimizer, self.discount_factor, self.model.experience)
-            
-            self.checkDone(done)
+            if self.checkDone(done):
+                state = self.env.reset()
+
+            self._learn(1)
+
+    ## trainEnvs
+    #  Steps all the vectorised environments at once: the actions of every environment are chosen with one batched
+    #  forward pass and the transitions are stored with one append_batch call. One TD update is made per step.
+    def _trainEnvs(self):
+        num_envs = self.envs.num_envs
+        states = np.array(self.envs.reset())
+        self.rewards = np.zeros(num_envs)
+        while self.training:
+            actions = self.model.get_actions(states, self.frame_idx)
+            next_states, rewards, dones, infos = self.envs.step(self.action_space[actions])
+            self.model.experience.append_batch(states, actions, rewards, dones, next_states)
+            self.rewards += rewards
+            # Copy as ShmemVecEnv returns the shared buffers, which the next step overwrites
+            states = np.array(next_states)
+            self.frame_idx += num_envs
+
+            for env_idx in np.flatnonzero(dones):
+                self._recordEpisode(self.rewards[env_idx])
+                self.rewards[env_idx] = 0
+
+            self._learn(num_envs)
+
+    ## learn
+    #  Runs a TD update once the burn in is over, updates the target network and stops training after max_episodes.
+    #  @param frames Number of frames collected since the last call
+    def _learn(self, frames):
+        if(len(self.model.experience) > self.burn_in):
+            self.loss = cal_TD_Loss(self.batch_size, self.model, self.target_model, self.optimizer, self.discount_factor, self.model.experience)
 
-            if self.frame_idx % self.update_freq == 0:
-                self.target_model.load_state_dict(self.model.state_dict())
+        if self.polyak_coeff:
+            soft_update(self.target_model, self.model, self.polyak_coeff)
+        elif self.frame_idx // self.update_freq != (self.frame_idx - frames) // self.update_freq:
+            self.target_model.load_state_dict(self.model.state_dict())
 
-            if self.ep_num > self.max_episodes:
-                self.saveWeights(directory = r"modelWeights", file_name = r"proof_of_concept_model_DQN.pt")
-                self.training = False
+        if self.ep_num > self.max_episodes:
+            self.saveWeights(directory = r"modelWeights", file_name = r"proof_of_concept_model_DQN.pt", model = self.model)
+            self.training = False
 
+    ## checkDone
+    #  Records the episode when it is done; returns whether the environment needs to be reset.
     def checkDone(self, done):
         if done:
-            self.ep_num += 1
-            self.test_rewards.append(self.rewards)
-            state = self.env.reset()
+            self._recordEpisode(self.rewards)
             self.rewards = 0
             self.time_step = 0
             # self.debugger.showPlot()
+        return done
 
-            if (self.ep_num % self.save_freq == 0):
-                print("Training Episode: {} \tRewards: {} \tFrame_idx :{} \tLoss: {}\r".format(self.ep_num, self.test_rewards[-1], self.frame_idx, self.loss))
+    def _recordEpisode(self, rewards):
+        self.ep_num += 1
+        self.test_rewards.append(rewards)
+        if (self.ep_num % self.save_freq == 0):
+            print("Training Episode: {} \tRewards: {} \tFrame_idx :{} \tLoss: {}\r".format(self.ep_num, self.test_rewards[-1], self.frame_idx, self.loss))
 
 ## PPOAgent
 #  @brief Example PPO Agent; inherited properties from the Agent parent class
@@ -83,10 +134,17 @@ class PPOAgent(Agent):
         self.threshold_reward = self.config_params["PPO"]["t_r"]
         self.ppo_epochs = self.config_params["PPO"]["p_e"]
         self.batch_size = batch_size
+        self.eval_env_fns = None
 
-    def defineEnv(self, env, envs=0):
+    ## defineEnv
+    #  @param env Single environment used for testing the model
+    #  @param envs Vectorised environment used for training
+    #  @param eval_env_fns Optional list of thunks creating evaluation environments. When given, the model
+    #  is evaluated in a background process on these environments instead of running test_env on env.
+    def defineEnv(self, env, envs=0, eval_env_fns=None):
         self.env = env
         self.envs = envs
+        self.eval_env_fns = eval_env_fns
         if envs == 0:
             self.model = ActorCritic(self.env).to(self.device)
         else:
@@ -94,54 +152,83 @@ class PPOAgent(Agent):
         self.optimizer = optim.Adam(self.model.parameters(), lr=self.config_params["PPO"]["l_r"])
         self.model.getOptimizer(self.optimizer)
         
+    ## exportPolicy
+    #  Saves the actor of the model as a frozen TorchScript module returning the mean action, for inference on the robot
+    #  without the critic or the action distribution. Load it with loadPolicy or RobotPlatform.loadPolicy.
+    #  @param directory Folder the module will be saved to
+    #  @param file_name Name of the file the module will be saved to
+    #  @param quantize Quantize the Linear layers of the actor to int8
+    #  @param states Optional recorded states on which the error of the exported actions is reported
+    def exportPolicy(self, directory, file_name, quantize=False, states=None):
+        model_path = os.path.join(os.getcwd(), directory, file_name).replace("\\", "/")
+        policy = export_actor(self.model, model_path, quantize)
+        if states is not None:
+            max_error, mean_error = policy_error(self.model, policy, states)
+            print("Exported policy action error: max {:.5f} \tmean {:.5f}\r".format(max_error, mean_error))
+        return policy
+
+    ## loadPolicy
+    #  Loads a module saved by exportPolicy; test_env then acts with it deterministically.
+    #  @param directory Folder the module will be loaded from
+    #  @param file_name Name of the file containing the module
+    def loadPolicy(self, directory, file_name):
+        model_path = os.path.join(os.getcwd(), directory, file_name).replace("\\", "/")
+        self.policy = load_actor(model_path)
+
+    ## recordTestReward
+    #  Stores the mean reward of an evaluation and returns True if it reaches the threshold reward.
+    def _recordTestReward(self, test_reward):
+        self.test_rewards.append(test_reward)
+        return test_reward > self.threshold_reward
+
     def train(self):
         state = self.envs.reset()
+        rollout = RolloutBuffer(self.num_steps, self.envs.num_envs, self.envs.observation_space.shape,
+                                self.envs.action_space.shape, self.device)
+        evaluator = None
+        if self.eval_env_fns is not None:
+            evaluator = Evaluator(self.model, self.eval_env_fns)
+        test_reward = 0
         early_stop = False
-        while self.frame_idx < self.max_frames and not early_stop:
-            log_probs = []
-            values = []
-            states = []
-            actions = []
-            rewards = []
-            masks = []
-            entropy = 0
-            for _ in range(self.num_steps):
-                state = torch.FloatTensor(state).to(self.device)
-                dist, value = self.model(state)
-
-                action = dist.sample()
-                next_state, reward, done, _ = self.envs.step(action.cpu().numpy())
-
-                log_prob = dist.log_prob(action)
-                entropy += dist.entropy().mean()
-                
-                log_probs.append(log_prob)
-                values.append(value)
-                rewards.append(torch.FloatTensor(reward).to(self.device).unsqueeze(1))
-                masks.append(torch.FloatTensor(1 - done).to(self.device).unsqueeze(1))
-                
-                states.append(state)
-                actions.append(action)
-                
-                state = next_state
-                self.frame_idx += 1
-                if self.frame_idx % 1000 == 0:
-                    test_reward = np.mean([self.test_env(self.env) for _ in range(10)])
-                    self.test_rewards.append(test_reward)
-                    if test_reward > self.threshold_reward: early_stop = True
-
-            next_state = torch.FloatTensor(next_state).to(self.device)
-            _, next_value = self.model(next_state)
-            returns = compute_gae(next_value, rewards, masks, values)
-
-            returns   = torch.cat(returns).detach()
-            log_probs = torch.cat(log_probs).detach()
-            values = torch.cat(values).detach()
-            states = torch.cat(states)
-            actions = torch.cat(actions)
-            advantage = returns - values
-            self.model.ppo_update(self.ppo_epochs, self.batch_size, states, actions, log_probs, returns, advantage)
-            if (test_reward < -30000):
-                break
+        # Stop the evaluation process even if training fails, otherwise the interpreter waits for it at exit
+        try:
+            while self.frame_idx < self.max_frames and not early_stop:
+                with torch.no_grad():
+                    for _ in range(self.num_steps):
+                        state = rollout.insert_state(state)
+                        dist, value = self.model(state)
+
+                        action = dist.sample()
+                        next_state, reward, done, _ = self.envs.step(action.cpu().numpy())
+                        rollout.insert(action, dist.log_prob(action), value, reward, done)
+
+                        state = next_state
+                        self.frame_idx += 1
+                        if self.frame_idx % 1000 == 0:
+                            if evaluator is None:
+                                test_reward = np.mean([self.test_env(self.env) for _ in range(10)])
+                                early_stop |= self._recordTestReward(test_reward)
+                            else:
+                                evaluator.submit(self.frame_idx, self.model)
+                        if evaluator is not None:
+                            for _, episode_rewards in evaluator.poll():
+                                test_reward = np.mean(episode_rewards)
+                                early_stop |= self._recordTestReward(test_reward)
+
+                    next_state = torch.FloatTensor(next_state).to(self.device)
+                    _, next_value = self.model(next_state)
+                    rollout.compute_returns(next_value)
+
+                states, actions, log_probs, returns, advantage = rollout.flatten()
+                self.model.ppo_update(self.ppo_epochs, self.batch_size, states, actions, log_probs, returns, advantage)
+                if (test_reward < -30000):
+                    break
+            if evaluator is not None:
+                for _, episode_rewards in evaluator.poll(block=True):
+                    self._recordTestReward(np.mean(episode_rewards))
+        finally:
+            if evaluator is not None:
+                evaluator.close()
         self.plotResults(self.test_rewards)
-        self.saveWeights(directory=r"modelWeights", file_name=r"platform_PPO_weights.pt", model=self.model)
\ No newline at end of file
+        self.saveWeights(directory=r"modelWeights", file_name=r"platform_PPO_weights.pt", model=self.model)
+        self.exportPolicy(directory=r"modelWeights", file_name=r"platform_PPO_actor.pt")
\ No newline at end of file
@@ -1,4 +1,6 @@
 # !/usr/bin/env/python3
+import numpy as np
+
 class Kalman:
     def __init__(self):
         super(Kalman, self).__init__()
@@ -66,4 +68,77 @@ class Kalman:
         return self.QAngle
 
     def getQBias():
-        return self.QBias
\ No newline at end of file
+        return self.QBias
+
+## BatchKalman
+#  Kalman filter of Kalman, tracking the angle and gyroscope bias of num_axes axes at once. The states and 2x2
+#  covariances of all the axes are kept in NumPy arrays and updated together by each call to getAngle.
+class BatchKalman:
+    def __init__(self, num_axes, QAngle=0.001, QBias=0.003, RMeasure=0.03):
+        super(BatchKalman, self).__init__()
+        self.QAngle = QAngle
+        self.QBias = QBias
+        self.RMeasure = RMeasure
+        self.angle = np.zeros(num_axes)
+        self.bias = np.zeros(num_axes)
+        self.rate = np.zeros(num_axes)
+        self.P = np.zeros((num_axes, 2, 2))
+
+    ## getAngle
+    #  Runs one predict and update step for every axis and returns the filtered angles.
+    #  @param newAngle Measured angles, one per axis
+    #  @param newRate Gyroscope rates, one per axis
+    #  @param dt Time since the previous step
+    def getAngle(self, newAngle, newRate, dt):
+        P00, P01, P10, P11 = self.P[:, 0, 0], self.P[:, 0, 1], self.P[:, 1, 0], self.P[:, 1, 1]
+        #Step 1: Predict the angle with the gyroscope
+        self.rate = np.asarray(newRate, dtype=np.float64) - self.bias
+        self.angle += dt * self.rate
+
+        #Step 2: Predict the error covariance
+        P00 += dt * (dt*P11 - P01 - P10 + self.QAngle)
+        P01 -= dt * P11
+        P10 -= dt * P11
+        P11 += self.QBias * dt
+
+        #Step 3-5: Innovation, its covariance and the Kalman gain
+        y = np.asarray(newAngle, dtype=np.float64) - self.angle
+        s = P00 + self.RMeasure
+        K0 = P00 / s
+        K1 = P10 / s
+
+        #Step 6: Update the angle
+        self.angle += K0 * y
+        self.bias += K1 * y
+
+        #Step 7: Update the error covariance
+        P00Temp = P00.copy()
+        P01Temp = P01.copy()
+        P00 -= K0 * P00Temp
+        P01 -= K0 * P01Temp
+        P10 -= K1 * P00Temp
+        P11 -= K1 * P01Temp
+
+        return self.angle.copy()
+
+    ## filter_log
+    #  Filters a recorded IMU log offline, continuing from the current state. The recursion runs over time, each step
+    #  updating every axis at once; several logs of the same length can be filtered together as extra axes.
+    #  @param angles Measured angles of shape [time steps, num_axes]
+    #  @param rates Gyroscope rates of shape [time steps, num_axes]
+    #  @param dt Time between samples, or an array with one value per time step
+    #  @return Filtered angles of shape [time steps, num_axes]
+    def filter_log(self, angles, rates, dt):
+        angles = np.asarray(angles, dtype=np.float64)
+        rates = np.asarray(rates, dtype=np.float64)
+        dts = np.broadcast_to(dt, len(angles))
+        filtered = np.empty(angles.shape)
+        for step in range(len(angles)):
+            filtered[step] = self.getAngle(angles[step], rates[step], dts[step])
+        return filtered
+
+    ## setAngle
+    #  @param angle New angles of all the axes, or of the given axes only
+    #  @param axes Optional index or indices of the axes to set
+    def setAngle(self, angle, axes=slice(None)):
+        self.angle[axes] = angle
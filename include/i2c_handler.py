@@ -1,9 +1,69 @@
 ## PCA9685_interface
-import wiringpi
+import os
 import time
+import numpy as np
+
+## WiringPiI2CBus
+#  I2C bus interface of a device opened with WiringPi. Register reads and writes go through the WiringPi calls while
+#  block transfers read and write the file descriptor returned by wiringPiI2CSetup directly, so a register and the
+#  data following it are sent in a single I2C transaction. Any object with the same methods (see SMBusI2CBus and
+#  the virtual buses of include/device_backend.py) can be given to the device classes instead.
+class WiringPiI2CBus:
+    # Largest payload of one block transfer
+    max_block_size = 4096
+
+    def __init__(self, address):
+        super(WiringPiI2CBus, self).__init__()
+        import wiringpi
+        self._wiringpi = wiringpi
+        self.address = address
+        self.device = wiringpi.wiringPiI2CSetup(address)
+
+    def read_byte(self, register):
+        return self._wiringpi.wiringPiI2CReadReg8(self.device, register)
+
+    def write_byte(self, register, value):
+        self._wiringpi.wiringPiI2CWriteReg8(self.device, register, value)
+
+    def read_block(self, register, length):
+        os.write(self.device, bytes([register]))
+        return os.read(self.device, length)
+
+    def write_block(self, register, data):
+        os.write(self.device, bytes([register]) + bytes(data))
+
+## SMBusI2CBus
+#  I2C bus interface using the smbus2 (or smbus) package, limited to the 32 byte SMBus blocks.
+class SMBusI2CBus:
+    max_block_size = 32
+
+    def __init__(self, address, channel=1):
+        super(SMBusI2CBus, self).__init__()
+        try:
+            from smbus2 import SMBus
+        except ImportError:
+            from smbus import SMBus
+        self.address = address
+        self.bus = SMBus(channel)
+
+    def read_byte(self, register):
+        return self.bus.read_byte_data(self.address, register)
+
+    def write_byte(self, register, value):
+        self.bus.write_byte_data(self.address, register, value)
+
+    def read_block(self, register, length):
+        return bytes(self.bus.read_i2c_block_data(self.address, register, length))
+
+    def write_block(self, register, data):
+        self.bus.write_i2c_block_data(self.address, register, list(data))
 
 class PCA9685():
-    def __init__(self, address=0x40, pwm_freq=50):
+    NUM_CHANNELS = 16
+
+    ## Constructor
+    #  @param bus I2C bus interface of the chip. Defaults to a WiringPiI2CBus on the address.
+    def __init__(self, address=0x40, pwm_freq=50, bus=None):
         super(PCA9685, self).__init__()
         self.address = address
         self.freq = 0
@@ -16,48 +76,200 @@ class PCA9685():
                           "LED_ALL_ON":0xFA,
                           "PIN_ALL": 0x0F
               }
-        self.device = self._initConnection()
+        self.bus = bus if bus is not None else self._initConnection()
         self._setupDevice()
         self._setPWMFreq(pwm_freq)
-        
+
     # initConnection
     #  Checks for a return from the MPU6050 in the I2C bus. Should there be no gyroscope
-    #  found, the class will assert an error and exit the program.   
+    #  found, the class will assert an error and exit the program.
     def _initConnection(self):
         try:
-            device = wiringpi.wiringPiI2CSetup(self.address)
+            bus = WiringPiI2CBus(self.address)
             print("Successfully conneced to PCA9685 IC Chip.\n")
-            return device
-        except AttributeError:
+            return bus
+        except (AttributeError, ImportError):
             print("Failed to connect to device. Please check the connection.\n")
             print("Tip:\t You may need to initialize the I2C bus using raspi-config.\n")
             exit(0)
-    
+
     def _setupDevice(self):
-        settings = wiringpi.wiringPiI2CReadReg8(self.device, self.registers["MODE1"]) & 0x7F
+        settings = self.bus.read_byte(self.registers["MODE1"]) & 0x7F
         auto_increment = settings | 0x20
-        wiringpi.wiringPiI2CWriteReg8(self.device, self.registers["MODE1"], auto_increment)
-    
+        self.bus.write_byte(self.registers["MODE1"], auto_increment)
+
     def _setPWMFreq(self, freq):
         self.freq = (1000 if freq>1000 else freq if freq<400 else 400)
         prescale = int(25000000/(4096*freq) - 0.5)
-        settings = wiringpi.wiringPiI2CReadReg8(self.device, self.registers["MODE1"]) & 0x7F
+        settings = self.bus.read_byte(self.registers["MODE1"]) & 0x7F
         sleep = settings | 0x10
         wake = settings & 0xEF
         restart = wake | 0x80
-        wiringpi.wiringPiI2CWriteReg8(self.device, self.registers["MODE1"], sleep)
-        wiringpi.wiringPiI2CWriteReg8(self.device, self.registers["PRESCALE"], prescale)
-        wiringpi.wiringPiI2CWriteReg8(self.device, self.registers["MODE1"], wake)
+        self.bus.write_byte(self.registers["MODE1"], sleep)
+        self.bus.write_byte(self.registers["PRESCALE"], prescale)
+        self.bus.write_byte(self.registers["MODE1"], wake)
         time.sleep(0.001)
-        wiringpi.wiringPiI2CWriteReg8(self.device, self.registers["MODE1"], restart)
-    
+        self.bus.write_byte(self.registers["MODE1"], restart)
+
+    ## pulseBytes
+    #  The four LEDn_ON_L, LEDn_ON_H, LEDn_OFF_L and LEDn_OFF_H register values of a channel.
+    def _pulseBytes(self, on, off):
+        return [on & 0xFF, on >> 8, off & 0xFF, off >> 8]
+
+    ## triggerPulse
+    #  Writes the four registers of the channel in one transaction, relying on the auto increment set in _setupDevice.
     def _triggerPulse(self, channel, on, off):
-        wiringpi.wiringPiI2CWriteReg8(self.device, self.registers["LED0_ON_L"]+4*channel, on & 0xFF)
-        wiringpi.wiringPiI2CWriteReg8(self.device, self.registers["LED0_ON_H"]+4*channel, on >> 8)
-        wiringpi.wiringPiI2CWriteReg8(self.device, self.registers["LED0_OFF_L"]+4*channel, off & 0xFF)
-        wiringpi.wiringPiI2CWriteReg8(self.device, self.registers["LED0_OFF_H"]+4*channel, off >> 8)
-    
+        self.bus.write_block(self.registers["LED0_ON_L"]+4*channel, self._pulseBytes(on, off))
+
+    ## triggerPulses
+    #  Sets the off counts of several channels with as few transactions as possible: the ALL_LED registers when every
+    #  channel is set to the same value, otherwise one block write per run of consecutive channels, split at the block
+    #  size of the bus.
+    #  @param channels Channels to update; when one appears several times its last value is used
+    #  @param offs Off counts of the channels, the pulses starting at count 0
+    #  @param all_channels Allows the ALL_LED registers to set every channel when the values coincide, even if the
+    #  channels do not all appear in channels
+    def _triggerPulses(self, channels, offs, all_channels=False):
+        pulses = dict(zip(channels, offs))
+        values = set(pulses.values())
+        if len(values) == 1 and (all_channels or len(pulses) == self.NUM_CHANNELS):
+            self.bus.write_block(self.registers["LED_ALL_ON"], self._pulseBytes(0, values.pop()))
+            return
+        max_channels = max(1, self.bus.max_block_size // 4)
+        run = []
+        for channel in sorted(pulses):
+            if run and (channel != run[-1] + 1 or len(run) == max_channels):
+                self._writeRun(run, pulses)
+                run = []
+            run.append(channel)
+        if run:
+            self._writeRun(run, pulses)
+
+    def _writeRun(self, run, pulses):
+        data = []
+        for channel in run:
+            data.extend(self._pulseBytes(0, pulses[channel]))
+        self.bus.write_block(self.registers["LED0_ON_L"]+4*run[0], data)
+
+    ## pulseCounts
+    #  Converts a pulse width in microseconds to a number of the 4096 counts of a PWM period.
+    def _pulseCounts(self, pulse):
+        return int(float(pulse) / 1000000 * self.freq * 4096)
+
     def servo_set_angle(self, channel, pulse):
-        analog_value = int(float(pulse) / 1000000 * self.freq * 4096)
-        self._triggerPulse(channel, 0, analog_value)
-    
\ No newline at end of file
+        self._triggerPulse(channel, 0, self._pulseCounts(pulse))
+
+    ## set_pulses
+    #  Sets the pulse width of several channels at once, see _triggerPulses.
+    #  @param channels Channels of the servos
+    #  @param pulses Pulse widths in microseconds, one per channel
+    #  @param all_channels Allows the ALL_LED registers to be used when all the pulses are equal
+    def set_pulses(self, channels, pulses, all_channels=False):
+        self._triggerPulses(channels, [self._pulseCounts(pulse) for pulse in pulses], all_channels)
+
+## MPU6050
+#  Driver of the MPU6050 accelerometer and gyroscope. The six axes are read with one burst read of the 14 contiguous
+#  registers from ACCEL_XOUT_H to GYRO_ZOUT_L, decoded as big endian 16 bit integers by NumPy. With the FIFO enabled,
+#  the chip buffers the samples itself (up to 1 kHz) and read_fifo drains all of them with block reads.
+class MPU6050():
+    FIFO_SIZE = 1024
+    # Accelerometer X, Y, Z and gyroscope X, Y, Z samples of 2 bytes each, in the order of the FIFO
+    SAMPLE_SIZE = 12
+    # Raw counts per g and per degree/second
+    SCALE = 1.0 / np.array([16384, 16384, 16384, 131, 131, 131], dtype=np.float64)
+
+    ## Constructor
+    #  @param bus I2C bus interface of the chip. Defaults to a WiringPiI2CBus on the address.
+    #  @param fifo Enable the FIFO at the sample rate of sample_rate_div, see enable_fifo
+    def __init__(self, address=0x68, bus=None, fifo=False, sample_rate_div=0):
+        super(MPU6050, self).__init__()
+        self.address = address
+        self.registers = {"PWR_MGMT_1": 0x6B,
+                "SMPLRT_DIV": 0x19,
+                "CONFIG": 0x1A,
+                "GYRO_CONFIG": 0x1B,
+                "FIFO_EN": 0x23,
+                "INT_ENABLE": 0x38,
+                "ACCEL_XOUT_H": 0x3B,
+                "TEMP_OUT_H": 0x41,
+                "GYRO_XOUT_H": 0x43,
+                "USER_CTRL": 0x6A,
+                "FIFO_COUNTH": 0x72,
+                "FIFO_R_W": 0x74
+                  }
+        self.fifo = False
+        self.sample_rate = 0
+        self.temperature = 0.0
+        self.bus = bus if bus is not None else self._initConnection()
+        self._initMPU()
+        if fifo:
+            self.enable_fifo(sample_rate_div)
+
+    ## initConnection
+    #  Checks for a return from the MPU6050 in the I2C bus. Should there be no gyroscope
+    #  found, the class will assert an error and exit the program.
+    def _initConnection(self):
+        try:
+            bus = WiringPiI2CBus(self.address)
+            print("Successfully conneced to MPU6050 Sensor.\n")
+            return bus
+        except (AttributeError, ImportError):
+            print("Failed to connect to device. Please check the connection.\n")
+            print("Tip:\t You may need to initialize the I2C bus using raspi-config.\n")
+            exit(0)
+
+    ## initMPU
+    #  Configures the sample rate, clock source, filter and range of the sensor.
+    def _initMPU(self):
+        self.bus.write_byte(self.registers["SMPLRT_DIV"], 7)
+        self.bus.write_byte(self.registers["PWR_MGMT_1"], 1)
+        self.bus.write_byte(self.registers["CONFIG"], 0)
+        self.bus.write_byte(self.registers["GYRO_CONFIG"], 24)
+        self.bus.write_byte(self.registers["INT_ENABLE"], 1)
+
+    ## read_sensors
+    #  Reads all the axes in one transaction and returns [acc_x, acc_y, acc_z, gyro_x, gyro_y, gyro_z] in g and
+    #  degrees/second. The temperature read in the same block is kept in temperature.
+    def read_sensors(self):
+        raw = np.frombuffer(self.bus.read_block(self.registers["ACCEL_XOUT_H"], 14), dtype=">i2")
+        self.temperature = raw[3] / 340 + 36.53
+        return raw[[0, 1, 2, 4, 5, 6]] * self.SCALE
+
+    ## enable_fifo
+    #  Buffers the accelerometer and gyroscope samples in the FIFO of the chip. The digital low pass filter is enabled so
+    #  the samples are taken at 1 kHz / (1 + sample_rate_div).
+    def enable_fifo(self, sample_rate_div=0):
+        self.bus.write_byte(self.registers["CONFIG"], 1)
+        self.bus.write_byte(self.registers["SMPLRT_DIV"], sample_rate_div)
+        # FIFO_EN: accelerometer and the three gyroscope axes
+        self.bus.write_byte(self.registers["FIFO_EN"], 0x78)
+        self.reset_fifo()
+        self.fifo = True
+        self.sample_rate = 1000.0 / (1 + sample_rate_div)
+
+    ## reset_fifo
+    #  Empties the FIFO and keeps it enabled.
+    def reset_fifo(self):
+        self.bus.write_byte(self.registers["USER_CTRL"], 0x04)
+        self.bus.write_byte(self.registers["USER_CTRL"], 0x40)
+
+    ## fifo_count
+    #  Number of bytes waiting in the FIFO.
+    def fifo_count(self):
+        return int.from_bytes(self.bus.read_block(self.registers["FIFO_COUNTH"], 2), "big")
+
+    ## read_fifo
+    #  Drains the complete samples of the FIFO with as few block reads as the bus allows and returns them as an array of
+    #  shape [samples, 6] in the units of read_sensors, oldest first. When the FIFO overflowed, the alignment of the
+    #  samples is lost: the FIFO is reset and no samples are returned.
+    def read_fifo(self):
+        count = self.fifo_count()
+        if count >= self.FIFO_SIZE:
+            print("MPU6050 FIFO overflow, samples dropped.\r")
+            self.reset_fifo()
+            return np.empty((0, 6))
+        length = count - count % self.SAMPLE_SIZE
+        chunk = self.bus.max_block_size - self.bus.max_block_size % self.SAMPLE_SIZE
+        data = b"".join(self.bus.read_block(self.registers["FIFO_R_W"], min(chunk, length - offset))
+                        for offset in range(0, length, chunk))
+        return np.frombuffer(data, dtype=">i2").reshape(-1, 6) * self.SCALE
@@ -2,13 +2,13 @@
 ## RobotPlatform.py
 
 # import packages for API
-import time
 import numpy as np
-import wiringpi
-from picamera import PiCamera
 
 # import all API packages for kernel operation:
 from include.control_interface import ServoControl, MPU6050Control
+from include.device_backend import HardwareBackend
+from include.control_loop import ControlLoop
+from include.sensor_poller import SensorPoller
 
 class TrajectoryHandler:
     def __init__(self, trajectory_list):
@@ -18,31 +18,88 @@ class TrajectoryHandler:
         self._idx = 0
         
     def _get_next_target(self):
-        if (self._idx + 1) <= self.max_size:
+        if (self._idx + 1) < self.max_size:
             state =  self._trajectory_list[self._idx+1]
         else:
             state = self._trajectory_list[self._idx]
         return state
     
 class RobotPlatform(ServoControl, MPU6050Control, TrajectoryHandler):
-    def __init__(self, servo_output_pins, trajectory):
-        wiringpi.wiringPiSetup()
-        self.servo = ServoControl(servo_output_pins)
-        self.mpu6050 = MPU6050Control()
+    ## Constructor
+    #  @param control_freq Frequency in Hz of the control loop the steps are scheduled at, see include/control_loop.py
+    #  @param sensor_freq Frequency in Hz the MPU6050 is read and filtered at in a background thread, see
+    #  include/sensor_poller.py. The steps then take the latest platform angles instead of updating the Kalman filter
+    #  themselves. Defaults to None, updating the filter in every step.
+    #  @param backend Device backend the servos and sensors are opened with, see include/device_backend.py. Defaults
+    #  to the hardware; a SimulatedBackend runs the platform without it.
+    def __init__(self, servo_output_pins, trajectory, control_freq=100, sensor_freq=None, backend=None):
+        self.backend = backend if backend is not None else HardwareBackend()
+        self.backend.setup()
+        self.control_loop = ControlLoop(control_freq)
+        self.servo = ServoControl(servo_output_pins, backend=self.backend)
+        self.mpu6050 = MPU6050Control(backend=self.backend)
+        self.servo.dt = self.mpu6050.dt = self.control_loop.period
+        self.sensor_poller = None
+        if sensor_freq is not None:
+            self.mpu6050.dt = 1.0 / sensor_freq
+            self.sensor_poller = SensorPoller(self.mpu6050.kf_update, sensor_freq)
+            self.sensor_poller.start()
+            self.sensor_poller.wait_ready()
         self.trajectory = TrajectoryHandler(trajectory)
+        self.policy = None
         self.observation_space, _, _, _ = self.step(np.array([0]), 0)
         self.action_space = np.array(servo_output_pins)
         self.done = False
         self.accuracy
     
+    ## loadPolicy
+    #  Loads an actor exported with PPOAgent.exportPolicy to control the platform without the training code.
+    #  PyTorch is only imported here, keeping it out of processes which run the policy elsewhere, see
+    #  include/robot_runtime.py.
+    def loadPolicy(self, file_path):
+        from include.agentArchitecture import load_actor
+        self.policy = load_actor(file_path)
+
+    ## runPolicy
+    #  Runs one episode with the deterministic mean action of the loaded policy and returns the total reward.
+    def runPolicy(self):
+        if self.policy is None:
+            raise RuntimeError("No policy loaded, call loadPolicy first")
+        from include.agentArchitecture import policy_action
+        state = self.reset()
+        done = False
+        total_reward = 0
+        while not done:
+            state, reward, done, _ = self.step(policy_action(self.policy, state))
+            total_reward += reward
+        print("Test Reward: {0}".format(total_reward))
+        self.control_loop.report()
+        return total_reward
+
+    ## close
+    #  Stops the sensor poller thread.
+    def close(self):
+        if self.sensor_poller is not None:
+            self.sensor_poller.stop()
+            self.sensor_poller = None
+
+    ## readPlatformAngle
+    #  Returns the filtered roll and pitch of the platform, from the sensor poller when it runs.
+    def _readPlatformAngle(self):
+        if self.sensor_poller is not None:
+            return self.sensor_poller.latest().value
+        return self.mpu6050.kf_update()
+
     def addTrajectory(self, trajectory_list):
         self.trajectory = TrajectoryHandler(trajectory_list)
         
+    ## step
+    #  Actuates the servo and senses the platform, then waits for the deadline of the control cycle.
     def step(self, action, servo_idx=0):
         #todo: Fix the logic for observation_space of the robot
         self.servo.moveMotor(servo_idx, action[0])
         servo_pos, servo_vel = self.servo.readSensor()
-        position,_ = self.mpu6050.kf_update()
+        position,_ = self._readPlatformAngle()
         self.accuracy = self.trajectory._get_next_target() - servo_pos
         rewards = -self.accuracy**2
         new_state = np.concatenate([[servo_pos], [self.trajectory._get_next_target()], [servo_vel]])
@@ -52,14 +109,17 @@ class RobotPlatform(ServoControl, MPU6050Control, TrajectoryHandler):
                 'Target Leg Pos (radians)': self.trajectory._get_next_target(),
                 'Reward Accumulated': rewards
                 }
-        time.sleep(0.01)
+        self.control_loop.wait()
         
         return new_state, rewards, self.done, info
     
     def reset(self):
         self.servo._init_servo_pos()
-        self.mpu6050._initPosition()
+        self.trajectory._idx = 0
+        if self.sensor_poller is None:
+            self.mpu6050._initPosition()
         servo_pos,_ = self.servo.readSensor()
         servo_vel = 0
+        self.control_loop.start()
         return np.concatenate([[servo_pos], [self.trajectory._get_next_target()], [servo_vel]]) 
         
\ No newline at end of file
@@ -0,0 +1,228 @@
+## @package robot_runtime
+#  @brief Runs the policy of the robot in its own process.
+#  The hardware loop stepping the platform and the inference of the exported actor no longer share one interpreter
+#  and its GIL: a PolicyProcess computes the actions while a RobotRuntime keeps stepping the environment at its
+#  control rate. Observations and actions are exchanged through SharedDoubleBuffers in shared memory, and the hardware
+#  loop never waits on inference for longer than its inference budget.
+
+import multiprocessing as mp
+import time
+from multiprocessing import shared_memory
+import numpy as np
+
+## SharedDoubleBuffer
+#  Single writer, many reader buffer of a float64 vector in shared memory, readable from any process by name. The
+#  writer alternates between two slots and protects each with a sequence lock: the counter of a slot is odd while it is
+#  written and even once the write finished. A reader copies the slot written last and retries only when its counter
+#  changed during the copy, which requires the writer to have finished a whole write to the other slot meanwhile, so
+#  neither side ever blocks. Each write has a sequence number, counting from 1, and a timestamp.
+#  @note The counters rely on the stores of the writer becoming visible to the readers in program order, as they do on
+#  x86. The Python interpreter runs between each of the stores, which in practice orders them on ARM as well.
+class SharedDoubleBuffer:
+    HEADER_SIZE = 16
+
+    def __init__(self, size, name=None):
+    ## Constructor
+    #  @param size Length of the vector
+    #  @param name Name of the shared memory block to attach to, created by another SharedDoubleBuffer. Defaults to
+    #  None, creating a new block.
+        super(SharedDoubleBuffer, self).__init__()
+        self.size = size
+        nbytes = self.HEADER_SIZE + 2 * (size + 2) * 8
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=nbytes if self.owner else 0)
+        self.name = self.shm.name
+        # Counters of the two slots and the index of the slot written last
+        self.header = np.ndarray((4,), dtype=np.uint32, buffer=self.shm.buf)
+        # Each slot holds the sequence number, the timestamp and the vector
+        self.slots = np.ndarray((2, size + 2), dtype=np.float64, buffer=self.shm.buf, offset=self.HEADER_SIZE)
+        if self.owner:
+            self.header[:] = 0
+            self.slots[:] = 0
+        self.seq = int(self.slots[self.header[2], 0])
+
+    ## write
+    #  Publishes values with the next sequence number. Only one process may write.
+    #  @return The sequence number of the write
+    def write(self, values, timestamp=None):
+        idx = 1 - int(self.header[2]) if self.seq else 0
+        self.seq += 1
+        self.header[idx] += 1
+        self.slots[idx, 0] = self.seq
+        self.slots[idx, 1] = time.perf_counter() if timestamp is None else timestamp
+        self.slots[idx, 2:] = values
+        self.header[idx] += 1
+        self.header[2] = idx
+        return self.seq
+
+    ## read
+    #  Returns the sequence number, timestamp and a copy of the vector of the latest write, or None before the first.
+    def read(self):
+        while True:
+            idx = int(self.header[2])
+            count = int(self.header[idx])
+            if count == 0:
+                return None
+            if count % 2:
+                continue
+            slot = self.slots[idx].copy()
+            if int(self.header[idx]) == count:
+                return int(slot[0]), slot[1], slot[2:]
+
+    ## close
+    #  Detaches from the shared memory, and frees it when this buffer created it.
+    def close(self):
+        del self.header, self.slots
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+## drain
+#  Takes every pending release of semaphore.
+def drain(semaphore):
+    while semaphore.acquire(False):
+        pass
+
+## policy_worker
+#  Entry point of the PolicyProcess: answers every new observation with the action of the exported actor, tagged with
+#  the sequence number of the observation, until the value of stop is set.
+def policy_worker(policy_file, obs_name, obs_size, act_name, act_size, obs_ready, act_ready, stop, num_threads):
+    import torch
+    from include.agentArchitecture import load_actor, policy_action
+    if num_threads is not None:
+        torch.set_num_threads(num_threads)
+    policy = load_actor(policy_file)
+    observations = SharedDoubleBuffer(obs_size, obs_name)
+    actions = SharedDoubleBuffer(act_size, act_name)
+    answered = 0
+    try:
+        while not stop.value:
+            if not obs_ready.acquire(timeout=0.1):
+                continue
+            drain(obs_ready)
+            reading = observations.read()
+            if reading is None or reading[0] == answered:
+                continue
+            answered, _, state = reading
+            # The timestamp of an action is the sequence number of the observation it answers
+            actions.write(policy_action(policy, state), timestamp=answered)
+            act_ready.release()
+    finally:
+        observations.close()
+        actions.close()
+
+## PolicyProcess
+#  Process running an actor exported with export_actor on the observations written to its observation buffer.
+#  New observations and actions are signalled with semaphores rather than events: setting a multiprocessing Event
+#  waits for its waiters to wake up, which blocks forever once a waiting process died.
+class PolicyProcess:
+    def __init__(self, policy_file, obs_size, act_size, num_threads=None):
+    ## Constructor
+    #  @param policy_file File saved by export_actor or PPOAgent.exportPolicy
+    #  @param num_threads Number of threads of the inference in the policy process. Defaults to None, the PyTorch
+    #  default.
+        super(PolicyProcess, self).__init__()
+        context = mp.get_context("spawn")
+        self.observations = SharedDoubleBuffer(obs_size)
+        self.actions = SharedDoubleBuffer(act_size)
+        self.obs_ready = context.Semaphore(0)
+        self.act_ready = context.Semaphore(0)
+        self.stop_flag = context.RawValue('b', 0)
+        self.process = context.Process(target=policy_worker, daemon=True, args=(
+            policy_file, self.observations.name, obs_size, self.actions.name, act_size, self.obs_ready,
+            self.act_ready, self.stop_flag, num_threads))
+
+    def start(self):
+        self.process.start()
+
+    ## request
+    #  Publishes an observation to the policy and returns its sequence number.
+    def request(self, state):
+        seq = self.observations.write(state)
+        self.obs_ready.release()
+        return seq
+
+    ## action
+    #  Returns the latest action as (sequence number of the observation it answers, action), waiting up to timeout
+    #  seconds for the answer to observation seq. Returns None when no action was computed yet. Raises a RuntimeError
+    #  when the policy process exited without answering seq, as its latest action would never be updated again.
+    def action(self, seq, timeout):
+        deadline = time.perf_counter() + timeout
+        reading = self.actions.read()
+        while reading is None or int(reading[1]) < seq:
+            if not self.process.is_alive():
+                raise RuntimeError("The policy process exited with code {0}".format(self.process.exitcode))
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            if self.act_ready.acquire(timeout=remaining):
+                drain(self.act_ready)
+            reading = self.actions.read()
+        if reading is None:
+            return None
+        return int(reading[1]), reading[2]
+
+    def stop(self):
+        self.stop_flag.value = 1
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.observations.close()
+        self.actions.close()
+
+## RobotRuntime
+#  Runs episodes of an environment, e.g. RobotPlatform, with the actions of a PolicyProcess. Each step publishes its
+#  observation and waits for the answer at most the inference budget; when the answer is late the step holds the
+#  latest action the policy computed, so inference never delays the actuation by more than the budget.
+class RobotRuntime:
+    def __init__(self, env, policy_file, obs_size, act_size, inference_budget=0.005, num_threads=None,
+                 startup_timeout=60):
+    ## Constructor
+    #  Starts the policy process and waits until it answered a first observation, so loading the policy does not
+    #  delay the first episode.
+    #  @param inference_budget Time in seconds a step waits for the action of its observation
+    #  @param startup_timeout Time in seconds the policy process may take to start
+        super(RobotRuntime, self).__init__()
+        self.env = env
+        self.inference_budget = inference_budget
+        self.startup_timeout = startup_timeout
+        self.policy = PolicyProcess(policy_file, obs_size, act_size, num_threads)
+        self.policy.start()
+        self._firstAction(np.zeros(obs_size))
+        self.late_actions = 0
+        self.steps = 0
+
+    ## firstAction
+    #  Returns the action of state without a budget, raising an error when the policy process does not answer.
+    def _firstAction(self, state):
+        try:
+            answer = self.policy.action(self.policy.request(state), self.startup_timeout)
+        except RuntimeError:
+            self.policy.stop()
+            raise
+        if answer is None:
+            self.policy.stop()
+            raise RuntimeError("The policy process did not answer within {0} s".format(self.startup_timeout))
+        return answer[1]
+
+    ## run
+    #  Runs one episode and returns the total reward. The first action is awaited without a budget. When the policy
+    #  process exits during the episode, the episode stops with a RuntimeError instead of holding its last action.
+    def run(self):
+        action = self._firstAction(self.env.reset())
+        done = False
+        total_reward = 0
+        while not done:
+            state, reward, done, _ = self.env.step(action)
+            total_reward += reward
+            self.steps += 1
+            if not done:
+                seq = self.policy.request(state)
+                answered, action = self.policy.action(seq, self.inference_budget)
+                self.late_actions += answered < seq
+        print("Test Reward: {0}".format(total_reward))
+        print("Late actions: {0} of {1} steps".format(self.late_actions, self.steps))
+        return total_reward
+
+    def close(self):
+        self.policy.stop()
@@ -0,0 +1,84 @@
+## @package sensor_poller
+#  @brief Acquisition of sensor readings in a background thread.
+#  A SensorPoller calls a read function at its own rate and publishes every result, so the control step takes the
+#  latest reading without waiting on the bus. Readings are published in a LatestValue slot: each is an immutable
+#  Reading swapped in with a single reference assignment, which the interpreter performs atomically, so neither the
+#  poller nor the control step ever takes a lock or sees a partially written reading.
+
+import threading
+import time
+from collections import namedtuple
+from include.control_loop import ControlLoop
+
+## Reading
+#  A published value with the time it was read at and its sequence number, counting from 1.
+Reading = namedtuple('Reading', ['timestamp', 'seq', 'value'])
+
+## LatestValue
+#  Single slot holding the latest Reading. Writes overwrite the previous reading rather than queueing it, so a reader
+#  falling behind only loses stale readings.
+class LatestValue:
+    def __init__(self):
+        super(LatestValue, self).__init__()
+        self._reading = None
+        self._seq = 0
+
+    ## publish
+    #  Publishes a value read at timestamp. Only one thread may publish.
+    def publish(self, value, timestamp):
+        self._seq += 1
+        self._reading = Reading(timestamp, self._seq, value)
+
+    ## read
+    #  Returns the latest Reading, or None before the first one is published. Never blocks.
+    def read(self):
+        return self._reading
+
+## SensorPoller
+#  Daemon thread calling read at poll_freq Hz, scheduled with a ControlLoop, and publishing each result in a
+#  LatestValue slot. An exception raised by read stops the thread and is raised again by the next call to latest.
+class SensorPoller(threading.Thread):
+    def __init__(self, read, poll_freq, clock=time.perf_counter):
+    ## Constructor
+    #  @param read Function returning one reading, called from the poller thread only
+    #  @param poll_freq Frequency of the readings in Hz
+        super(SensorPoller, self).__init__(daemon=True)
+        self.read = read
+        self.clock = clock
+        self.control_loop = ControlLoop(poll_freq, clock=clock)
+        self.slot = LatestValue()
+        self.error = None
+        self._ready = threading.Event()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        self.control_loop.start()
+        try:
+            while not self._stop_event.is_set():
+                value = self.read()
+                self.slot.publish(value, self.clock())
+                self._ready.set()
+                self.control_loop.wait()
+        except Exception as error:
+            self.error = error
+            self._ready.set()
+
+    ## wait_ready
+    #  Blocks until the first reading is published, or timeout seconds passed. Returns the first reading.
+    def wait_ready(self, timeout=None):
+        self._ready.wait(timeout)
+        return self.latest()
+
+    ## latest
+    #  Returns the latest Reading without blocking, or None before the first one.
+    def latest(self):
+        if self.error is not None:
+            raise self.error
+        return self.slot.read()
+
+    ## stop
+    #  Stops the poller after its current reading and waits for the thread to end.
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
@@ -1,13 +1,71 @@
 ## PCA9685_interface
-import os
 
 servo_minPulse = [0]*41
 servo_maxPulse = [0]*41
 servo_minAngle = [0]*41
 servo_maxAngle = [0]*41
 
+SERVOBLASTER_DEVICE = "/dev/servoblaster"
+
+## ServoBlasterWriter
+#  Keeps the servoblaster device open and sends the commands queued during a control step in a single write when
+#  flushed, instead of starting a shell per command. Any FIFO or regular file can be used as the device to run
+#  without hardware; opening a FIFO blocks until it has a reader.
+class ServoBlasterWriter:
+    ## Constructor
+    #  @param device_path Path of the servoblaster device, FIFO or file the commands are written to
+    #  @param device Open text device to write to instead of device_path, e.g. a VirtualServoBlaster of
+    #  include/device_backend.py
+    def __init__(self, device_path=SERVOBLASTER_DEVICE, device=None):
+        super(ServoBlasterWriter, self).__init__()
+        self.device_path = device_path
+        self._device = device if device is not None else open(device_path, "w")
+        self._commands = []
+
+    ## set
+    #  Queues a command setting the output of the servo on the given pin.
+    def set(self, servoPin, servoOutput):
+        self._commands.append("P1-" + str(servoPin) + "=" + str(servoOutput) + "\n")
+
+    ## set_angle
+    #  Queues a command moving the servo on the given pin to the angle, see servo_configure.
+    def set_angle(self, servoPin, servoAngle):
+        self.set(servoPin, servo_map(servoAngle, servo_minAngle[servoPin], servo_maxAngle[servoPin], servo_minPulse[servoPin], servo_maxPulse[servoPin]))
+
+    ## flush
+    #  Writes all the queued commands at once.
+    def flush(self):
+        if self._commands:
+            self._device.write("".join(self._commands))
+            self._device.flush()
+            self._commands.clear()
+
+    def close(self):
+        if not self._device.closed:
+            self.flush()
+            self._device.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+_writer = None
+
+## servo_writer
+#  Returns the ServoBlasterWriter shared by servo_set and servo_set_angle, opening it on first use.
+#  @param device_path Device to open the writer on if it is not open yet
+def servo_writer(device_path=SERVOBLASTER_DEVICE):
+    global _writer
+    if _writer is None:
+        _writer = ServoBlasterWriter(device_path)
+    return _writer
+
 def servo_set(servoPin, servoOutput):
-    os.system("echo " + "P1-" + str(servoPin) + "=" + servoOutput + " > /dev/servoblaster")
+    writer = servo_writer()
+    writer.set(servoPin, servoOutput)
+    writer.flush()
 
 def servo_map(value, oldMin, oldMax, newMin, newMax):
     return ((value-oldMin)*(newMax-newMin)/(oldMax-oldMin)+newMin) / 10
@@ -18,6 +76,7 @@ def servo_configure(servoPin, minPulse=1000, maxPulse=2000, minAngle=-90, maxAng
     servo_minAngle[servoPin] = minAngle
     servo_maxAngle[servoPin] = maxAngle
 
-def servo_set_angle(servoPin, servoAngle): 
-    pwm_sig = servo_map(servoAngle, servo_minAngle[servoPin], servo_maxAngle[servoPin], servo_minPulse[servoPin], servo_maxPulse[servoPin])
-    os.system("echo " + "P1-" + str(servoPin) + "=" + str(pwm_sig) + " > /dev/servoblaster")
\ No newline at end of file
+def servo_set_angle(servoPin, servoAngle):
+    writer = servo_writer()
+    writer.set_angle(servoPin, servoAngle)
+    writer.flush()
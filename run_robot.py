@@ -4,28 +4,41 @@
 #  run_robot is an example script of how the LowCostPlatform will be used for education and testing purposes.
 
 # Import relevant packages for processing
-import torch
+import os
 import numpy as np
 from include.robot_platform import RobotPlatform
-from include.exampleAgents import PPOAgent
+from include.robot_runtime import RobotRuntime
 
-# Initialise the servos according to the servoblaster
-servo_pin_list = [12]
+# The guard keeps the policy process, which imports this module, from starting the robot
+if __name__ == '__main__':
+    # Initialise the servos according to the servoblaster
+    servo_pin_list = [12]
 
-# Reinitiate the sequence of the trajectory for the Agent
-servo_range_radians = (0.349, -0.175)
-total_time_steps = 200
-front = np.linspace(servo_range_radians[0], servo_range_radians[1], total_time_steps)
-back = np.linspace(servo_range_radians[1], servo_range_radians[0], total_time_steps)
-test_traj = np.concatenate([front, back, front, back, front, back])
+    # Reinitiate the sequence of the trajectory for the Agent
+    servo_range_radians = (0.349, -0.175)
+    total_time_steps = 200
+    front = np.linspace(servo_range_radians[0], servo_range_radians[1], total_time_steps)
+    back = np.linspace(servo_range_radians[1], servo_range_radians[0], total_time_steps)
+    test_traj = np.concatenate([front, back, front, back, front, back])
 
-# Initiate the model for testing purposes
-agent = PPOAgent()
-env = RobotPlatform(servo_pin_list, test_traj)
-agent.defineEnv(env)
-directory = r"modelWeights"
-file_name = r"proof_of_concept_PPO_weights.pt"
-agent.loadWeights(directory, file_name)
+    # Initiate the model for testing purposes
+    env = RobotPlatform(servo_pin_list, test_traj)
+    directory = r"modelWeights"
+    file_name = r"proof_of_concept_PPO_weights.pt"
+    policy_file_name = r"proof_of_concept_PPO_actor.pt"
 
-# Test Agent with the given current weights:
-agent.test_env(env, False, False)
\ No newline at end of file
+    # Export the actor of the trained weights once; the frozen module only computes the mean action
+    if not os.path.exists(os.path.join(directory, policy_file_name)):
+        # The training code, and PyTorch with it, is only imported to export the actor
+        from include.exampleAgents import PPOAgent
+        agent = PPOAgent()
+        agent.defineEnv(env)
+        agent.loadWeights(directory, file_name)
+        agent.exportPolicy(directory, policy_file_name)
+
+    # Test Agent with the given current weights, running the policy in its own process:
+    runtime = RobotRuntime(env, os.path.join(directory, policy_file_name), obs_size=3, act_size=len(servo_pin_list))
+    runtime.run()
+    env.control_loop.report()
+    runtime.close()
+    env.close()
@@ -12,13 +12,21 @@ import numpy as np
 from gym.envs.registration import register
 from common.multiprocessing_env import SubprocVecEnv
 from include.exampleAgents import DQNAgent, PPOAgent
+from src.env.envRegister import preload_model
 
 ## make_env
 #  A simple function utilising OpenAi's Baseline code for creating multiple environments for multiprocessing.
 #  (view common file for link to original folder)
-def make_env(env_name):
+#  @param model_file Model file of the environment in the assets folder. The environment is then created on
+#  the model compiled by preload_model, which the forked workers inherit from the parent.
+#  @param mjb Serialised compiled model preloaded in the worker, for start methods which cannot inherit the
+#  model from the parent.
+def make_env(env_name, *, model_file=None, mjb=None):
     def _thunk():
-        env = gym.make(env_name)
+        kwargs = {}
+        if model_file is not None:
+            kwargs['model'] = preload_model(model_file, mjb)
+        env = gym.make(env_name, **kwargs)
         #env.add_trajectory(trajectory_angles)
         return env
     return _thunk
@@ -58,13 +66,16 @@ if __name__ == '__main__':
         env = gym.make('ProofOfConceptModel-v0')
         env.add_trajectory(trajectory_angles)
         num_envs = 16
-        envs = [make_env('ProofOfConceptModel-v0', trajectory_angles) for i in range(num_envs)]
+        envs = [make_env('ProofOfConceptModel-v0') for i in range(num_envs)]
         envs = SubprocVecEnv(envs)
         
     if True:
       num_envs = 16
-      envs = [make_env('LCP-v1') for i in range(num_envs)]
-      envs = SubprocVecEnv(envs)
+      envs_per_worker = 1 # Increase to host several environments in each subprocess
+      # Compile the model once in the parent; the forked workers share it copy-on-write
+      preload_model('PlatformV2.xml')
+      envs = [make_env('LCP-v1', model_file='PlatformV2.xml') for i in range(num_envs)]
+      envs = SubprocVecEnv(envs, envs_per_worker=envs_per_worker, start_method='fork')
       env = gym.make('LCP-v1')
 
     # Set to true to run the DQN Example
@@ -74,8 +85,10 @@ if __name__ == '__main__':
         
     # Set to true to run the DQN Example
     if True:
+        # The model is evaluated on 10 episodes in parallel in a background process
+        eval_env_fns = [make_env('LCP-v1', model_file='PlatformV2.xml') for i in range(10)]
         sample_agent = PPOAgent()
-        sample_agent.defineEnv(env, envs)
+        sample_agent.defineEnv(env, envs, eval_env_fns)
         sample_agent.train()
 
     # Test and sanity check the model
@@ -86,6 +99,10 @@ if __name__ == '__main__':
         sample = PPOAgent()
         sample.defineEnv(env)
         sample.loadWeights(directory, file_name)
+        # Record the observed states to check the accuracy of the int8 actor exported for the robot
+        states = []
         for i in range(9):
-            sample.test_env(env, True, False)
-        sample.test_env(env, True, True)
\ No newline at end of file
+            sample.test_env(env, True, False, record=states)
+        sample.test_env(env, True, True, record=states)
+        np.save(os.path.join(directory, r"platform_PPO_states.npy"), states)
+        sample.exportPolicy(directory, r"platform_PPO_actor_int8.pt", quantize=True, states=states)
\ No newline at end of file
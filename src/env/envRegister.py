@@ -10,15 +10,75 @@ import os
 import numpy as np
 
 # 
+import mujoco_py
 from gym import utils
 from gym.envs.mujoco import mujoco_env
 
+## Shared Models
+#  Compiled models loaded with preload_model, indexed by the full path of their XML file.
+_shared_models = {}
+
+## asset_path
+#  Returns the full path of a model file in the assets folder.
+def asset_path(file_name):
+    return os.path.join(os.path.dirname(__file__), 'assets', file_name)
+
+## preload_model
+#  @brief Compiles a model once so that every environment given it reuses it
+#  Environments created with the returned model (the model argument of ProofOfConceptModel and
+#  LowCostPlatform) skip parsing the XML file and its STL meshes. When the vectorised environments
+#  are started with the 'fork' start method after preloading, the workers inherit the compiled
+#  model and its mesh data is shared copy-on-write between them. With other start methods, pass the
+#  serialised model (PyMjModel.get_mjb()) to the workers and preload it there with the mjb argument.
+#  @param file_name Name of the model file in the assets folder.
+#  @param mjb Serialised compiled model to load instead of the XML file.
+def preload_model(file_name, mjb=None):
+    model_path = asset_path(file_name)
+    if model_path not in _shared_models:
+        if mjb is None:
+            _shared_models[model_path] = mujoco_py.load_model_from_path(model_path)
+        else:
+            _shared_models[model_path] = mujoco_py.load_model_from_mjb(mjb)
+    return _shared_models[model_path]
+
+## SharedModelMujocoEnv
+#  MujocoEnv which can be built on an already compiled model, e.g. one returned by preload_model,
+#  instead of parsing its XML file. Without a model it is a plain MujocoEnv; with one, the
+#  initialisation mirrors mujoco_env.MujocoEnv.__init__ of gym 0.21.
+class SharedModelMujocoEnv(mujoco_env.MujocoEnv):
+    ## Constructor
+    #  @param model_path Full path of the model file, parsed when no model is given.
+    #  @param frame_skip Number of simulation steps per environment step.
+    #  @param model Compiled PyMjModel to simulate.
+    def __init__(self, model_path, frame_skip, model=None):
+        if model is None:
+            mujoco_env.MujocoEnv.__init__(self, model_path, frame_skip)
+            return
+        self.frame_skip = frame_skip
+        self.model = model
+        self.sim = mujoco_py.MjSim(self.model)
+        self.data = self.sim.data
+        self.viewer = None
+        self._viewers = {}
+        self.metadata = {
+            'render.modes': ['human', 'rgb_array', 'depth_array'],
+            'video.frames_per_second': int(np.round(1.0 / self.dt))
+        }
+        self.init_qpos = self.sim.data.qpos.ravel().copy()
+        self.init_qvel = self.sim.data.qvel.ravel().copy()
+        self._set_action_space()
+        action = self.action_space.sample()
+        observation, _reward, done, _info = self.step(action)
+        assert not done
+        self._set_observation_space(observation)
+        self.seed()
+
 ## ProofOfConceptModel
 #  @brief Creates an environment for one leg of the Robotic Platform
 #  The following class creates an instance of one robotic leg of the platform. The environment is
 #  mainly used for unit testing for validation. The rewards of this environment are designed for
 #  the accuracy following a specified trajectory input.
-class ProofOfConceptModel(mujoco_env.MujocoEnv, utils.EzPickle):
+class ProofOfConceptModel(SharedModelMujocoEnv, utils.EzPickle):
     ## Constructor
     #  Instantiates variables necessary for operation; includes the permissible error between the
     #  target and current position, rewards and the index of the target in the trajectory.
@@ -26,12 +86,14 @@ class ProofOfConceptModel(mujoco_env.MujocoEnv, utils.EzPickle):
     #  @param is_healthy Ensure servo motor is within limits (does not go over and break the leg)
     #  @param terminate_when_unhealthy Prevent robot from farming rewards and not complete the task
     #  @param error_range Return true only if conditions are met (undecided as of now)
+    #  @param model Compiled model of SimpleLeg.xml from preload_model, parsed from the file if None
     def __init__(self, 
                 healthy_reward=1.0,
                 terminate_when_unhealthy=True,
-                error_range=(0.05, 0.1)
+                error_range=(0.05, 0.1),
+                model=None
                 ):
-        file_path = os.path.join(os.path.dirname(__file__), 'assets', 'SimpleLeg.xml')
+        file_path = asset_path('SimpleLeg.xml')
         utils.EzPickle.__init__(self)
 
         self._target_leg_pos = [0, 1, 2]
@@ -40,7 +102,7 @@ class ProofOfConceptModel(mujoco_env.MujocoEnv, utils.EzPickle):
         self._terminate_when_unhealthy = terminate_when_unhealthy
         self._error_range = error_range
 
-        mujoco_env.MujocoEnv.__init__(self, file_path, 5)
+        SharedModelMujocoEnv.__init__(self, file_path, 5, model)
 
     ## Decorators for training
     @property
@@ -110,12 +172,13 @@ class ProofOfConceptModel(mujoco_env.MujocoEnv, utils.EzPickle):
 
 ## LowCostPlatform
 #  @brief  Creates a simple 3D model which is compatible with the Gym toolkit
-class LowCostPlatform(mujoco_env.MujocoEnv, utils.EzPickle):
+class LowCostPlatform(SharedModelMujocoEnv, utils.EzPickle):
     ## Constructor
     #  @param xml_file The mujoco XML file created by the end user. 
     #  @param is_healthy Ensure servo motor is within limits (does not go over and break the leg)
     #  @param healthy_reward Prevent robot from farming rewards and not complete the task
     #  @param done Return true only if conditions are met (undecided as of now)
+    #  @param model Compiled model of PlatformV2.xml from preload_model, parsed from the file if None
     def __init__(self, 
                 ctrl_cost_weight=0.5,
                  contact_cost_weight=5e-4,
@@ -124,8 +187,9 @@ class LowCostPlatform(mujoco_env.MujocoEnv, utils.EzPickle):
                  healthy_z_range=(1.0, 1.55),
                  contact_force_range=(-1.0, 1.0),
                  reset_noise_scale=0.1,
-                 exclude_current_positions_from_observation=True):
-        file_path = os.path.join(os.path.dirname(__file__), 'assets', 'PlatformV2.xml')
+                 exclude_current_positions_from_observation=True,
+                 model=None):
+        file_path = asset_path('PlatformV2.xml')
         utils.EzPickle.__init__(self)
 
         # Local define variables and other data
@@ -147,7 +211,7 @@ class LowCostPlatform(mujoco_env.MujocoEnv, utils.EzPickle):
         self.xy_pos_after = 0
         self.total_time = 0
 
-        mujoco_env.MujocoEnv.__init__(self, file_path, 5)
+        SharedModelMujocoEnv.__init__(self, file_path, 5, model)
 
     @property
     def healthy_reward(self):
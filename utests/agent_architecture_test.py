@@ -0,0 +1,286 @@
+## @package agent_architecture_test
+#  Unit tests for the building blocks in include/agentArchitecture.py
+import os
+import tempfile
+import unittest
+import numpy as np
+import torch
+import torch.nn.functional as F
+from include.agentArchitecture import (DQN, ActorCritic, BranchingDQN, MinibatchSampler, PrioritizedReplayMemory, ReplayMemory,
+                                       RolloutBuffer, SumTree, cal_TD_Loss, compute_gae, compute_gae_batch, export_actor,
+                                       load_actor, policy_action, policy_error, soft_update)
+from utests.virtual_envs import VirtualEnv
+
+class TestReplayMemory(unittest.TestCase):
+    def setUp(self):
+        self.memory = ReplayMemory(5)
+        for idx in range(7):
+            self.memory.append(np.full(3, idx), idx % 7, float(idx), idx == 6, np.full(3, idx + 1))
+
+    def test_ring_buffer_overwrites_oldest(self):
+        self.assertEqual(len(self.memory), 5)
+        self.assertEqual(sorted(self.memory.rewards[:, 0].tolist()), [2, 3, 4, 5, 6])
+
+    def test_sample_batch(self):
+        states, actions, rewards, dones, next_states = self.memory.sample_batch(16)
+        self.assertEqual(states.shape, (16, 3))
+        self.assertEqual(actions.shape, (16,))
+        np.testing.assert_array_equal(states[:, 0], rewards)
+        np.testing.assert_array_equal(next_states[:, 0], rewards + 1)
+        np.testing.assert_array_equal(dones, rewards == 6)
+
+    def test_sample_tensors(self):
+        states, actions, rewards, dones, next_states = self.memory.sample_tensors(8, torch.device("cpu"))
+        self.assertEqual(states.dtype, torch.float32)
+        self.assertEqual(actions.dtype, torch.int64)
+        self.assertEqual(tuple(rewards.shape), (8,))
+        torch.testing.assert_close(actions.float(), rewards)
+
+    def test_append_batch_matches_append(self):
+        memory = ReplayMemory(5)
+        memory.append_batch(np.arange(21).reshape(7, 3), np.arange(7), np.arange(7.0), np.arange(7) == 6,
+                            np.arange(21).reshape(7, 3) + 1)
+        self.assertEqual(len(memory), 5)
+        self.assertEqual(memory.position, self.memory.position)
+        self.assertEqual(sorted(memory.rewards[:, 0].tolist()), [2, 3, 4, 5, 6])
+        np.testing.assert_array_equal(memory.states[:, 0], memory.rewards[:, 0] * 3)
+        np.testing.assert_array_equal(memory.actions[:, 0], memory.rewards[:, 0])
+
+class TestPrioritizedReplayMemory(unittest.TestCase):
+    def test_sum_tree_find(self):
+        tree = SumTree(6)
+        priorities = np.array([1.0, 0.0, 2.0, 0.5, 3.0, 1.5])
+        tree.update(np.arange(6), priorities)
+        self.assertAlmostEqual(tree.total(), priorities.sum())
+        values = np.random.rand(1000) * priorities.sum()
+        np.testing.assert_array_equal(tree.find(values), np.searchsorted(np.cumsum(priorities), values))
+        tree.update([2, 2], [0.0, 0.0])
+        self.assertAlmostEqual(tree.total(), priorities.sum() - 2.0)
+
+    def test_sampling_follows_priorities(self):
+        memory = PrioritizedReplayMemory(4, alpha=1.0, beta=1.0)
+        for idx in range(4):
+            memory.append(np.full(2, idx), idx, 0.0, False, np.zeros(2))
+        memory.update_priorities(np.arange(4), np.array([0.0, 0.0, 0.0, 1.0]))
+        (states, actions, _, _, _), indices, weights = memory.sample_prioritized(64)
+        self.assertGreater(np.mean(indices == 3), 0.99)
+        self.assertEqual(tuple(weights.shape), (64,))
+        self.assertAlmostEqual(weights.max().item(), 1.0)
+        torch.testing.assert_close(actions.float(), states[:, 0])
+
+class TestTDLoss(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        env = VirtualEnv(obs_dim=3)
+        self.model, self.target_model = DQN(env), DQN(env)
+        for idx in range(64):
+            self.model.experience.append(np.random.randn(3), idx % 7, np.random.rand(), idx % 9 == 0, np.random.randn(3))
+
+    def test_fused_forward_matches_separate_forwards(self):
+        optimizer = torch.optim.SGD(self.model.parameters(), lr=0.0)
+        np.random.seed(1)
+        loss = cal_TD_Loss(32, self.model, self.target_model, optimizer, 0.99, self.model.experience)
+        np.random.seed(1)
+        states, actions, rewards, dones, next_states = self.model.experience.sample_tensors(32)
+        qvals = self.model(states).gather(1, actions.long().view(-1, 1)).squeeze(1)
+        best_actions = self.model(next_states).max(1)[1].unsqueeze(1)
+        next_qval = self.target_model(next_states).gather(1, best_actions).squeeze(1)
+        expected = F.mse_loss(qvals, (rewards + 0.99*next_qval*(1 - dones)).detach())
+        torch.testing.assert_close(loss, expected)
+        self.assertTrue(all(param.grad is None for param in self.target_model.parameters()))
+
+    def test_prioritized_loss_updates_priorities(self):
+        env = VirtualEnv(obs_dim=3)
+        model, target_model = DQN(env, prioritized=True), DQN(env)
+        memory = model.experience
+        for idx in range(64):
+            memory.append(np.random.randn(3), idx % 7, np.random.rand(), idx % 9 == 0, np.random.randn(3))
+        np.random.seed(2)
+        indices = memory.sample_indices(32)
+        np.testing.assert_allclose(memory.tree.priorities(indices), 1.0)
+        np.random.seed(2)
+        cal_TD_Loss(32, model, target_model, torch.optim.SGD(model.parameters(), lr=0.0), 0.99, memory)
+
+        states, actions, rewards, dones, next_states = memory.sample_tensors(32, torch.device("cpu"), indices)
+        with torch.no_grad():
+            qvals = model(states).gather(1, actions.long().view(-1, 1)).squeeze(1)
+            next_qval = target_model(next_states).gather(1, model(next_states).argmax(1, keepdim=True)).squeeze(1)
+        td_errors = (rewards + 0.99*next_qval*(1 - dones) - qvals).abs().numpy()
+        np.testing.assert_allclose(memory.tree.priorities(indices), (td_errors + memory.epsilon) ** memory.alpha,
+                                   rtol=1e-5)
+
+    def test_get_actions(self):
+        states = np.random.randn(16, 3)
+        greedy = self.model.get_qvals(states).argmax(1).numpy()
+        self.model.epsilon_final = 0.0
+        np.testing.assert_array_equal(self.model.get_actions(states, 1e9), greedy)
+        self.model.epsilon_final = 1.0
+        actions = self.model.get_actions(np.repeat(states[:1], 1000, axis=0), 1e9)
+        self.assertEqual(set(actions.tolist()), set(range(self.model.num_actions)))
+
+    def test_soft_update(self):
+        before = [param.clone() for param in self.target_model.parameters()]
+        soft_update(self.target_model, self.model, 0.25)
+        for old, new, source in zip(before, self.target_model.parameters(), self.model.parameters()):
+            torch.testing.assert_close(new, 0.75*old + 0.25*source)
+
+class TestBranchingDQN(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        self.model = BranchingDQN(VirtualEnv(obs_dim=8, act_dim=4))
+        self.target_model = BranchingDQN(VirtualEnv(obs_dim=8, act_dim=4))
+
+    def test_one_head_per_actuator(self):
+        self.assertEqual(tuple(self.model(torch.zeros(5, 8)).shape), (5, 4, 7))
+        self.model.epsilon_final = 0.0
+        actions = self.model.get_actions(np.random.randn(5, 8), 1e9)
+        self.assertEqual(actions.shape, (5, 4))
+        self.assertEqual(self.model.get_action(np.random.randn(8), 1e9).shape, (4,))
+
+    def test_td_loss_per_branch(self):
+        for idx in range(64):
+            self.model.experience.append(np.random.randn(8), np.random.randint(7, size=4), 1.0, False, np.random.randn(8))
+        optimizer = torch.optim.SGD(self.model.parameters(), lr=0.0)
+        np.random.seed(1)
+        loss = cal_TD_Loss(32, self.model, self.target_model, optimizer, 0.99, self.model.experience)
+        np.random.seed(1)
+        states, actions, rewards, dones, next_states = self.model.experience.sample_tensors(32)
+        qvals = self.model(states).gather(2, actions.unsqueeze(2)).squeeze(2)
+        best_actions = self.model(next_states).argmax(2, keepdim=True)
+        next_qval = self.target_model(next_states).gather(2, best_actions).squeeze(2)
+        self.assertGreater(loss.item(), 0.0)
+        torch.testing.assert_close(loss, ((1.0 + 0.99*next_qval - qvals)**2).mean())
+
+class TestRolloutBuffer(unittest.TestCase):
+    def setUp(self):
+        self.num_steps, self.num_envs = 5, 3
+        self.rollout = RolloutBuffer(self.num_steps, self.num_envs, (8,), (4,), torch.device("cpu"))
+        self.states = np.random.randn(self.num_steps, self.num_envs, 8)
+        self.actions = torch.randn(self.num_steps, self.num_envs, 4)
+        self.values = torch.randn(self.num_steps, self.num_envs, 1)
+        self.rewards = np.random.randn(self.num_steps, self.num_envs)
+        self.dones = np.random.rand(self.num_steps, self.num_envs) > 0.7
+        for step in range(self.num_steps):
+            state = self.rollout.insert_state(self.states[step])
+            self.assertEqual(state.dtype, torch.float32)
+            self.rollout.insert(self.actions[step], -self.actions[step], self.values[step], self.rewards[step], self.dones[step])
+
+    def test_flatten_matches_concatenated_lists(self):
+        next_value = torch.randn(self.num_envs, 1)
+        self.rollout.compute_returns(next_value)
+        rewards = [torch.FloatTensor(reward).unsqueeze(1) for reward in self.rewards]
+        masks = [torch.FloatTensor(1 - done).unsqueeze(1) for done in self.dones]
+        returns = torch.cat(compute_gae(next_value, rewards, masks, list(self.values)))
+
+        states, actions, log_probs, flat_returns, advantages = self.rollout.flatten()
+        self.assertEqual(self.rollout.step, 0)
+        torch.testing.assert_close(states, torch.FloatTensor(self.states).view(-1, 8))
+        torch.testing.assert_close(actions, self.actions.view(-1, 4))
+        torch.testing.assert_close(log_probs, -self.actions.view(-1, 4))
+        torch.testing.assert_close(flat_returns, returns)
+        torch.testing.assert_close(advantages, returns - self.values.view(-1, 1))
+
+class TestComputeGae(unittest.TestCase):
+    def test_batch_matches_step_loop(self):
+        gamma, tau = 0.99, 0.95
+        rewards = np.random.randn(20, 4, 1)
+        masks = (np.random.rand(20, 4, 1) > 0.2).astype(np.float64)
+        values = np.random.randn(20, 4, 1)
+        next_value = np.random.randn(4, 1)
+        expected = np.empty_like(rewards)
+        gae = 0
+        for step in reversed(range(20)):
+            value_next = next_value if step == 19 else values[step + 1]
+            gae = rewards[step] + gamma * value_next * masks[step] - values[step] + gamma * tau * masks[step] * gae
+            expected[step] = gae + values[step]
+
+        np.testing.assert_allclose(compute_gae_batch(next_value, rewards, masks, values, gamma, tau), expected)
+        returns = compute_gae(torch.tensor(next_value), list(torch.tensor(rewards)), list(torch.tensor(masks)),
+                              list(torch.tensor(values)), gamma, tau)
+        self.assertEqual(len(returns), 20)
+        np.testing.assert_allclose(torch.stack(returns).numpy(), expected)
+
+    def expected_returns(self, next_value, rewards, masks, values, gamma=0.99, tau=0.95):
+        gae, expected = 0, []
+        for step in reversed(range(len(rewards))):
+            value_next = next_value if step == len(rewards) - 1 else values[step + 1]
+            gae = rewards[step] + gamma * value_next * masks[step] - values[step] + gamma * tau * masks[step] * gae
+            expected.insert(0, gae + values[step])
+        return expected
+
+    def test_scalar_lists(self):
+        rewards, masks, values = [1.0]*5, [1.0, 1.0, 0.0, 1.0, 1.0], [0.5, 0.0, 0.2, 0.0, 0.1]
+        returns = compute_gae(0.0, rewards, masks, values)
+        self.assertEqual(len(returns), 5)
+        np.testing.assert_allclose(returns, self.expected_returns(0.0, rewards, masks, values))
+        np.testing.assert_allclose(compute_gae(0.0, [1.0]*5, [1.0]*5, [0.0]*5),
+                                   self.expected_returns(0.0, [1.0]*5, [1.0]*5, [0.0]*5))
+
+    def test_integer_rewards(self):
+        rewards, masks, values = [1, 0, 1], [1, 1, 0], [0.1, 0.2, 0.3]
+        returns = compute_gae(0.5, rewards, masks, values)
+        np.testing.assert_allclose(returns, self.expected_returns(0.5, rewards, masks, values))
+        returns = compute_gae_batch(np.zeros(2), np.ones((3, 2), dtype=np.int64), np.ones((3, 2), dtype=np.int64),
+                                    np.zeros((3, 2), dtype=np.int64))
+        self.assertEqual(returns.dtype, np.float64)
+        np.testing.assert_allclose(returns[:, 0], self.expected_returns(0, [1] * 3, [1] * 3, [0] * 3))
+
+    def test_one_dimensional(self):
+        rewards, masks, values = np.random.randn(10), (np.random.rand(10) > 0.2).astype(np.float64), np.random.randn(10)
+        expected = self.expected_returns(0.3, rewards, masks, values)
+        np.testing.assert_allclose(compute_gae_batch(np.float64(0.3), rewards, masks, values), expected)
+        out = np.empty(10)
+        self.assertIs(compute_gae_batch(np.float64(0.3), rewards, masks, values, out=out), out)
+        np.testing.assert_allclose(out, expected)
+        returns = compute_gae_batch(torch.tensor(0.3, dtype=torch.float64), torch.tensor(rewards), torch.tensor(masks),
+                                    torch.tensor(values))
+        np.testing.assert_allclose(returns.numpy(), expected)
+
+class TestMinibatchSampler(unittest.TestCase):
+    def setUp(self):
+        self.states = torch.arange(10.).view(10, 1).repeat(1, 3)
+        self.returns = torch.arange(10.).view(10, 1)
+
+    def test_epoch_visits_every_sample_once(self):
+        sampler = MinibatchSampler(4, self.states, self.returns)
+        minibatches = list(sampler)
+        self.assertEqual([len(returns) for _, returns in minibatches], [4, 4, 2])
+        for states, returns in minibatches:
+            self.assertEqual(states.shape[1:], (3,))
+            torch.testing.assert_close(states[:, 0:1], returns)
+        samples = torch.cat([returns for _, returns in minibatches]).view(-1)
+        self.assertEqual(sorted(samples.tolist()), list(range(10)))
+
+    def test_drop_last(self):
+        sampler = MinibatchSampler(4, self.states, self.returns, drop_last=True)
+        self.assertEqual([len(returns) for _, returns in sampler], [4, 4])
+
+class TestExportActor(unittest.TestCase):
+    def test_exported_actor_returns_mean_action(self):
+        model = ActorCritic(VirtualEnv(obs_dim=8, act_dim=4))
+        states = np.random.randn(5, 8)
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, "actor.pt")
+            export_actor(model, file_path)
+            policy = load_actor(file_path)
+        dist, _ = model(torch.FloatTensor(states))
+        torch.testing.assert_close(policy(torch.FloatTensor(states)), dist.mean)
+        np.testing.assert_allclose(policy_action(policy, states[0]), dist.mean[0].detach().numpy(), rtol=1e-5, atol=1e-6)
+        self.assertTrue(model.training)
+
+    def test_quantized_actor(self):
+        model = ActorCritic(VirtualEnv(obs_dim=3, act_dim=1))
+        states = np.random.randn(200, 3)
+        with tempfile.TemporaryDirectory() as directory:
+            float_path, int8_path = os.path.join(directory, "float.pt"), os.path.join(directory, "int8.pt")
+            export_actor(model, float_path)
+            export_actor(model, int8_path, quantize=True)
+            self.assertLess(os.path.getsize(int8_path), os.path.getsize(float_path) / 2)
+            policy = load_actor(int8_path)
+        self.assertEqual(policy_error(model, export_actor(model), states), (0.0, 0.0))
+        max_error, mean_error = policy_error(model, policy, states)
+        self.assertGreater(max_error, 0.0)
+        self.assertLess(mean_error, 0.05)
+
+if __name__ == '__main__':
+    unittest.main()
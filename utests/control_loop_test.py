@@ -0,0 +1,70 @@
+## @package control_loop_test
+#  Unit tests for the ControlLoop in include/control_loop.py on a simulated clock, and on the real clock with simulated
+#  work.
+import time
+import unittest
+import numpy as np
+from include.control_loop import ControlLoop
+
+## SimulatedClock
+#  Clock only advancing on sleep and on simulated work. Every sleep wakes up wake_latency late.
+class SimulatedClock:
+    def __init__(self, wake_latency=0.0):
+        self.now = 0.0
+        self.wake_latency = wake_latency
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, duration):
+        self.now += duration + self.wake_latency
+
+class TestControlLoop(unittest.TestCase):
+    def setUp(self):
+        self.clock = SimulatedClock()
+        self.loop = ControlLoop(100, clock=self.clock, sleep=self.clock.sleep)
+
+    def run_cycles(self, work_times):
+        starts = []
+        for work_time in work_times:
+            starts.append(self.clock.now)
+            self.clock.now += work_time
+            self.loop.wait()
+        return np.array(starts)
+
+    def test_period_independent_of_work(self):
+        starts = self.run_cycles([0.002, 0.009, 0.0, 0.005])
+        np.testing.assert_allclose(np.diff(starts), 0.01)
+        self.assertEqual(self.loop.overruns, 0)
+        self.assertAlmostEqual(self.loop.stats()['rate (Hz)'], 100)
+
+    def test_overrun_skips_missed_deadlines(self):
+        starts = self.run_cycles([0.001, 0.025, 0.001, 0.001])
+        # The second cycle ends at 0.035; the deadlines at 0.02 and 0.03 are missed and the loop stays on the grid
+        np.testing.assert_allclose(starts, [0.0, 0.01, 0.035, 0.04])
+        self.assertEqual((self.loop.overruns, self.loop.missed), (1, 1))
+        np.testing.assert_allclose(self.loop.lateness, [0.0, 0.015, 0.0, 0.0], atol=1e-12)
+
+    def test_jitter_statistics(self):
+        self.clock.wake_latency = 0.0002
+        self.run_cycles([0.001] * 10)
+        stats = self.loop.stats()
+        self.assertAlmostEqual(stats['jitter p50 (ms)'], 0.2)
+        self.assertAlmostEqual(stats['work p99 (ms)'], 1.0)
+        self.assertEqual(stats['cycles'], 10)
+
+    def test_start_resets(self):
+        self.run_cycles([0.02])
+        self.loop.start()
+        self.assertEqual((self.loop.cycles, self.loop.overruns, len(self.loop.lateness)), (0, 0, 0))
+        self.assertAlmostEqual(self.loop.deadline, self.clock.now + 0.01)
+
+    def test_real_clock(self):
+        loop = ControlLoop(200, spin_time=0.0005)
+        loop.run(lambda: time.sleep(0.001), 40)
+        stats = loop.stats()
+        self.assertEqual(stats['cycles'], 40)
+        self.assertAlmostEqual(stats['rate (Hz)'], 200, delta=20)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+## @package device_backend_test
+#  Unit tests for the simulated devices of include/device_backend.py, driven through the robot classes.
+import time
+import unittest
+import numpy as np
+from include.control_interface import MPU6050Control, PiCameraControl, ServoControl
+from include.device_backend import SimulatedBackend, VirtualI2CBus
+from include.filters import BatchKalman
+from include.i2c_handler import MPU6050, PCA9685
+from include.robot_platform import RobotPlatform
+from include.servo_daemon_interface import servo_map
+
+class TestSimulatedBackend(unittest.TestCase):
+    def setUp(self):
+        self.backend = SimulatedBackend()
+
+    def test_servoblaster_one_write_per_step(self):
+        servo = ServoControl([3, 5], backend=self.backend)
+        writes = self.backend.servoblaster.writes
+        servo.moveMotors([-5, 5])
+        self.assertEqual(self.backend.servoblaster.writes, writes + 1)
+        self.assertEqual(self.backend.servoblaster.outputs, {3: servo_map(-15, -90, 90, 550, 3000),
+                                                             5: servo_map(30, -90, 90, 550, 3000)})
+
+    def test_pca9685_registers(self):
+        pca = PCA9685(bus=self.backend.i2c_bus(0x40))
+        pca.set_pulses(range(16), [1500]*16)
+        np.testing.assert_array_equal(self.backend.buses[0x40].off_counts(), [pca._pulseCounts(1500)]*16)
+        pca.set_pulses([2, 3], [1000, 2000])
+        self.assertEqual(self.backend.buses[0x40].off_counts()[2:5].tolist(),
+                         [pca._pulseCounts(1000), pca._pulseCounts(2000), pca._pulseCounts(1500)])
+
+    def test_mpu6050_level_and_realtime_fifo(self):
+        control = MPU6050Control(backend=self.backend)
+        self.assertAlmostEqual(control.pitch, 0.0)
+        self.assertAlmostEqual(control.mpu.temperature, 25.0, places=2)
+        mpu = MPU6050(bus=self.backend.i2c_bus(0x68), fifo=True, sample_rate_div=9)
+        time.sleep(0.05)
+        samples = mpu.read_fifo()
+        self.assertGreaterEqual(len(samples), 4)
+        np.testing.assert_array_equal(samples[-1], [0, 0, 1, 0, 0, 0])
+
+    def test_mpu6050_pitch_reset_before_filtering(self):
+        control = MPU6050Control(backend=self.backend)
+        self.backend.i2c_bus(0x68).set_sensors([0, 0, 16384, 0, 131, 262, 0])
+
+        # Pitch wrapping from above 90 to below -90 degrees
+        def wrapped_pitch():
+            control.roll, control.pitch = 0.0, -100.0
+        control.getPlatformAngle = wrapped_pitch
+        control.kalAngleY = 100.0
+        expected = BatchKalman(2)
+        expected.setAngle([control.kalman.angle[0], -100.0])
+        angles = expected.getAngle([0.0, -100.0], [-1.0, 2.0], control.dt)
+        np.testing.assert_allclose(control.kf_update(), angles)
+        self.assertEqual(control.gyro_x, -1.0)
+
+    def test_transaction_latency(self):
+        bus = VirtualI2CBus(latency=0.002)
+        start = time.perf_counter()
+        for register in range(5):
+            bus.read_byte(register)
+        self.assertGreaterEqual(time.perf_counter() - start, 0.01)
+
+    def test_camera_frames(self):
+        camera = PiCameraControl((48, 64), backend=self.backend)
+        first = camera.captureImage().copy()
+        second = camera.captureImage()
+        self.assertEqual(second.shape, (48, 64, 3))
+        np.testing.assert_array_equal(second.astype(int) - first, 1)
+
+    def test_robot_platform_episode(self):
+        env = RobotPlatform([12], np.linspace(0.3, -0.1, 20), control_freq=500, backend=self.backend)
+        state, done, steps = env.reset(), False, 0
+        while not done:
+            state, _, done, _ = env.step(np.array([1.0]))
+            steps += 1
+        self.assertEqual(steps, 19)
+        self.assertEqual(env.control_loop.cycles, 19)
+        self.assertIn(12, self.backend.servoblaster.outputs)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+## @package env_register_test
+#  Unit tests for the model sharing of src/env/envRegister.py. gym and mujoco_py are replaced by stub modules for the
+#  duration of each test, the stub mujoco_py counting how often a model file is parsed.
+import sys
+import types
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+import numpy as np
+
+## StubModel
+#  Compiled model of 7 joints standing in for a PyMjModel.
+class StubModel:
+    def __init__(self, model_path):
+        self.model_path = model_path
+        self.opt = SimpleNamespace(timestep=0.01)
+        self.nq = self.nv = 7
+
+class StubSim:
+    def __init__(self, model):
+        self.model = model
+        self.data = SimpleNamespace(qpos=np.zeros(model.nq), qvel=np.zeros(model.nv))
+
+## stub_modules
+#  Returns stubs of mujoco_py and the gym modules imported by envRegister. The stub MujocoEnv loads its model through
+#  the stub mujoco_py, as gym's does.
+def stub_modules():
+    mujoco_py = types.ModuleType("mujoco_py")
+    mujoco_py.load_model_from_path = mock.Mock(side_effect=StubModel)
+    mujoco_py.load_model_from_mjb = mock.Mock(side_effect=StubModel)
+    mujoco_py.MjSim = StubSim
+
+    class MujocoEnv:
+        def __init__(self, model_path, frame_skip):
+            self.frame_skip = frame_skip
+            self.model = mujoco_py.load_model_from_path(model_path)
+            self.sim = StubSim(self.model)
+
+        @property
+        def dt(self):
+            return self.model.opt.timestep * self.frame_skip
+
+        def _set_action_space(self):
+            self.action_space = SimpleNamespace(sample=lambda: np.zeros(1))
+
+        def _set_observation_space(self, observation):
+            self.observation_shape = observation.shape
+
+        def seed(self, seed=None):
+            pass
+
+        def do_simulation(self, ctrl, n_frames):
+            pass
+
+    class EzPickle:
+        def __init__(self, *args, **kwargs):
+            pass
+
+    gym = types.ModuleType("gym")
+    gym.utils = types.ModuleType("gym.utils")
+    gym.utils.EzPickle = EzPickle
+    gym.envs = types.ModuleType("gym.envs")
+    gym.envs.mujoco = types.ModuleType("gym.envs.mujoco")
+    gym.envs.mujoco.mujoco_env = types.ModuleType("gym.envs.mujoco.mujoco_env")
+    gym.envs.mujoco.mujoco_env.MujocoEnv = MujocoEnv
+    return {"mujoco_py": mujoco_py, "gym": gym, "gym.utils": gym.utils, "gym.envs": gym.envs,
+            "gym.envs.mujoco": gym.envs.mujoco, "gym.envs.mujoco.mujoco_env": gym.envs.mujoco.mujoco_env}
+
+class TestSharedModel(unittest.TestCase):
+    def setUp(self):
+        self.modules = stub_modules()
+        patcher = mock.patch.dict(sys.modules, self.modules)
+        patcher.start()
+        # Restoring sys.modules also drops the envRegister imported on the stubs
+        self.addCleanup(patcher.stop)
+        sys.modules.pop("src.env.envRegister", None)
+        from src.env import envRegister
+        self.envRegister = envRegister
+        self.load_model_from_path = self.modules["mujoco_py"].load_model_from_path
+
+    def test_preloaded_model_parsed_once(self):
+        model = self.envRegister.preload_model('SimpleLeg.xml')
+        self.assertIs(self.envRegister.preload_model('SimpleLeg.xml'), model)
+        envs = [self.envRegister.ProofOfConceptModel(model=model) for _ in range(2)]
+        self.load_model_from_path.assert_called_once_with(self.envRegister.asset_path('SimpleLeg.xml'))
+        for env in envs:
+            self.assertIs(env.model, model)
+            self.assertEqual(env.init_qpos.shape, (7,))
+        self.assertIsNot(envs[0].sim, envs[1].sim)
+
+    def test_without_model_parses_file(self):
+        env = self.envRegister.ProofOfConceptModel()
+        self.envRegister.ProofOfConceptModel()
+        self.assertEqual(self.load_model_from_path.call_count, 2)
+        self.assertEqual(env.model.model_path, self.envRegister.asset_path('SimpleLeg.xml'))
+
+    def test_preload_from_mjb(self):
+        model = self.envRegister.preload_model('PlatformV2.xml', mjb=b"compiled")
+        self.modules["mujoco_py"].load_model_from_mjb.assert_called_once_with(b"compiled")
+        self.load_model_from_path.assert_not_called()
+        self.assertIs(self.envRegister.preload_model('PlatformV2.xml'), model)
+
+if __name__ == '__main__':
+    unittest.main()
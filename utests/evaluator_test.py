@@ -0,0 +1,63 @@
+## @package evaluator_test
+#  Unit tests for the Evaluator and evaluate_policy in include/evaluator.py on VirtualEnvs.
+import pickle
+import time
+import unittest
+import numpy as np
+import torch
+from common.multiprocessing_env import SubprocVecEnv
+from include.agentArchitecture import ActorCritic
+from include.evaluator import Evaluator, evaluate_policy, network_copy
+from utests.virtual_envs import VirtualEnv, make_virtual_env
+
+class TestEvaluator(unittest.TestCase):
+    def setUp(self):
+        self.env_fns = [make_virtual_env(episode_length=10, env_id=env_id) for env_id in range(2)]
+        self.model = ActorCritic(VirtualEnv())
+        self.model.getOptimizer(torch.optim.Adam(self.model.parameters()))
+        # Rewards of VirtualEnv are env_id + step over the 10 steps of the episode
+        self.expected = [sum(env_id + step for step in range(1, 11)) for env_id in range(2)]
+
+    def test_evaluate_policy(self):
+        envs = SubprocVecEnv(self.env_fns)
+        try:
+            np.testing.assert_array_equal(evaluate_policy(self.model, envs), self.expected)
+        finally:
+            envs.close()
+
+    def test_network_copy_drops_optimizer(self):
+        # Populate the Adam state
+        self.model(torch.zeros(1, 3))[1].sum().backward()
+        self.model.optimizer.step()
+        model = network_copy(self.model)
+        self.assertIsNone(model.optimizer)
+        self.assertIsInstance(self.model.optimizer, torch.optim.Adam)
+        for copied, original in zip(model.parameters(), self.model.parameters()):
+            self.assertIsNot(copied, original)
+            self.assertTrue(torch.equal(copied, original))
+        self.assertLess(len(pickle.dumps(model)), len(pickle.dumps(self.model)) / 1.5)
+
+    def test_submit_poll_close(self):
+        evaluator = Evaluator(self.model, self.env_fns)
+        try:
+            self.assertTrue(evaluator.submit(1000, self.model))
+            self.assertFalse(evaluator.submit(2000, self.model))
+            results = evaluator.poll(block=True)
+        finally:
+            evaluator.close()
+        self.assertFalse(evaluator.process.is_alive())
+        self.assertEqual(len(results), 1)
+        frame_idx, episode_rewards = results[0]
+        self.assertEqual(frame_idx, 1000)
+        np.testing.assert_array_equal(episode_rewards, self.expected)
+
+    def test_close_terminates_stuck_evaluation(self):
+        evaluator = Evaluator(self.model, [make_virtual_env(episode_length=1000, step_delay=0.5)])
+        evaluator.submit(1000, self.model)
+        start = time.perf_counter()
+        evaluator.close(timeout=1)
+        self.assertFalse(evaluator.process.is_alive())
+        self.assertLess(time.perf_counter() - start, 10)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+## @package filters_test
+#  Unit tests for the Kalman filters in include/filters.py
+import unittest
+import numpy as np
+from include.filters import BatchKalman, Kalman
+
+class TestBatchKalman(unittest.TestCase):
+    def setUp(self):
+        steps, self.num_axes = 200, 3
+        self.dt = 0.01
+        true_angles = np.cumsum(np.random.randn(steps, self.num_axes) * 0.01, axis=0)
+        self.rates = np.gradient(true_angles, self.dt, axis=0) + 0.2 + np.random.randn(steps, self.num_axes) * 0.05
+        self.angles = true_angles + np.random.randn(steps, self.num_axes) * 0.05
+
+    def scalar_filter(self):
+        filters = [Kalman() for _ in range(self.num_axes)]
+        return np.array([[kalman.getAngle(self.angles[step, axis], self.rates[step, axis], self.dt)
+                          for axis, kalman in enumerate(filters)] for step in range(len(self.angles))])
+
+    def test_matches_one_kalman_per_axis(self):
+        kalman = BatchKalman(self.num_axes)
+        filtered = np.array([kalman.getAngle(angle, rate, self.dt) for angle, rate in zip(self.angles, self.rates)])
+        np.testing.assert_allclose(filtered, self.scalar_filter())
+
+    def test_filter_log(self):
+        kalman = BatchKalman(self.num_axes)
+        np.testing.assert_allclose(kalman.filter_log(self.angles, self.rates, self.dt), self.scalar_filter())
+        self.assertEqual(kalman.P.shape, (self.num_axes, 2, 2))
+
+    def test_set_angle(self):
+        kalman = BatchKalman(2)
+        kalman.setAngle(0.5, axes=1)
+        np.testing.assert_array_equal(kalman.angle, [0.0, 0.5])
+
+if __name__ == '__main__':
+    unittest.main()
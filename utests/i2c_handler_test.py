@@ -0,0 +1,86 @@
+## @package i2c_handler_test
+#  Unit tests for the PCA9685 and MPU6050 in include/i2c_handler.py against the virtual I2C devices of
+#  include/device_backend.py.
+import unittest
+import numpy as np
+from include.i2c_handler import MPU6050, PCA9685
+from include.device_backend import VirtualI2CBus, VirtualMPU6050Bus
+
+class TestPCA9685(unittest.TestCase):
+    def setUp(self):
+        self.bus = VirtualI2CBus()
+        self.pca = PCA9685(bus=self.bus)
+        self.bus.transactions.clear()
+
+    def off_counts(self, channel):
+        register = 0x06 + 4*channel
+        return self.bus.registers[register + 2] | self.bus.registers[register + 3] << 8
+
+    def test_setup_enables_auto_increment(self):
+        self.assertTrue(self.bus.registers[0x00] & 0x20)
+        self.assertEqual(self.bus.registers[0xFE], int(25000000/(4096*50) - 0.5))
+
+    def test_single_channel_is_one_transaction(self):
+        self.pca.servo_set_angle(3, 1500)
+        self.assertEqual(len(self.bus.transactions), 1)
+        self.assertEqual(self.off_counts(3), self.pca._pulseCounts(1500))
+
+    def test_contiguous_channels_use_block_writes(self):
+        pulses = [1000 + 50*channel for channel in range(12)]
+        self.pca.set_pulses(range(12), pulses)
+        # 12 channels of 4 bytes in 32 byte blocks
+        self.assertEqual([(kind, register, len(data)) for kind, register, data in self.bus.transactions],
+                         [("write", 0x06, 32), ("write", 0x06 + 4*8, 16)])
+        self.assertEqual([self.off_counts(channel) for channel in range(12)], [self.pca._pulseCounts(pulse) for pulse in pulses])
+
+    def test_runs_of_channels(self):
+        self.pca.set_pulses([9, 0, 1, 2, 8, 15], [1000, 1100, 1200, 1300, 1400, 1500])
+        self.assertEqual([register for _, register, _ in self.bus.transactions], [0x06, 0x06 + 4*8, 0x06 + 4*15])
+        self.assertEqual(self.off_counts(9), self.pca._pulseCounts(1000))
+        self.assertEqual(self.off_counts(3), 0)
+
+    def test_coinciding_values_use_all_led(self):
+        self.pca.set_pulses(range(16), [1500]*16)
+        self.assertEqual(self.bus.transactions, [("write", 0xFA, bytes(self.pca._pulseBytes(0, self.pca._pulseCounts(1500))))])
+        self.bus.transactions.clear()
+        self.pca.set_pulses(range(4), [1500]*4)
+        self.assertEqual(self.bus.transactions[0][1], 0x06)
+        self.bus.transactions.clear()
+        self.pca.set_pulses(range(4), [1500]*4, all_channels=True)
+        self.assertEqual(self.bus.transactions[0][1], 0xFA)
+
+class TestMPU6050(unittest.TestCase):
+    def setUp(self):
+        self.bus = VirtualMPU6050Bus()
+        self.mpu = MPU6050(bus=self.bus)
+        self.bus.transactions.clear()
+
+    def test_burst_read(self):
+        self.bus.set_sensors([16384, -8192, 0, -340*10, 131, -262, 32767])
+        values = self.mpu.read_sensors()
+        self.assertEqual(len(self.bus.transactions), 1)
+        np.testing.assert_allclose(values, [1.0, -0.5, 0.0, 1.0, -2.0, 32767/131])
+        self.assertAlmostEqual(self.mpu.temperature, 26.53)
+
+    def test_fifo_drain(self):
+        self.mpu.enable_fifo()
+        self.assertEqual(self.mpu.sample_rate, 1000.0)
+        self.bus.transactions.clear()
+        raw = np.random.randint(-32768, 32767, size=(20, 6))
+        self.bus.push_fifo(raw)
+        # A partially written sample stays in the FIFO
+        self.bus.fifo += b"\x01\x02"
+        samples = self.mpu.read_fifo()
+        np.testing.assert_allclose(samples, raw * MPU6050.SCALE)
+        # FIFO_COUNT and 240 bytes in blocks of 24 bytes
+        self.assertEqual(len(self.bus.transactions), 1 + 10)
+        self.assertEqual(len(self.bus.fifo), 2)
+
+    def test_fifo_overflow_resets(self):
+        self.mpu.enable_fifo()
+        self.bus.push_fifo(np.zeros((100, 6)))
+        self.assertEqual(len(self.mpu.read_fifo()), 0)
+        self.assertEqual(len(self.bus.fifo), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,25 @@
+## @package robot_platform_test
+#  Unit tests for the RobotPlatform in include/robot_platform.py on the simulated device backend.
+import os
+import subprocess
+import sys
+import unittest
+import numpy as np
+from include.device_backend import SimulatedBackend
+from include.robot_platform import RobotPlatform
+
+class TestRobotPlatform(unittest.TestCase):
+    def test_import_does_not_load_torch(self):
+        # A fresh interpreter, as the test runner has imported PyTorch already
+        output = subprocess.check_output([sys.executable, "-c", "import sys, include.robot_platform, include.robot_runtime;"
+                                                                " print('torch' in sys.modules)"],
+                                         cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.assertEqual(output.decode().strip(), "False")
+
+    def test_run_policy_without_policy(self):
+        env = RobotPlatform([12], np.linspace(0.3, -0.1, 10), control_freq=500, backend=SimulatedBackend())
+        self.assertIsNone(env.policy)
+        self.assertRaises(RuntimeError, env.runPolicy)
+
+if __name__ == '__main__':
+    unittest.main()
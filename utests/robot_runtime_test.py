@@ -0,0 +1,129 @@
+## @package robot_runtime_test
+#  Unit tests for the SharedDoubleBuffer and RobotRuntime in include/robot_runtime.py, running the policy process on
+#  a VirtualEnv.
+import multiprocessing as mp
+import os
+import tempfile
+import unittest
+import numpy as np
+from include.agentArchitecture import ActorCritic, export_actor, policy_action
+from include.robot_runtime import RobotRuntime, SharedDoubleBuffer
+from utests.virtual_envs import VirtualEnv
+
+## write_ramp
+#  Writes vectors of identical values 0..writes-1 to the buffer called name.
+def write_ramp(name, size, writes):
+    buffer = SharedDoubleBuffer(size, name)
+    for idx in range(writes):
+        buffer.write(np.full(size, idx))
+    buffer.close()
+
+## RecordingEnv
+#  VirtualEnv recording the states returned and the actions received.
+class RecordingEnv(VirtualEnv):
+    def __init__(self, **kwargs):
+        super(RecordingEnv, self).__init__(**kwargs)
+        self.states, self.actions = [], []
+
+    def reset(self):
+        self.states.append(super(RecordingEnv, self).reset())
+        return self.states[-1]
+
+    def step(self, action):
+        self.actions.append(np.array(action))
+        state, reward, done, info = super(RecordingEnv, self).step(action)
+        self.states.append(state)
+        return state, reward, done, info
+
+class TestSharedDoubleBuffer(unittest.TestCase):
+    def setUp(self):
+        self.buffer = SharedDoubleBuffer(4)
+
+    def tearDown(self):
+        self.buffer.close()
+
+    def test_write_read(self):
+        self.assertIsNone(self.buffer.read())
+        self.assertEqual(self.buffer.write([1, 2, 3, 4], timestamp=0.5), 1)
+        self.buffer.write([5, 6, 7, 8], timestamp=1.5)
+        reader = SharedDoubleBuffer(4, self.buffer.name)
+        seq, timestamp, values = reader.read()
+        self.assertEqual((seq, timestamp), (2, 1.5))
+        np.testing.assert_array_equal(values, [5, 6, 7, 8])
+        reader.close()
+
+    def test_write_in_progress_keeps_latest(self):
+        self.buffer.write([1, 2, 3, 4])
+        # A write to the other slot started but did not finish
+        self.buffer.header[1] += 1
+        self.buffer.slots[1] = -1
+        np.testing.assert_array_equal(self.buffer.read()[2], [1, 2, 3, 4])
+
+    def test_no_torn_reads_across_processes(self):
+        writes = 20000
+        process = mp.get_context("fork").Process(target=write_ramp, args=(self.buffer.name, 4, writes))
+        process.start()
+        readings = []
+        while process.is_alive():
+            reading = self.buffer.read()
+            if reading is not None:
+                readings.append(reading)
+        process.join()
+        for seq, _, values in readings:
+            np.testing.assert_array_equal(values, seq - 1)
+        self.assertEqual(self.buffer.read()[0], writes)
+
+class TestRobotRuntime(unittest.TestCase):
+    def setUp(self):
+        self.env = RecordingEnv(obs_dim=3, act_dim=2, episode_length=30, step_delay=0.002)
+        self.model = ActorCritic(self.env)
+        self.directory = tempfile.TemporaryDirectory()
+        self.policy_file = os.path.join(self.directory.name, "actor.pt")
+        export_actor(self.model, self.policy_file)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def run_episode(self, inference_budget):
+        runtime = RobotRuntime(self.env, self.policy_file, 3, 2, inference_budget=inference_budget)
+        try:
+            total_reward = runtime.run()
+        finally:
+            runtime.close()
+        return runtime, total_reward
+
+    def test_actions_answer_each_state(self):
+        runtime, total_reward = self.run_episode(inference_budget=1.0)
+        self.assertEqual(total_reward, sum(range(1, 31)))
+        self.assertEqual((runtime.steps, runtime.late_actions), (30, 0))
+        policy = export_actor(self.model)
+        for state, action in zip(self.env.states, self.env.actions):
+            np.testing.assert_allclose(action, policy_action(policy, state), rtol=1e-5, atol=1e-6)
+
+    def test_late_actions_are_held(self):
+        runtime, _ = self.run_episode(inference_budget=0.0)
+        self.assertGreater(runtime.late_actions, 0)
+        self.assertEqual(len(self.env.actions), 30)
+
+    def test_dead_policy_process_stops_episode(self):
+        runtime = RobotRuntime(self.env, self.policy_file, 3, 2, inference_budget=1.0)
+        step = self.env.step
+
+        # Kills the policy process after the tenth step
+        def killing_step(action):
+            result = step(action)
+            if len(self.env.actions) == 10:
+                runtime.policy.process.kill()
+                runtime.policy.process.join()
+            return result
+
+        self.env.step = killing_step
+        try:
+            with self.assertRaises(RuntimeError):
+                runtime.run()
+        finally:
+            runtime.close()
+        self.assertEqual(len(self.env.actions), 10)
+
+if __name__ == '__main__':
+    unittest.main()
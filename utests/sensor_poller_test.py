@@ -0,0 +1,56 @@
+## @package sensor_poller_test
+#  Unit tests for the SensorPoller and LatestValue slot in include/sensor_poller.py.
+import threading
+import time
+import unittest
+from include.sensor_poller import LatestValue, SensorPoller
+
+class TestLatestValue(unittest.TestCase):
+    def test_publish_overwrites(self):
+        slot = LatestValue()
+        self.assertIsNone(slot.read())
+        slot.publish("first", 1.0)
+        slot.publish("second", 2.0)
+        self.assertEqual(tuple(slot.read()), (2.0, 2, "second"))
+
+    def test_reader_sees_whole_readings(self):
+        slot = LatestValue()
+        torn = []
+        def writer():
+            for idx in range(20000):
+                slot.publish((idx, -idx), float(idx))
+        thread = threading.Thread(target=writer)
+        thread.start()
+        while thread.is_alive():
+            reading = slot.read()
+            if reading is not None and (reading.value[0] != -reading.value[1] or reading.seq != reading.value[0] + 1):
+                torn.append(reading)
+        thread.join()
+        self.assertEqual(torn, [])
+
+class TestSensorPoller(unittest.TestCase):
+    def test_polls_at_its_own_rate(self):
+        calls = []
+        poller = SensorPoller(lambda: calls.append(None) or len(calls), 500)
+        poller.start()
+        first = poller.wait_ready(timeout=1)
+        time.sleep(0.1)
+        latest = poller.latest()
+        poller.stop(timeout=1)
+        self.assertFalse(poller.is_alive())
+        self.assertEqual((first.seq, first.value), (1, 1))
+        self.assertEqual(latest.seq, latest.value)
+        self.assertGreater(latest.seq, 20)
+        self.assertGreater(latest.timestamp, first.timestamp)
+
+    def test_error_raised_by_latest(self):
+        def read():
+            raise IOError("bus error")
+        poller = SensorPoller(read, 100)
+        poller.start()
+        self.assertRaises(IOError, poller.wait_ready, 1)
+        poller.join(timeout=1)
+        self.assertRaises(IOError, poller.latest)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+## @package servo_daemon_test
+#  Unit tests for the ServoBlasterWriter in include/servo_daemon_interface.py, using a regular file and a FIFO in place
+#  of /dev/servoblaster.
+import os
+import tempfile
+import threading
+import unittest
+from include.servo_daemon_interface import ServoBlasterWriter, servo_configure, servo_map
+
+class TestServoBlasterWriter(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.device_path = os.path.join(self.directory.name, "servoblaster")
+        servo_configure(12, 550, 3000, -90, 90)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def read_device(self):
+        with open(self.device_path) as device:
+            return device.read()
+
+    def test_commands_written_on_flush(self):
+        with ServoBlasterWriter(self.device_path) as writer:
+            writer.set(7, 150)
+            writer.set_angle(12, 5)
+            self.assertEqual(self.read_device(), "")
+            writer.flush()
+            self.assertEqual(self.read_device(), "P1-7=150\nP1-12={}\n".format(servo_map(5, -90, 90, 550, 3000)))
+            writer.set(7, 160)
+        self.assertTrue(self.read_device().endswith("P1-7=160\n"))
+
+    def test_fifo_receives_one_write_per_step(self):
+        os.mkfifo(self.device_path)
+        reads = []
+        def reader():
+            with open(self.device_path) as device:
+                reads.extend(iter(lambda: os.read(device.fileno(), 4096), b""))
+        thread = threading.Thread(target=reader)
+        thread.start()
+        with ServoBlasterWriter(self.device_path) as writer:
+            for pin in range(12):
+                writer.set(pin, 150)
+            writer.flush()
+        thread.join(timeout=5)
+        self.assertEqual(b"".join(reads), "".join("P1-{}=150\n".format(pin) for pin in range(12)).encode())
+        self.assertEqual(len(reads), 1)
+
+if __name__ == '__main__':
+    unittest.main()
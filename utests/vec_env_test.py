@@ -0,0 +1,183 @@
+## @package vec_env_test
+#  Unit tests for the vectorised environments in common/multiprocessing_env.py
+import os
+import tempfile
+import time
+import unittest
+import numpy as np
+from common.multiprocessing_env import SubprocVecEnv, ShmemVecEnv
+from utests.virtual_envs import VirtualEnv, make_virtual_env
+
+## FaultyEnv
+#  VirtualEnv which crashes the worker, hangs or returns NaNs on its second step.
+class FaultyEnv(VirtualEnv):
+    def __init__(self, fault, **kwargs):
+        super(FaultyEnv, self).__init__(**kwargs)
+        self.fault = fault
+
+    def step(self, action):
+        obs, reward, done, info = super(FaultyEnv, self).step(action)
+        if self._idx == 2:
+            if self.fault == 'crash':
+                os._exit(1)
+            elif self.fault == 'hang':
+                time.sleep(60)
+            elif self.fault == 'nan':
+                obs[:] = np.nan
+        return obs, reward, done, info
+
+def make_faulty_env(fault, **kwargs):
+    def _thunk():
+        return FaultyEnv(fault, **kwargs)
+    return _thunk
+
+## make_failing_restart_env
+#  Thunk of a FaultyEnv whose constructor raises once the file marker exists.
+def make_failing_restart_env(fault, marker, **kwargs):
+    def _thunk():
+        if os.path.exists(marker):
+            raise RuntimeError("Environment failed to start")
+        return FaultyEnv(fault, **kwargs)
+    return _thunk
+
+class TestSubprocVecEnv(unittest.TestCase):
+    def test_envs_per_worker(self):
+        num_envs = 7
+        env_fns = [make_virtual_env(obs_dim=3, episode_length=2, env_id=i) for i in range(num_envs)]
+        actions = np.arange(num_envs, dtype=np.float64).reshape(num_envs, 1)
+        envs = SubprocVecEnv(env_fns, envs_per_worker=3)
+        try:
+            self.assertEqual(envs.nworkers, 3)
+            obs = envs.reset()
+            np.testing.assert_array_equal(obs[:, 0], np.arange(num_envs))
+            obs, rews, dones, infos = envs.step(actions)
+            np.testing.assert_array_equal(obs[:, 2], actions[:, 0])
+            np.testing.assert_array_equal(rews, np.arange(num_envs) + 1)
+            self.assertEqual(len(infos), num_envs)
+            obs, rews, dones, infos = envs.step(actions)
+            self.assertTrue(dones.all())
+            np.testing.assert_array_equal(obs[:, 1], np.zeros(num_envs))
+        finally:
+            envs.close()
+
+    def test_step_wait_ready(self):
+        env_fns = [make_virtual_env(obs_dim=3, env_id=i, step_delay=0.3 if i == 0 else 0.0) for i in range(4)]
+        actions = np.ones((4, 1))
+        for vec_env_class in (SubprocVecEnv, ShmemVecEnv):
+            envs = vec_env_class(env_fns, envs_per_worker=2)
+            try:
+                envs.reset()
+                envs.step_async(actions)
+                env_ids, obs, rews, dones, infos = envs.step_wait_ready(min_ready=1)
+                np.testing.assert_array_equal(env_ids, [2, 3])
+                np.testing.assert_array_equal(obs[:, 0], [2, 3])
+                np.testing.assert_array_equal(rews, [3, 4])
+                with self.assertRaises(ValueError):
+                    envs.step_async_envs([2], actions[:1])
+                with self.assertRaises(RuntimeError):
+                    envs.step_async_envs([0, 1], actions[:2])
+                envs.step_async_envs(env_ids, actions[env_ids])
+                env_ids, obs, rews, dones, infos = envs.step_wait_ready(min_ready=4)
+                np.testing.assert_array_equal(env_ids, [0, 1, 2, 3])
+                np.testing.assert_array_equal(obs[:, 1], [1, 1, 2, 2])
+                self.assertFalse(envs.waiting)
+            finally:
+                envs.close()
+
+    def test_worker_restart(self):
+        actions = np.ones((4, 1))
+        for vec_env_class in (SubprocVecEnv, ShmemVecEnv):
+            for fault in ('crash', 'hang'):
+                env_fns = [make_virtual_env(env_id=i) for i in range(3)] + [make_faulty_env(fault, env_id=3)]
+                envs = vec_env_class(env_fns, envs_per_worker=2, worker_timeout=1.0)
+                try:
+                    envs.reset()
+                    envs.step(actions)
+                    obs, rews, dones, infos = envs.step(actions)
+                    np.testing.assert_array_equal(dones, [False, False, True, True])
+                    np.testing.assert_array_equal(rews[2:], [0, 0])
+                    np.testing.assert_array_equal(obs[2:, 1], [0, 0])
+                    self.assertTrue(infos[3]['worker_restarted'])
+                    self.assertEqual(envs.restarts, [0, 1])
+                    obs, rews, dones, infos = envs.step(actions)
+                    np.testing.assert_array_equal(obs[:, 1], [3, 3, 1, 1])
+                finally:
+                    envs.close()
+
+    def test_failed_restart_raises(self):
+        with tempfile.TemporaryDirectory() as directory:
+            marker = os.path.join(directory, "restarted")
+            env_fns = [make_virtual_env(env_id=0), make_failing_restart_env('crash', marker, env_id=1)]
+            envs = ShmemVecEnv(env_fns, worker_timeout=1.0)
+            try:
+                envs.reset()
+                envs.step(np.ones((2, 1)))
+                open(marker, "w").close()
+                with self.assertRaises(RuntimeError):
+                    envs.step(np.ones((2, 1)))
+            finally:
+                envs.close()
+
+    def test_unstable_env_is_reset(self):
+        envs = SubprocVecEnv([make_faulty_env('nan', env_id=0)])
+        try:
+            envs.reset()
+            envs.step(np.ones((1, 1)))
+            obs, rews, dones, infos = envs.step(np.ones((1, 1)))
+            self.assertTrue(dones[0])
+            self.assertTrue(infos[0]['unstable'])
+            self.assertTrue(np.isfinite(obs).all())
+        finally:
+            envs.close()
+
+class TestShmemVecEnv(unittest.TestCase):
+    def setUp(self):
+        self.num_envs = 4
+        self.env_fns = [make_virtual_env(obs_dim=3, episode_length=3, env_id=i) for i in range(self.num_envs)]
+        self.actions = np.arange(self.num_envs, dtype=np.float64).reshape(self.num_envs, 1)
+
+    def test_matches_subproc(self):
+        pipe_envs = SubprocVecEnv(self.env_fns)
+        shmem_envs = ShmemVecEnv(self.env_fns, keep_infos=True)
+        try:
+            np.testing.assert_array_equal(pipe_envs.reset(), shmem_envs.reset())
+            for _ in range(5):
+                expected = pipe_envs.step(self.actions)
+                result = shmem_envs.step(self.actions)
+                for expected_value, value in zip(expected[:3], result[:3]):
+                    np.testing.assert_array_equal(expected_value, value)
+                self.assertEqual(expected[3], result[3])
+        finally:
+            pipe_envs.close()
+            shmem_envs.close()
+
+    def test_step_returns_shared_buffers(self):
+        envs = ShmemVecEnv(self.env_fns)
+        try:
+            obs = envs.reset()
+            next_obs, rews, dones, infos = envs.step(self.actions)
+            self.assertIs(obs, next_obs)
+            self.assertEqual(next_obs.shape, (self.num_envs, 3))
+            self.assertEqual(rews.dtype, np.float64)
+            self.assertEqual(dones.dtype, np.bool_)
+            self.assertEqual(infos, ({},) * self.num_envs)
+        finally:
+            envs.close()
+
+    def test_envs_per_worker_matches_subproc(self):
+        pipe_envs = SubprocVecEnv(self.env_fns)
+        shmem_envs = ShmemVecEnv(self.env_fns, envs_per_worker=3, keep_infos=True)
+        try:
+            np.testing.assert_array_equal(pipe_envs.reset(), shmem_envs.reset())
+            for _ in range(5):
+                expected = pipe_envs.step(self.actions)
+                result = shmem_envs.step(self.actions)
+                for expected_value, value in zip(expected[:3], result[:3]):
+                    np.testing.assert_array_equal(expected_value, value)
+                self.assertEqual(expected[3], result[3])
+        finally:
+            pipe_envs.close()
+            shmem_envs.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+## @package virtual_envs
+#  @brief Lightweight gym-compatible environments for testing the vectorised environments
+#  without MuJoCo. The observation and action sizes match the ProofOfConceptModel (3, 1) and
+#  LowCostPlatform (8, 4) environments so timings are representative of the real workload.
+import time
+import numpy as np
+
+## VirtualBox
+#  Minimal stand-in for gym.spaces.Box exposing the attributes used by the vectorised envs.
+class VirtualBox:
+    def __init__(self, shape, low=-1.0, high=1.0, dtype=np.float64):
+        super(VirtualBox, self).__init__()
+        self.shape = tuple(shape)
+        self.low = low
+        self.high = high
+        self.dtype = np.dtype(dtype)
+
+    def sample(self):
+        return np.random.uniform(self.low, self.high, self.shape).astype(self.dtype)
+
+## VirtualEnv
+#  Deterministic environment whose observation encodes the number of steps taken and the
+#  last action received, which makes ordering errors in the vectorised envs easy to spot.
+class VirtualEnv:
+    def __init__(self, obs_dim=3, act_dim=1, episode_length=200, step_delay=0.0, env_id=0):
+        super(VirtualEnv, self).__init__()
+        self.observation_space = VirtualBox((obs_dim,))
+        self.action_space = VirtualBox((act_dim,))
+        self.episode_length = episode_length
+        self.step_delay = step_delay
+        self.env_id = env_id
+        self._idx = 0
+
+    def _get_obs(self, action=0.0):
+        obs = np.zeros(self.observation_space.shape, dtype=self.observation_space.dtype)
+        obs[0] = self.env_id
+        obs[1 % obs.shape[0]] = self._idx
+        obs[2 % obs.shape[0]] = np.sum(action)
+        return obs
+
+    def step(self, action):
+        if self.step_delay:
+            time.sleep(self.step_delay)
+        self._idx += 1
+        reward = float(self.env_id + self._idx)
+        done = self._idx >= self.episode_length
+        return self._get_obs(action), reward, done, {'Time step': self._idx}
+
+    def reset(self):
+        self._idx = 0
+        return self._get_obs()
+
+    def reset_task(self):
+        return self.reset()
+
+    def close(self):
+        pass
+
+## make_virtual_env
+#  Returns a thunk creating a VirtualEnv, mirroring make_env in run_simulation.py.
+def make_virtual_env(**kwargs):
+    def _thunk():
+        return VirtualEnv(**kwargs)
+    return _thunk